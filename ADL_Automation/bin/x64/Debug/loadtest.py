@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    loadtest.py
+    End-to-end load and soak tests against the mock Neon server
+
+    For each scenario, starts a MockNeonServer, writes a copy of the config
+    pointing [QUOTE SESSION] at it and runs neon_client.py as a subprocess,
+    exactly as the C# application does. Once every symbol is subscribed it
+    measures, for the given duration:
+
+        latency   server write -> JSON line read from the client's stdout
+        cpu       client CPU time over wall time, in percent of one core
+        rss       client resident set size
+        drops     messages sent but not seen on stdout within a minute of the end
+
+    Latency includes the harness reading the pipe on the same machine. The
+    client does not turn incremental refreshes (35=X) into ticks, so with
+    --mode incremental only CPU and RSS are meaningful.
+
+    Example:
+        python loadtest.py --scenarios 1:10000,50:10000,1000:10000 --duration 30
+        python loadtest.py --scenarios 50:2000 --duration 3600 --disconnect-every 600
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from time import monotonic, sleep, time
+
+from benchmark import make_symbols
+from marketdata.latency import LatencyHistogram
+from mock_server import MockNeonServer
+
+
+def write_config(base_file, path, overrides):
+    """Copy an INI-style config, replacing or adding keys: overrides = {section: {key: value}}"""
+    with open(base_file) as f:
+        lines = f.read().splitlines()
+    output = []
+    pending = {}
+    section = None
+
+    def flush():
+        for key, value in pending.pop(section, {}).items():
+            output.append(f'{key}={value}')
+
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith('[') and stripped.endswith(']'):
+            flush()
+            section = stripped[1:-1]
+            pending[section] = dict(overrides.get(section, {}))
+        elif section is not None and '=' in stripped and not stripped.startswith('#'):
+            key = stripped.split('=', 1)[0].strip()
+            if key in pending.get(section, {}):
+                output.append(f'{key}={pending[section].pop(key)}')
+                continue
+        output.append(line)
+    flush()
+    for name, values in overrides.items():
+        if name not in pending and values and not any(l.strip() == f'[{name}]' for l in lines):
+            output.append(f'[{name}]')
+            output.extend(f'{key}={value}' for key, value in values.items())
+    with open(path, 'w') as f:
+        f.write('\n'.join(output) + '\n')
+
+
+class ProcessSampler:
+    """CPU and RSS of a process: psutil when installed, /proc otherwise (Linux)"""
+
+    def __init__(self, pid):
+
+        self.pid = pid
+        try:
+            import psutil
+            self._process = psutil.Process(pid)
+        except ImportError:
+            self._process = None
+        self._ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+    def cpu_seconds(self):
+        try:
+            if self._process is not None:
+                times = self._process.cpu_times()
+                return times.user + times.system
+            with open(f'/proc/{self.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / self._ticks
+        except Exception:
+            return None
+
+    def rss_bytes(self):
+        try:
+            if self._process is not None:
+                return self._process.memory_info().rss
+            with open(f'/proc/{self.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except Exception:
+            return None
+        return None
+
+
+class OutputReader:
+    """Reads the client's stdout on a thread and matches ticks to the server's send times"""
+
+    def __init__(self, stream, server):
+
+        self.stream = stream
+        self.server = server
+        self.latency = LatencyHistogram()
+        self.matched = 0
+        self.lines = 0
+        self.errors = 0
+        self.last_line = monotonic()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="OutputReader")
+        self._thread.start()
+
+    def reset(self):
+        self.latency.reset()
+        self.matched = self.lines = self.errors = 0
+
+    def _run(self):
+        for line in self.stream:
+            read_at = time()
+            self.last_line = monotonic()
+            self.lines += 1
+            try:
+                output = json.loads(line)
+            except ValueError:
+                continue
+            if output.get('err'):
+                self.errors += 1
+                continue
+            bid = output.get('bid')
+            if bid is None:
+                continue
+            sent_at = self.server.send_times.pop((output.get('ticker'), f'{bid:.5f}'), None)
+            if sent_at is not None:
+                self.matched += 1
+                self.latency.record((read_at - sent_at) * 1e6)
+
+
+def run_scenario(symbols, rate, duration, mode='snapshot', depth=1, burst_size=0, burst_every=0.0,
+                 disconnect_every=0.0, config_file='config/neon.conf', capacity=4096, python=sys.executable):
+    server = MockNeonServer(rate=rate, mode=mode, depth=depth, burst_size=burst_size,
+                            burst_every=burst_every, disconnect_every=disconnect_every)
+    # stream only once every symbol is subscribed, so subscribing is not slowed by the load
+    server.paused = True
+    server.start()
+    names = make_symbols(symbols)
+    config_dir = tempfile.mkdtemp(prefix='neon_loadtest_')
+    scenario_config = os.path.join(config_dir, 'neon.conf')
+    write_config(config_file, scenario_config, {
+        'QUOTE SESSION': {'SocketConnectHost': server.host, 'SocketConnectPort': server.port,
+                          'RequestInterval': 0},
+        # the default ring of 100k ticks per symbol would dominate memory with hundreds of symbols
+        'HISTORY': {'Capacity': capacity},
+    })
+
+    started = monotonic()
+    # own process group on Windows, so CTRL_BREAK_EVENT in the cleanup stops only the client
+    process = subprocess.Popen([python, '-u', 'neon_client.py', '--instruments', ','.join(names),
+                                '--config', scenario_config],
+                               stdout=subprocess.PIPE, text=True, bufsize=1,
+                               cwd=os.path.dirname(os.path.abspath(__file__)),
+                               creationflags=getattr(subprocess, 'CREATE_NEW_PROCESS_GROUP', 0))
+    reader = OutputReader(process.stdout, server)
+    sampler = ProcessSampler(process.pid)
+    result = {'symbols': symbols, 'rate': rate, 'mode': mode, 'depth': depth, 'duration_s': duration}
+    try:
+        deadline = started + 60 + symbols * 0.1
+        while server.subscribed() < symbols and process.poll() is None and monotonic() < deadline:
+            sleep(0.05)
+        if server.subscribed() < symbols:
+            result['error'] = f'only {server.subscribed()} of {symbols} symbols subscribed'
+            return result
+        result['subscribe_s'] = monotonic() - started
+
+        server.reset(track_send_times=True)
+        # before unpausing: the first ticks can come back before the next line runs
+        reader.reset()
+        server.paused = False
+        window_start = monotonic()
+        cpu_start = sampler.cpu_seconds()
+        rss = []
+        while monotonic() - window_start < duration and process.poll() is None:
+            sleep(1.0)
+            value = sampler.rss_bytes()
+            if value is not None:
+                rss.append(value)
+        elapsed = monotonic() - window_start
+        cpu_end = sampler.cpu_seconds()
+        server.pause()
+        server.track_send_times = False
+        sent = server.sent
+        # let the client drain what is already on the wire
+        drain_deadline = monotonic() + 60
+        while reader.matched < sent and monotonic() < drain_deadline and monotonic() - reader.last_line < 3.0:
+            sleep(0.1)
+
+        result.update({
+            'sent': sent,
+            'send_rate': sent / elapsed,
+            'received': reader.matched,
+            'drops': sent - reader.matched,
+            'drop_pct': (sent - reader.matched) / sent * 100 if sent else 0.0,
+            'error_lines': reader.errors,
+            'latency_us': reader.latency.summary(),
+            'cpu_pct': (cpu_end - cpu_start) / elapsed * 100 if None not in (cpu_start, cpu_end) else None,
+            'rss_mb_max': max(rss) / 2**20 if rss else None,
+            'rss_mb_growth': (rss[-1] - rss[0]) / 2**20 if len(rss) > 1 else None,
+            'logons': server.logons,
+            'disconnects': server.disconnects,
+            'client_exited': process.poll() is not None,
+        })
+        return result
+    finally:
+        if process.poll() is None:
+            process.send_signal(signal.SIGINT if os.name != 'nt' else signal.CTRL_BREAK_EVENT)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        server.stop()
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+
+##############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='End-to-end load tests of neon_client.py against the mock server')
+    parser.add_argument('--scenarios', type=str, default='1:10000,50:10000,1000:10000',
+                        help='Comma-separated symbols:msgs_per_sec pairs')
+    parser.add_argument('--duration', type=float, default=30.0, help='Measured seconds per scenario')
+    parser.add_argument('--mode', choices=('snapshot', 'incremental'), default='snapshot')
+    parser.add_argument('--depth', type=int, default=1, help='Book levels per side')
+    parser.add_argument('--burst-size', type=int, default=0)
+    parser.add_argument('--burst-every', type=float, default=0.0)
+    parser.add_argument('--disconnect-every', type=float, default=0.0)
+    parser.add_argument('--config', type=str, default='config/neon.conf', help='Base config file')
+    parser.add_argument('--capacity', type=int, default=4096, help='Tick history capacity per symbol')
+    parser.add_argument('--output', type=str, default='', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    for scenario in args.scenarios.split(','):
+        symbols, rate = scenario.split(':')
+        result = run_scenario(int(symbols), float(rate), args.duration, args.mode, args.depth,
+                              args.burst_size, args.burst_every, args.disconnect_every,
+                              args.config, args.capacity)
+        results.append(result)
+        if 'error' in result:
+            print(f"[ERROR] {symbols} symbols @ {rate} msg/s: {result['error']}")
+            continue
+        latency = {name: value or 0 for name, value in result['latency_us'].items()}
+        cpu = f"{result['cpu_pct']:.0f}%" if result['cpu_pct'] is not None else 'n/a'
+        rss = f"{result['rss_mb_max']:.0f} MB" if result['rss_mb_max'] is not None else 'n/a'
+        print(f"{symbols:>5} symbols @ {float(rate):>8,.0f} msg/s: sent {result['send_rate']:>8,.0f}/s, "
+              f"drops {result['drops']} ({result['drop_pct']:.1f}%), "
+              f"latency p50 {latency['p50']:,.0f} us p99 {latency['p99']:,.0f} us, "
+              f"cpu {cpu}, rss {rss}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
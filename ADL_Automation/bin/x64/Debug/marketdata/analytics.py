@@ -0,0 +1,139 @@
+import math
+from array import array
+
+
+class SymbolAnalytics:
+    """
+    O(1)-per-tick rolling statistics for one symbol.
+
+    EMAs of the mid (span in ticks), rolling mean/variance of mid log returns
+    and realised volatility over the last `window` returns, a size-weighted
+    mid (microprice) and the tick rate over the last `window` ticks. Window
+    contents live in small preallocated rings with running sums, so an
+    update never rescans the window; the sums are rebuilt once per lap to
+    stop floating point drift.
+    """
+
+    def __init__(self, ema_spans=(10, 50, 200), window=100):
+
+        self.ema_spans = tuple(ema_spans)
+        self._alphas = tuple(2.0 / (span + 1) for span in self.ema_spans)
+        self.emas = [None] * len(self.ema_spans)
+        self.window = window
+
+        self._returns = array('d', [0.0]) * window
+        self._times = array('d', [0.0]) * (window + 1)
+        self._pos = 0
+        self._count = 0          # returns in the window
+        self._time_count = 0     # timestamps in the window
+        self._time_pos = 0
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._last_mid = None
+
+        self.mid = None
+        self.weighted_mid = None
+        self.ticks = 0
+
+    def update(self, time, bid, ask, bid_size=None, ask_size=None):
+        mid = (bid + ask) / 2
+        self.mid = mid
+        self.ticks += 1
+
+        for i, alpha in enumerate(self._alphas):
+            ema = self.emas[i]
+            self.emas[i] = mid if ema is None else ema + alpha * (mid - ema)
+
+        if bid_size and ask_size:
+            # weight each side by the size on the opposite side
+            self.weighted_mid = (bid * ask_size + ask * bid_size) / (bid_size + ask_size)
+        else:
+            self.weighted_mid = mid
+
+        # tick timestamps for the rate
+        self._times[self._time_pos] = time
+        self._time_pos = (self._time_pos + 1) % len(self._times)
+        if self._time_count < len(self._times):
+            self._time_count += 1
+
+        # log returns of the mid
+        last_mid = self._last_mid
+        self._last_mid = mid
+        if last_mid is None or last_mid <= 0 or mid <= 0:
+            return
+        r = math.log(mid / last_mid)
+        if self._count == self.window:
+            old = self._returns[self._pos]
+            self._sum -= old
+            self._sum_sq -= old * old
+        else:
+            self._count += 1
+        self._returns[self._pos] = r
+        self._sum += r
+        self._sum_sq += r * r
+        self._pos += 1
+        if self._pos == self.window:
+            self._pos = 0
+            if self._count == self.window:
+                self._sum = math.fsum(self._returns)
+                self._sum_sq = math.fsum(x * x for x in self._returns)
+
+    def variance(self):
+        n = self._count
+        if n < 2:
+            return None
+        return max((self._sum_sq - self._sum * self._sum / n) / (n - 1), 0.0)
+
+    def realised_volatility(self):
+        """sqrt of the sum of squared log returns over the window"""
+        if self._count == 0:
+            return None
+        return math.sqrt(max(self._sum_sq, 0.0))
+
+    def tick_rate(self):
+        """Ticks per second over the window"""
+        n = self._time_count
+        if n < 2:
+            return None
+        size = len(self._times)
+        newest = self._times[(self._time_pos - 1) % size]
+        oldest = self._times[(self._time_pos - n) % size]
+        span = newest - oldest
+        return (n - 1) / span if span > 0 else None
+
+    def snapshot(self):
+        result = {f'ema_{span}': ema for span, ema in zip(self.ema_spans, self.emas)}
+        result.update({
+            'weighted_mid': self.weighted_mid,
+            'return_mean': self._sum / self._count if self._count else None,
+            'return_variance': self.variance(),
+            'realised_vol': self.realised_volatility(),
+            'tick_rate': self.tick_rate(),
+            'ticks': self.ticks,
+        })
+        return result
+
+
+class AnalyticsEngine:
+    """
+    Tick processor stage keeping SymbolAnalytics per symbol. Plugged into
+    MultiCurrencyTickProcessor.tick_stages; query with get(symbol).
+    """
+
+    def __init__(self, ema_spans=(10, 50, 200), window=100):
+
+        self.ema_spans = tuple(ema_spans)
+        self.window = window
+        self.symbols = {}  # format: 'EUR/USD': SymbolAnalytics
+
+    def on_tick(self, symbol, _history):
+        analytics = self.symbols.get(symbol)
+        if analytics is None:
+            analytics = self.symbols[symbol] = SymbolAnalytics(self.ema_spans, self.window)
+        time = _history.RECEIVE_TIME
+        analytics.update(time if time is not None else 0.0,
+                         _history.BID_TOB, _history.ASK_TOB, _history.BID_SIZE_TOB, _history.ASK_SIZE_TOB)
+
+    def get(self, symbol):
+        analytics = self.symbols.get(symbol)
+        return analytics.snapshot() if analytics else None
@@ -0,0 +1,327 @@
+"""
+# Compressed daily tick archive.
+#
+# A day file of fixed-size tick records (see tickstore.py) is rewritten as a
+# sequence of blocks. Inside a block every column is stored as integers
+# (microsecond timestamps, prices scaled by 10**decimals, whole sizes),
+# delta encoded against the previous row, zigzag mapped and varint packed,
+# then zlib compressed. Each block header carries its row count and min/max
+# timestamp so readers can skip blocks outside a time range without
+# decompressing them.
+"""
+import glob
+import multiprocessing
+import os
+import struct
+import threading
+import zlib
+from array import array
+from datetime import datetime, timezone
+
+from .tickstore import RECORD, FIELDS, FILE_SUFFIX, recover_tail
+
+MAGIC = b'NTA1'
+ARCHIVE_SUFFIX = '.nta'
+FILE_HEADER = struct.Struct('<4sBB')       # magic, version, price decimals
+BLOCK_HEADER = struct.Struct('<IIqq')      # rows, payload bytes, min time us, max time us
+BLOCK_ROWS = 4096
+VERSION = 1
+
+
+"""
+# zigzag / varint helpers
+"""
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _decode_varints_py(payload):
+    values = []
+    append = values.append
+    n = shift = 0
+    for byte in payload:
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            append(n)
+            n = shift = 0
+        else:
+            shift += 7
+    return values
+
+
+def _decode_varints_np(np, payload):
+    data = np.frombuffer(payload, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    values = np.zeros(len(ends), dtype=np.uint64)
+    for k in range(int(lengths.max())):
+        mask = lengths > k
+        values[mask] |= (data[starts[mask] + k] & 0x7F).astype(np.uint64) << np.uint64(7 * k)
+    return values
+
+
+"""
+# Block encoding
+"""
+def _encode_block(rows, scale):
+    """rows: list of record tuples in FIELDS order -> (header, payload)"""
+    out = bytearray()
+    times = [int(round(r[0] * 1e6)) for r in rows]
+
+    # receive time: delta against the previous row
+    previous = 0
+    for t in times:
+        _put_varint(out, _zigzag(t - previous))
+        previous = t
+
+    # exchange time: offset from receive time, 0 when unknown
+    for t, r in zip(times, rows):
+        exchange_time = r[1]
+        if exchange_time != exchange_time:  # nan
+            _put_varint(out, 0)
+        else:
+            _put_varint(out, _zigzag(t - int(round(exchange_time * 1e6))) + 1)
+
+    # prices scaled to integers, sizes rounded; all delta encoded
+    for column, factor in ((2, scale), (3, scale), (4, 1), (5, 1)):
+        previous = 0
+        for r in rows:
+            value = int(round(r[column] * factor))
+            _put_varint(out, _zigzag(value - previous))
+            previous = value
+
+    payload = zlib.compress(bytes(out), 6)
+    return BLOCK_HEADER.pack(len(rows), len(payload), min(times), max(times)), payload
+
+
+def _decode_block(rows, payload, scale):
+    raw = zlib.decompress(payload)
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None:
+        raw_cols = _decode_varints_np(np, raw).astype(np.int64).reshape(6, rows)
+        cols = (raw_cols >> 1) ^ -(raw_cols & 1)
+        times = np.cumsum(cols[0])
+        present = raw_cols[1] != 0
+        offsets = raw_cols[1] - 1
+        offsets = (offsets >> 1) ^ -(offsets & 1)
+        return {
+            'time': times / 1e6,
+            'exchange_time': np.where(present, (times - offsets) / 1e6, np.nan),
+            'bid': np.cumsum(cols[2]) / scale,
+            'ask': np.cumsum(cols[3]) / scale,
+            'bid_size': np.cumsum(cols[4]).astype(np.float64),
+            'ask_size': np.cumsum(cols[5]).astype(np.float64),
+        }
+
+    values = _decode_varints_py(raw)
+    result = {name: array('d') for name in FIELDS}
+    t = 0
+    times = []
+    for v in values[:rows]:
+        t += _unzigzag(v)
+        times.append(t)
+        result['time'].append(t / 1e6)
+    for t, v in zip(times, values[rows:2 * rows]):
+        result['exchange_time'].append(float('nan') if v == 0 else (t - _unzigzag(v - 1)) / 1e6)
+    for index, (name, factor) in enumerate((('bid', scale), ('ask', scale),
+                                            ('bid_size', 1), ('ask_size', 1)), start=2):
+        column = result[name]
+        previous = 0
+        for v in values[index * rows:(index + 1) * rows]:
+            previous += _unzigzag(v)
+            column.append(previous / factor)
+    return result
+
+
+"""
+# Write / read archives
+"""
+def archive_path_for(tick_path):
+    return tick_path[:-len(FILE_SUFFIX)] + ARCHIVE_SUFFIX
+
+
+def write_archive(tick_path, archive_path=None, decimals=6, block_rows=BLOCK_ROWS):
+    """Compress one .ticks day file. Written to a temp file and renamed, so a crash never leaves half an archive."""
+    archive_path = archive_path or archive_path_for(tick_path)
+    recover_tail(tick_path)
+    scale = 10 ** decimals
+    temp_path = archive_path + '.tmp'
+    rows_written = 0
+    with open(tick_path, 'rb') as src, open(temp_path, 'wb') as dst:
+        dst.write(FILE_HEADER.pack(MAGIC, VERSION, decimals))
+        while True:
+            chunk = src.read(block_rows * RECORD.size)
+            if not chunk:
+                break
+            rows = list(RECORD.iter_unpack(chunk))
+            header, payload = _encode_block(rows, scale)
+            dst.write(header)
+            dst.write(payload)
+            rows_written += len(rows)
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(temp_path, archive_path)
+    return rows_written
+
+
+class ArchiveReader:
+    """
+    Reader for a .nta archive. Only block headers are read on open; payloads
+    are decompressed when a query touches their time range. Columns come back
+    as NumPy arrays when NumPy is installed, `array('d')` otherwise.
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        with open(path, 'rb') as f:
+            self._data = f.read()
+        magic, version, self.decimals = FILE_HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a tick archive")
+        self.scale = 10 ** self.decimals
+
+        # block index: (min time us, max time us, rows, payload offset, payload bytes)
+        self.blocks = []
+        offset = FILE_HEADER.size
+        while offset < len(self._data):
+            rows, size, min_time, max_time = BLOCK_HEADER.unpack_from(self._data, offset)
+            offset += BLOCK_HEADER.size
+            self.blocks.append((min_time, max_time, rows, offset, size))
+            offset += size
+        self.count = sum(block[2] for block in self.blocks)
+
+    def __len__(self):
+        return self.count
+
+    def read(self, start=None, end=None):
+        """Decode every block overlapping [start, end) (epoch seconds) into columns"""
+        start_us = None if start is None else int(start * 1e6)
+        end_us = None if end is None else int(end * 1e6)
+        parts = []
+        for min_time, max_time, rows, offset, size in self.blocks:
+            if start_us is not None and max_time < start_us:
+                continue
+            if end_us is not None and min_time >= end_us:
+                continue
+            parts.append(_decode_block(rows, self._data[offset:offset + size], self.scale))
+        return self._concat(parts, start, end)
+
+    @staticmethod
+    def _concat(parts, start, end):
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+
+        if np is not None:
+            if not parts:
+                return {name: np.empty(0) for name in FIELDS}
+            columns = {name: np.concatenate([part[name] for part in parts]) for name in FIELDS}
+            mask = np.ones(len(columns['time']), dtype=bool)
+            if start is not None:
+                mask &= columns['time'] >= start
+            if end is not None:
+                mask &= columns['time'] < end
+            return columns if mask.all() else {name: column[mask] for name, column in columns.items()}
+
+        columns = {name: array('d') for name in FIELDS}
+        for part in parts:
+            keep = [i for i, t in enumerate(part['time'])
+                    if (start is None or t >= start) and (end is None or t < end)]
+            for name in FIELDS:
+                column = part[name]
+                columns[name].extend(column[i] for i in keep)
+        return columns
+
+
+"""
+# Daily rotation: archive every finished day, off the feed process
+"""
+def archive_directory(directory='history', decimals=6, delete_raw=False, today=None):
+    """Archive all .ticks files from days before `today` (UTC) that have no archive yet"""
+    today = today or datetime.now(timezone.utc).strftime('%Y%m%d')
+    archived = []
+    for tick_path in sorted(glob.glob(os.path.join(directory, '*' + FILE_SUFFIX))):
+        day = tick_path[:-len(FILE_SUFFIX)].rsplit('_', 1)[-1]
+        if day >= today:
+            continue  # still being written
+        archive_path = archive_path_for(tick_path)
+        if not os.path.exists(archive_path):
+            write_archive(tick_path, archive_path, decimals=decimals)
+            archived.append(archive_path)
+        if delete_raw:
+            os.remove(tick_path)
+    return archived
+
+
+class ArchiveScheduler:
+    """
+    Starts a separate process to archive finished days once per `interval`
+    seconds (and once at start-up), so compression never runs on the feed
+    process' threads or holds its GIL.
+    """
+
+    def __init__(self, directory='history', decimals=6, delete_raw=False, interval=3600):
+
+        self.directory = directory
+        self.decimals = decimals
+        self.delete_raw = delete_raw
+        self.interval = interval
+        self._stop = threading.Event()
+        self._process = None
+        self._thread = threading.Thread(target=self._run, daemon=True, name="ArchiveScheduler")
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._process is None or not self._process.is_alive():
+                self._process = multiprocessing.Process(
+                    target=archive_directory,
+                    args=(self.directory, self.decimals, self.delete_raw),
+                    daemon=True, name="TickArchiver")
+                self._process.start()
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Archive or inspect tick files')
+    parser.add_argument('path', help='history directory to archive, or a .nta file to inspect')
+    parser.add_argument('--decimals', type=int, default=6, help='price decimals kept in the archive')
+    parser.add_argument('--delete-raw', action='store_true', help='remove .ticks files once archived')
+    args = parser.parse_args()
+
+    if args.path.endswith(ARCHIVE_SUFFIX):
+        from time import perf_counter
+        started = perf_counter()
+        reader = ArchiveReader(args.path)
+        columns = reader.read()
+        print(f"{args.path}: {len(reader)} ticks in {len(reader.blocks)} blocks, "
+              f"decoded in {perf_counter() - started:.3f}s")
+    else:
+        for path in archive_directory(args.path, args.decimals, args.delete_raw):
+            print(f"Archived {path}")
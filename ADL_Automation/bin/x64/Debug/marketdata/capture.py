@@ -0,0 +1,49 @@
+class CapturePolicy:
+    """
+    Window-aware capture. Inside a minute marker / TAS window every tick is
+    stored along with the levels below the top of book (history.DEPTH),
+    streaming subscriptions are at full depth and the raw wire journal
+    records; outside the windows ticks are conflated to one per [CAPTURE]
+    SampleInterval, depth is not kept, subscriptions go back to top of book
+    and the journal is paused. Driven by the ScheduleEngine window callbacks.
+    """
+
+    def __init__(self, client, full_depth=True, journal=True):
+
+        self.client = client
+        self.full_depth = full_depth
+        # only toggle a journal the policy owns, never one configured always-on
+        self.journal = journal
+        self.active = None
+        self.window = None
+        self.apply(False)
+
+    def on_window_start(self, window):
+        self.window = window
+        self.apply(True)
+
+    def on_window_end(self, window):
+        self.window = None
+        self.apply(False)
+
+    def apply(self, active):
+        if active == self.active:
+            return
+        app = self.client.app
+        # new histories pick this up from the application
+        app.store_all_ticks = active
+        app.store_depth = active
+        for _history in list(app.history_dict.values()):
+            _history.store_all_ticks = active
+            _history.store_depth = active
+
+        if self.journal and self.client.journal is not None:
+            self.client.journal.enabled = active
+
+        if self.full_depth:
+            self.client.market_depth = 0 if active else 1
+            # nothing is subscribed yet on the first call
+            if self.active is not None:
+                for symbol in list(self.client.subscriptions):
+                    self.client.resubscribe(symbol)
+        self.active = active
@@ -1,17 +1,27 @@
 import logging
 from os.path import join
-from pathlib import Path
 
 from .helpers import log, setup_logger
+from .tickbuffer import TickBuffer
+from .bars import BarSeries, parse_timeframe
 
 
 class history:
 
-    def __init__(self, _symbol, store_all_ticks=True, save_history_to_files=True):
+    def __init__(self, _symbol, store_all_ticks=True, store_depth=False, save_history_to_files=True,
+                 capacity=100_000, max_age=None, tick_store=None, bar_builder=None,
+                 sample_interval=None):
 
         self.symbol = _symbol
-        self.save_history_to_files = False  # Force disable file writing
+        # ticks are persisted through the shared binary tick store (written off the feed thread)
+        self.tick_store = tick_store if save_history_to_files else None
+        self.save_history_to_files = self.tick_store is not None
         self.store_all_ticks = store_all_ticks
+        # with store_all_ticks off, keep at most one top of book tick per sample_interval seconds
+        self.sample_interval = sample_interval
+        self._last_stored = float('-inf')
+        # keep levels below the top of book (in DEPTH)
+        self.store_depth = store_depth
 
         # current bid/ask values depending on depth. top of book is self.BID[0].
         self.BID = {}
@@ -20,6 +30,11 @@ class history:
         self.ASK_SIZE = {}
         self.BID_TOB = 0
         self.ASK_TOB = 0
+        self.BID_SIZE_TOB = None
+        self.ASK_SIZE_TOB = None
+        # epoch seconds of the last update: exchange (SendingTime/MDEntryTime) and local receive
+        self.EXCHANGE_TIME = None
+        self.RECEIVE_TIME = None
         self._lowest_bid_depth = -1
         self._lowest_ask_depth = -1
 
@@ -35,21 +50,57 @@ class history:
         # log(self.history_logger, 'date_time,depth,bid,ask,bid_size,ask_size')
         # log(self.history_tob_logger, 'date_time,bid,ask')
 
-        self.HISTORY = []
-        self.HISTORY_TOB = []
+        # bounded columnar tick history of the top of book: count (capacity) and optional age
+        # (max_age seconds) eviction. asof, between, asof_join and the bars only read this one.
+        self.TICKS = TickBuffer(capacity=capacity, max_age=max_age)
+        # levels 1..N of full depth books (depth column), created with the first one
+        self.DEPTH = None
+
+        # streaming OHLC bars for the configured timeframes (see bars.BarBuilder)
+        self.BARS = bar_builder
+
+    # As-of lookup: the tick in effect at time t (epoch seconds), or None
+    def asof(self, t):
+        return self.TICKS.asof(t)
+
+    # Ticks with start <= time < end as zero-copy column views
+    # (memoryviews, or NumPy arrays sharing the same memory with as_numpy=True)
+    def between(self, start=None, end=None, as_numpy=False):
+        columns = self.TICKS.slice(start, end)
+        if as_numpy:
+            from numpy import frombuffer
+            return {name: frombuffer(view, dtype=view.format) for name, view in columns.items()}
+        return columns
+
+    # Append a complete tick to the history. Bars and the tick store see every top of book
+    # tick; TICKS keeps every one, or conflated to sample_interval when store_all_ticks is off.
+    # Deeper levels go to DEPTH, only while store_depth is on.
+    def append_tick(self, receive_time, bid, ask, bid_size, ask_size, exchange_time=None, depth=0):
+        if depth == 0:
+            if self.BARS is not None:
+                self.BARS.update(receive_time, bid, ask)
+            if self.tick_store is not None:
+                self.tick_store.append(self.symbol, receive_time, exchange_time, bid, ask, bid_size, ask_size)
+            if not self.store_all_ticks:
+                if self.sample_interval is None or receive_time - self._last_stored < self.sample_interval:
+                    return
+            self._last_stored = receive_time
+            self.TICKS.append(receive_time, bid, ask, bid_size, ask_size, exchange_time)
+        elif self.store_depth:
+            if self.DEPTH is None:
+                self.DEPTH = TickBuffer(capacity=self.TICKS.capacity, max_age=self.TICKS.max_age)
+            self.DEPTH.append(receive_time, bid, ask, bid_size, ask_size, exchange_time, depth)
 
     # Update Asset History depending on set fields in the message
     def _update_asset(self, date_time, _symbol, depth, bid, ask, bid_size, ask_size):
         """
         Check all fields and update data accordingly. Not all will
-        be present in every message.
+        be present in every message. date_time is epoch seconds.
         """
 
         if depth is None or _symbol != self.symbol:
             return
 
-        new_tob_bid, new_tob_ask = False, False
-
         # replace with current value if there is no update
         if bid is not None:
             if depth < self._lowest_bid_depth or self._lowest_bid_depth == -1:
@@ -57,18 +108,20 @@ class history:
             self.BID[depth] = bid
             if depth == self._lowest_bid_depth:
                 self.BID_TOB = bid
-                new_tob_bid = True
         if ask is not None:
             if depth < self._lowest_ask_depth or self._lowest_ask_depth == -1:
                 self._lowest_ask_depth = depth
             self.ASK[depth] = ask
             if depth == self._lowest_bid_depth:
                 self.ASK_TOB = ask
-                new_tob_ask = True
         if bid_size is not None:
             self.BID_SIZE[depth] = bid_size
+            if depth == self._lowest_bid_depth:
+                self.BID_SIZE_TOB = bid_size
         if ask_size is not None:
             self.ASK_SIZE[depth] = ask_size
+            if depth == self._lowest_ask_depth:
+                self.ASK_SIZE_TOB = ask_size
 
         # only save complete ticks
         if (
@@ -79,39 +132,63 @@ class history:
         ):
             return
 
-        if self.store_all_ticks:
-
-            try:
-                self.HISTORY.append(
-                    {
-                        "date_time": date_time,
-                        "depth": depth,
-                        "bid": self.BID[depth],
-                        "ask": self.ASK[depth],
-                        "bid_size": self.BID_SIZE[depth],
-                        "ask_size": self.ASK_SIZE[depth],
-                    }
-                )
-                # log(self.history_logger, '{},{},{},{},{},{}'.format(date_time, depth,
-                #                                                    self.BID[depth], self.ASK[depth],
-                #                                                    self.BID_SIZE[depth],
-                #                                                    self.ASK_SIZE[depth]))
-
-                if new_tob_bid or new_tob_ask:
-                    self.HISTORY_TOB.append({"date_time": date_time, "bid": self.BID_TOB, "ask": self.ASK_TOB})
-                    # log(self.history_tob_logger, '{},{},{}'.format(date_time, self.BID_TOB, self.ASK_TOB))
-
-            except KeyError:
-                pass
+        try:
+            self.append_tick(date_time, self.BID[depth], self.ASK[depth],
+                             self.BID_SIZE[depth], self.ASK_SIZE[depth], depth=depth)
+        except KeyError:
+            pass
 
     """
-    # Resample the M1 data to a higher time frame
+    # OHLC bars for a price ('bid', 'ask' or 'mid') and timeframe ('1m', '5min', ...).
+    # Served from the streaming bar builder when the timeframe is configured,
+    # otherwise built once from the ticks still held in memory.
     """
 
     def resampled_history(self, rate_type="", time_frame=""):
-        from pandas import DataFrame
-
-        df = DataFrame(self.HISTORY)
-        df.index = df.date_time
+        rate_type = rate_type or "mid"
+        if self.BARS is not None:
+            for (_, side), series in self.BARS.series.items():
+                if side == rate_type and series.seconds == parse_timeframe(time_frame):
+                    bars = list(series.closed) + ([series.current] if series.current else [])
+                    return [bar.as_dict() for bar in bars]
+
+        series = BarSeries(time_frame, keep=None)
+        times = self.TICKS.view("time")
+        bids = self.TICKS.view("bid")
+        asks = self.TICKS.view("ask")
+        for i in range(len(times)):
+            if rate_type == "mid":
+                price = (bids[i] + asks[i]) / 2
+            else:
+                price = bids[i] if rate_type == "bid" else asks[i]
+            series.update(times[i], price)
+        bars = list(series.closed) + ([series.current] if series.current else [])
+        return [bar.as_dict() for bar in bars]
+
+
+"""
+# As-of join of several histories onto one time grid.
+# Returns {symbol: {column: array aligned to grid}}; entries before a symbol's
+# first tick are nan. Vectorised with NumPy searchsorted.
+"""
+def asof_join(histories, grid, columns=("bid", "ask")):
+    import numpy as np
+
+    grid = np.asarray(grid, dtype=np.float64)
+    result = {}
+    for _history in histories:
+        views = _history.between(as_numpy=True)
+        times = views["time"]
+        index = np.searchsorted(times, grid, side="right") - 1
+        valid = index >= 0
+        safe_index = np.where(valid, index, 0)
+        joined = {}
+        for name in columns:
+            values = views[name]
+            if len(values) == 0:
+                joined[name] = np.full(len(grid), np.nan)
+            else:
+                joined[name] = np.where(valid, values[safe_index], np.nan)
+        result[_history.symbol] = joined
+    return result
 
-        return df[rate_type].resample(time_frame).ohlc()
@@ -0,0 +1,173 @@
+import math
+import threading
+
+
+class LatencyHistogram:
+    """
+    HDR style latency histogram with log-linear buckets.
+
+    Values are recorded in microseconds. Each power of two is split into
+    `sub_buckets` linear buckets, which bounds the relative error to
+    1/sub_buckets while keeping recording O(1) and memory fixed.
+    """
+
+    def __init__(self, max_value_us=60_000_000, sub_buckets=16):
+
+        self.sub_buckets = sub_buckets
+        self._sub_bits = int(math.log2(sub_buckets))
+        self.max_value_us = max_value_us
+        self.counts = [0] * self._index(max_value_us) + [0]
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.negative = 0  # clock skew: values recorded below zero
+
+    def _index(self, value):
+        if value < self.sub_buckets:
+            return value
+        exponent = value.bit_length() - self._sub_bits - 1
+        return (exponent + 1) * self.sub_buckets + ((value >> exponent) - self.sub_buckets)
+
+    def _value_at(self, index):
+        if index < self.sub_buckets:
+            return index
+        exponent = index // self.sub_buckets - 1
+        return (self.sub_buckets + index % self.sub_buckets) << exponent
+
+    def record(self, value_us):
+        value = int(value_us)
+        if value < 0:
+            self.negative += 1
+            value = 0
+        elif value > self.max_value_us:
+            value = self.max_value_us
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        if self.count == 0:
+            return None
+        target = max(1, math.ceil(self.count * p / 100.0))
+        running = 0
+        for index, bucket_count in enumerate(self.counts):
+            running += bucket_count
+            if running >= target:
+                # highest value equivalent to this bucket, clamped to what was seen
+                return max(min(self._value_at(index + 1) - 1, self.max), self.min)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.negative = 0
+
+    def summary(self, percentiles=(50, 90, 99, 99.9)):
+        """Return a dict of count, min/max/mean and percentiles (microseconds)"""
+        result = {'count': self.count, 'min': self.min, 'max': self.max, 'mean': self.mean()}
+        for p in percentiles:
+            result[f'p{p:g}'] = self.percentile(p)
+        if self.negative:
+            result['negative'] = self.negative
+        return result
+
+
+# Hot path stages, each measured from the previous stamp ('queue' only with [PIPELINE] on)
+STAGES = ('frame', 'queue', 'parse', 'dispatch', 'on_tick', 'output')
+
+
+class StageTracer:
+    """
+    monotonic_ns stamps along the hot path: recv, frame complete, taken off
+    the pipeline queue, parse done, dispatch, on_tick entry and output write. Each component writes its
+    stamp attribute directly and the tick processor calls complete(symbol)
+    once per tick, which records every stage (and the recv -> last stamp
+    total) in per-symbol histograms, in nanoseconds. Tracing off means the
+    tracer is None, so a stamp site costs a single attribute test.
+
+    When the output is written later than on_tick ([STATE] batches), the
+    tick processor calls hold(symbol) instead and the batch calls
+    complete_held(symbol, output_ns) once the line is out; a symbol ticking
+    twice in one batch keeps only its last tick's stamps, like its output.
+    Recording and the reset swap in summary() share a lock, so the report
+    thread never swaps the histograms out from under a recording tick.
+    """
+
+    def __init__(self):
+
+        self.recv_ns = 0
+        self.frame_ns = 0
+        self.dequeue_ns = 0
+        self.parse_ns = 0
+        self.dispatch_ns = 0
+        self.on_tick_ns = 0
+        self.output_ns = 0
+        self.histograms = {}  # format: 'EUR/USD': {'frame': LatencyHistogram, ..., 'total': LatencyHistogram}
+        self._held = {}  # format: 'EUR/USD': (recv_ns, frame_ns, dequeue_ns, parse_ns, dispatch_ns, on_tick_ns)
+        self._lock = threading.Lock()
+
+    def complete(self, symbol):
+        if self.recv_ns:
+            self._record(symbol, self.recv_ns, (self.frame_ns, self.dequeue_ns, self.parse_ns, self.dispatch_ns,
+                                                self.on_tick_ns, self.output_ns))
+        self._clear()
+
+    def hold(self, symbol):
+        """Keep this tick's stamps until complete_held() once its output is written"""
+        if self.recv_ns:
+            self._held[symbol] = (self.recv_ns, self.frame_ns, self.dequeue_ns, self.parse_ns, self.dispatch_ns,
+                                  self.on_tick_ns)
+        self._clear()
+
+    def complete_held(self, symbol, output_ns=0):
+        """Record a held tick; output_ns=0 when the batch wrote nothing for it"""
+        stamps = self._held.pop(symbol, None)
+        if stamps is not None:
+            self._record(symbol, stamps[0], stamps[1:] + (output_ns,))
+
+    def complete_all_held(self):
+        """Record every tick still held, without an output stage"""
+        for symbol in list(self._held):
+            self.complete_held(symbol)
+
+    def _clear(self):
+        # recv_ns stays: it is shared by every message framed from the same read
+        self.frame_ns = self.dequeue_ns = self.parse_ns = self.dispatch_ns = self.on_tick_ns = self.output_ns = 0
+
+    def _record(self, symbol, recv_ns, stamps):
+        with self._lock:
+            histograms = self.histograms.get(symbol)
+            if histograms is None:
+                histograms = {stage: LatencyHistogram(max_value_us=10_000_000_000) for stage in STAGES + ('total',)}
+                self.histograms[symbol] = histograms
+            previous = recv_ns
+            for stage, stamp in zip(STAGES, stamps):
+                if stamp:
+                    histograms[stage].record(stamp - previous)
+                    previous = stamp
+            histograms['total'].record(previous - recv_ns)
+
+    def summary(self, reset=False):
+        """{symbol: {stage: histogram summary (ns)}}; reset=True starts a new interval"""
+        with self._lock:
+            if not reset:
+                return self._summarise(self.histograms)
+            histograms, self.histograms = self.histograms, {}
+        # detached: nothing records into these any more
+        return self._summarise(histograms)
+
+    @staticmethod
+    def _summarise(histograms):
+        return {symbol: {stage: histogram.summary() for stage, histogram in stages.items() if histogram.count}
+                for symbol, stages in histograms.items()}
@@ -0,0 +1,206 @@
+"""
+# Feed metrics: counters, gauges and a Prometheus text endpoint.
+#
+# Counters are per thread: each thread increments its own dict with no lock
+# and collection sums the cells of every thread. Gauges are callbacks read
+# at collection time, so queue depths and percentiles cost nothing until
+# somebody asks.
+"""
+import threading
+from time import monotonic
+
+
+class Counter:
+
+    def __init__(self, name, help_text, label=None):
+
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._local = threading.local()
+        self._cells = []  # one dict per thread that has incremented this counter
+        self._lock = threading.Lock()
+
+    def _new_cell(self):
+        cell = {}
+        self._local.cell = cell
+        with self._lock:
+            self._cells.append(cell)
+        return cell
+
+    def inc(self, key='', amount=1):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._new_cell()
+        cell[key] = cell.get(key, 0) + amount
+
+    def values(self):
+        totals = {}
+        for cell in list(self._cells):
+            for key, value in list(cell.items()):
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+
+class Gauge:
+
+    def __init__(self, name, help_text, read, label=None):
+
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        # read() returns a number, or {label value: number} when the gauge has a label
+        self.read = read
+
+    def values(self):
+        value = self.read()
+        if value is None:
+            return {}
+        return value if isinstance(value, dict) else {'': value}
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+
+        self.metrics = []
+        self._last_snapshot = None  # (monotonic time, counter values) for rates
+
+    def counter(self, name, help_text, label=None):
+        counter = Counter(name, help_text, label)
+        self.metrics.append(counter)
+        return counter
+
+    def gauge(self, name, help_text, read, label=None):
+        gauge = Gauge(name, help_text, read, label)
+        self.metrics.append(gauge)
+        return gauge
+
+    def _collect(self):
+        for metric in self.metrics:
+            try:
+                yield metric, metric.values()
+            except Exception as e:
+                print(f"[ERROR] Metric {metric.name} failed: {e}")
+
+    @staticmethod
+    def _labels(label, key):
+        if not label:
+            return ''
+        if isinstance(key, tuple):
+            pairs = zip(label.split(','), key)
+        else:
+            pairs = [(label, key)]
+        return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+    @staticmethod
+    def _key(key):
+        return ','.join(key) if isinstance(key, tuple) else str(key)
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric, values in self._collect():
+            kind = 'counter' if isinstance(metric, Counter) else 'gauge'
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {kind}')
+            if not values and not metric.label:
+                values = {'': 0}
+            for key, value in sorted(values.items()):
+                lines.append(f'{metric.name}{self._labels(metric.label, key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """All values, plus per-second rates of the counters since the previous snapshot"""
+        now = monotonic()
+        result = {}
+        counters = {}
+        for metric, values in self._collect():
+            result[metric.name] = {self._key(key): value for key, value in values.items()} if metric.label \
+                else values.get('', 0)
+            if isinstance(metric, Counter):
+                counters[metric.name] = values
+        if self._last_snapshot is not None:
+            last_time, last_counters = self._last_snapshot
+            elapsed = now - last_time
+            if elapsed > 0:
+                rates = {}
+                for name, values in counters.items():
+                    previous = last_counters.get(name, {})
+                    rates[name] = {self._key(key): (value - previous.get(key, 0)) / elapsed
+                                   for key, value in values.items()}
+                result['rates_per_s'] = rates
+        self._last_snapshot = (now, counters)
+        return result
+
+
+class FeedMetrics:
+    """The feed's counters, shared by the client, application and tick processor"""
+
+    def __init__(self):
+
+        self.registry = MetricsRegistry()
+        counter = self.registry.counter
+        self.messages = counter('neon_messages_total', 'FIX messages received by MsgType', 'msg_type')
+        self.ticks = counter('neon_ticks_total', 'Complete ticks by symbol', 'symbol')
+        self.parse_errors = counter('neon_parse_errors_total', 'Messages that failed to parse or process')
+        self.rejects = counter('neon_rejects_total', 'Session (3) and market data (Y) rejects', 'msg_type')
+        self.stale_events = counter('neon_stale_events_total', 'Staleness errors sent by symbol', 'symbol')
+        self.logons = counter('neon_logons_total', 'Sessions established; more than one means a reconnect')
+        self.disconnects = counter('neon_disconnects_total', 'Logouts and closed connections')
+
+    def gauge(self, name, help_text, read, label=None):
+        return self.registry.gauge(name, help_text, read, label)
+
+
+class MetricsServer:
+    """
+    Serves GET /metrics in Prometheus text format on a daemon thread.
+    POST to a path in `actions` calls it and returns its text, for runtime
+    switches such as POST /memory.
+    """
+
+    def __init__(self, registry, port, host='127.0.0.1'):
+
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.registry = registry
+        self.actions = {}  # format: '/memory': callable returning a status text
+        actions = self.actions
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] not in ('/', '/metrics'):
+                    handler.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/plain; version=0.0.4')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def do_POST(handler):
+                action = actions.get(handler.path.split('?')[0])
+                if action is None:
+                    handler.send_error(404)
+                    return
+                body = (str(action()) + '\n').encode('utf-8')
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/plain')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True, name="MetricsServer")
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
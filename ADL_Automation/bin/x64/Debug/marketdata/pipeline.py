@@ -0,0 +1,230 @@
+"""
+# Receive/processing pipeline.
+#
+# With [PIPELINE] Enabled=Y the receive thread only reads the socket and cuts
+# the byte stream into whole FIX messages (FixFramer, by BodyLength, without
+# parsing fields); a processing thread parses them and runs the application
+# and the tick processor. Between the two is a bounded single-producer,
+# single-consumer queue, so a slow tick processor or a blocked stdout no
+# longer holds back the TCP reads. What happens when the processing thread
+# falls behind is the overflow policy:
+#
+#   block        the receive thread waits for space: nothing is lost and the
+#                kernel buffer pushes back on the server, as without the pipeline
+#   drop_oldest  the oldest waiting market data message (snapshot W,
+#                incremental refresh X or mass quote i) is discarded
+#   conflate     a snapshot takes the place of the waiting snapshot of the
+#                same symbol, as a full refresh supersedes the previous one.
+#                Only while nothing else for that symbol waits behind it: once
+#                an X or i for the symbol is queued, the next snapshot queues
+#                at the tail, so no message of a symbol ever overtakes an
+#                older one. X and i are never conflated; a full queue blocks.
+#
+# Session messages (logon, logout, rejects, ...) have no key: they are never
+# dropped or conflated.
+"""
+import threading
+from collections import deque
+from time import monotonic
+
+from .latency import LatencyHistogram
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'conflate')
+
+
+class FixFramer:
+    """Splits a FIX byte stream into messages using BodyLength (9) and the CheckSum (10) trailer"""
+
+    def __init__(self):
+
+        self._buffer = bytearray()
+
+    def append(self, data):
+        self._buffer += data
+
+    def messages(self):
+        """Whole messages received so far, as bytes; a partial message stays buffered"""
+        buffer = self._buffer
+        messages = []
+        position = 0
+        size = len(buffer)
+        while position < size:
+            start = buffer.find(b'8=', position)
+            if start < 0:
+                # keep a trailing '8': the next read may complete the BeginString
+                position = size - 1 if buffer.endswith(b'8') else size
+                break
+            length_start = buffer.find(b'\x019=', start)
+            if length_start < 0:
+                position = start
+                break
+            length_end = buffer.find(b'\x01', length_start + 3)
+            if length_end < 0:
+                position = start
+                break
+            try:
+                body_end = length_end + 1 + int(buffer[length_start + 3:length_end])
+            except ValueError:
+                # garbage: resynchronise on the next BeginString
+                position = start + 2
+                continue
+            if buffer[body_end:body_end + 3] != b'10=':
+                # BodyLength disagrees with the message: fall back to the trailer itself
+                body_end = buffer.find(b'\x0110=', length_end)
+                if body_end < 0:
+                    position = start
+                    break
+                body_end += 1
+            end = buffer.find(b'\x01', body_end + 3)
+            if end < 0:
+                position = start
+                break
+            messages.append(bytes(buffer[start:end + 1]))
+            position = end + 1
+        del buffer[:position]
+        return messages
+
+
+MARKET_DATA_TYPES = (b'W', b'X', b'i')
+
+
+def market_data_key(raw):
+    """
+    Overflow key of a raw message: (MsgType, symbols) for market data
+    (35=W, X or i, with every Symbol (55) it carries), None for session
+    messages
+    """
+    start = raw.find(b'\x0135=')
+    if start < 0:
+        return None
+    start += 4
+    msg_type = raw[start:raw.find(b'\x01', start)]
+    if msg_type not in MARKET_DATA_TYPES:
+        return None
+    symbols = []
+    start = raw.find(b'\x0155=', start)
+    while start >= 0:
+        start += 4
+        end = raw.find(b'\x01', start)
+        symbol = raw[start:end]
+        if symbol not in symbols:
+            symbols.append(symbol)
+        start = raw.find(b'\x0155=', end)
+    return msg_type, tuple(symbols)
+
+
+class SPSCQueue:
+    """
+    Bounded queue between exactly one producer and one consumer thread.
+    put(item, key) applies the overflow policy; get() waits for an item and
+    returns None once the queue is closed and empty. Depth is recorded at
+    every put in a histogram, with the items dropped and conflated and the
+    time the producer spent blocked.
+    """
+
+    def __init__(self, capacity=8192, overflow='block'):
+
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {', '.join(OVERFLOW_POLICIES)}")
+        self.capacity = capacity
+        self.overflow = overflow
+        self._entries = deque()  # format: [key, item], replaced in place when conflated
+        self._waiting = {}       # format: symbol: its snapshot entry, while nothing else for it queued behind (conflate only)
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self.closed = False
+        self.depth = LatencyHistogram(max_value_us=max(capacity, 1))
+        self.max_depth = 0
+        self.puts = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.blocked_s = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, item, key=None):
+        """Queue an item; False when the queue has been closed"""
+        with self._lock:
+            if self.closed:
+                return False
+            self.puts += 1
+            entries = self._entries
+            conflate = key is not None and self.overflow == 'conflate'
+            if conflate and key[0] == b'W' and len(key[1]) == 1:
+                entry = self._waiting.get(key[1][0])
+                if entry is not None:
+                    entry[1] = item
+                    self.conflated += 1
+                    return True
+            if len(entries) >= self.capacity:
+                if self.overflow == 'drop_oldest' and self._drop_oldest():
+                    self.dropped += 1
+                else:
+                    started = monotonic()
+                    while len(entries) >= self.capacity and not self.closed:
+                        self._not_full.wait()
+                    self.blocked_s += monotonic() - started
+                    if self.closed:
+                        return False
+            entry = [key, item]
+            entries.append(entry)
+            if conflate:
+                waiting = self._waiting
+                if key[0] == b'W' and len(key[1]) == 1:
+                    waiting[key[1][0]] = entry
+                else:
+                    # queued behind the waiting snapshots: a newer one must not jump ahead of it
+                    for symbol in key[1]:
+                        waiting.pop(symbol, None)
+            depth = len(entries)
+            self.depth.record(depth)
+            if depth > self.max_depth:
+                self.max_depth = depth
+            if depth == 1:
+                self._not_empty.notify()
+            return True
+
+    def _drop_oldest(self):
+        # session messages (no key) are kept: drop the oldest keyed entry
+        entries = self._entries
+        for index, entry in enumerate(entries):
+            if entry[0] is not None:
+                del entries[index]
+                return True
+        return False
+
+    def get(self, timeout=None):
+        """The oldest item, waiting up to `timeout` seconds (None = forever); None when closed or timed out"""
+        with self._lock:
+            entries = self._entries
+            while not entries:
+                if self.closed or not self._not_empty.wait(timeout):
+                    return None
+            entry = entries.popleft()
+            key = entry[0]
+            if key is not None and self.overflow == 'conflate' and len(key[1]) == 1 \
+                    and self._waiting.get(key[1][0]) is entry:
+                del self._waiting[key[1][0]]
+            if len(entries) == self.capacity - 1:
+                self._not_full.notify()
+            return entry[1]
+
+    def close(self):
+        """No more puts; get() drains what is waiting and then returns None"""
+        with self._lock:
+            self.closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def stats(self):
+        return {
+            'depth': len(self._entries),
+            'max_depth': self.max_depth,
+            'depth_p99': self.depth.percentile(99) or 0,
+            'puts': self.puts,
+            'dropped': self.dropped,
+            'conflated': self.conflated,
+            'blocked_seconds': round(self.blocked_s, 6),
+        }
@@ -0,0 +1,202 @@
+"""
+# In-process profiling, switched on and off while the feed runs.
+#
+# SamplingProfiler reads every thread's stack from sys._current_frames() a
+# few hundred times a second on its own thread: low overhead, nothing is
+# instrumented. cProfile traces every call but only in the thread that
+# enabled it, so Profiler.checkpoint() is called by the receive thread
+# between batches and switches cProfile there. Results are written by a
+# background thread so the feed never waits on the disk. cProfile and pstats
+# are imported on first use.
+"""
+import os
+import sys
+import threading
+from datetime import datetime
+from time import sleep
+
+
+def _timestamp():
+    return datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval=0.005):
+
+        self.interval = interval
+        self.stacks = {}        # format: (thread name, (code, ...) root first): samples
+        self.samples = 0
+        self._names = {}        # format: thread ident: thread name
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="SamplingProfiler")
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _thread_name(self, ident):
+        name = self._names.get(ident)
+        if name is None:
+            self._names = {thread.ident: thread.name for thread in threading.enumerate()}
+            name = self._names.get(ident, str(ident))
+        return name
+
+    def _run(self):
+        own = threading.get_ident()
+        stacks = self.stacks
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                codes.reverse()
+                key = (self._thread_name(ident), tuple(codes))
+                stacks[key] = stacks.get(key, 0) + 1
+            self.samples += 1
+
+    @staticmethod
+    def _label(code):
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+    def write(self, path, top=40):
+        """Collapsed stacks to `path` (flamegraph.pl / speedscope input) and a summary to `path`.txt"""
+        with open(path, 'w') as f:
+            for (thread, codes), count in self.stacks.items():
+                f.write(';'.join([thread] + [self._label(code) for code in codes]) + f' {count}\n')
+
+        threads = {}  # format: thread name: [samples, {code: self samples}, {code: total samples}]
+        for (thread, codes), count in self.stacks.items():
+            entry = threads.setdefault(thread, [0, {}, {}])
+            entry[0] += count
+            if codes:
+                entry[1][codes[-1]] = entry[1].get(codes[-1], 0) + count
+            for code in set(codes):
+                entry[2][code] = entry[2].get(code, 0) + count
+        with open(path + '.txt', 'w') as f:
+            f.write(f'{self.samples} samples every {self.interval * 1000:g} ms\n')
+            for thread, (samples, own, total) in sorted(threads.items(), key=lambda item: -item[1][0]):
+                f.write(f'\n=== {thread}: {samples} samples\n')
+                f.write(f'{"self":>7} {"total":>7}  function\n')
+                for code, count in sorted(own.items(), key=lambda item: -item[1])[:top]:
+                    f.write(f'{count / samples:7.1%} {total[code] / samples:7.1%}  {self._label(code)}\n')
+
+
+class Profiler:
+    """
+    The two profilers behind one object, each toggled by its own signal.
+    toggle_*() return the file the results will be written to when they stop
+    a profiler, otherwise None.
+    """
+
+    def __init__(self, directory='logs', interval=0.005, top=40, logger=None):
+
+        self.directory = directory
+        self.interval = interval
+        self.top = top
+        self.logger = logger
+        self.sampler = None
+        self.cprofile_on = False
+        self._local = threading.local()
+        self._enabled = []   # cProfile.Profile objects enabled by some thread
+        self._finished = []  # ... and disabled again by the same thread
+        self._lock = threading.Lock()
+
+    def _path(self, kind):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f'profile_{_timestamp()}_{kind}')
+
+    def _log(self, text):
+        if self.logger is not None:
+            self.logger.info(text)
+
+    def toggle_sampling(self):
+        if self.sampler is None:
+            self.sampler = SamplingProfiler(self.interval)
+            self.sampler.start()
+            self._log(f"[PROFILE] Sampling profiler started ({self.interval * 1000:g} ms)")
+            return None
+        sampler, self.sampler = self.sampler, None
+        path = self._path('sampling.folded')
+        threading.Thread(target=self._write_sampling, args=(sampler, path), daemon=True,
+                         name="ProfileWriter").start()
+        return path
+
+    def _write_sampling(self, sampler, path):
+        try:
+            sampler.stop()
+            sampler.write(path, self.top)
+            self._log(f"[PROFILE] Sampling profile ({sampler.samples} samples) written to {path}")
+        except Exception as e:
+            self._log(f"[ERROR] Failed to write sampling profile: {e}")
+
+    def toggle_cprofile(self):
+        if not self.cprofile_on:
+            self.cprofile_on = True
+            self._log("[PROFILE] cProfile started; it attaches to the thread processing messages at its next batch")
+            return None
+        self.cprofile_on = False
+        path = self._path('cprofile.pstats')
+        threading.Thread(target=self._write_cprofile, args=(path,), daemon=True, name="ProfileWriter").start()
+        return path
+
+    def checkpoint(self):
+        """Called between batches by the threads to profile with cProfile"""
+        profile = getattr(self._local, 'profile', None)
+        if self.cprofile_on:
+            if profile is None:
+                import cProfile
+                profile = self._local.profile = cProfile.Profile()
+                with self._lock:
+                    self._enabled.append(profile)
+                profile.enable()
+        elif profile is not None:
+            profile.disable()
+            self._local.profile = None
+            with self._lock:
+                self._finished.append(profile)
+
+    def _write_cprofile(self, path, timeout=5.0):
+        # wait for every profiled thread to reach checkpoint() and disable its profile
+        waited = 0.0
+        while waited < timeout:
+            with self._lock:
+                if len(self._finished) == len(self._enabled):
+                    break
+            sleep(0.1)
+            waited += 0.1
+        with self._lock:
+            profiles, self._finished = self._finished, []
+            self._enabled = [profile for profile in self._enabled if profile not in profiles]
+        if not profiles:
+            self._log("[PROFILE] cProfile stopped before any batch was profiled")
+            return
+        try:
+            import io
+            import pstats
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(path)
+            text = io.StringIO()
+            pstats.Stats(path, stream=text).sort_stats('cumulative').print_stats(self.top)
+            with open(path + '.txt', 'w') as f:
+                f.write(text.getvalue())
+            self._log(f"[PROFILE] cProfile stats written to {path}")
+        except Exception as e:
+            self._log(f"[ERROR] Failed to write cProfile stats: {e}")
+
+    def stop(self):
+        """Stop whatever is running and write it out (shutdown)"""
+        if self.sampler is not None:
+            sampler, self.sampler = self.sampler, None
+            self._write_sampling(sampler, self._path('sampling.folded'))
+        if self.cprofile_on:
+            self.cprofile_on = False
+            self._write_cprofile(self._path('cprofile.pstats'), timeout=1.0)
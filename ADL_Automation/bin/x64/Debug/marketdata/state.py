@@ -0,0 +1,108 @@
+"""
+# Top of book state for the whole symbol universe in NumPy arrays.
+#
+# Ticks only write scalars into the arrays at the symbol's id; mids, spreads,
+# change detection and staleness are computed for every symbol in one
+# vectorized pass per receive batch. Only imported when [STATE] Vectorized=Y.
+"""
+import numpy as np
+
+
+class StateBatch:
+    """Result of one SymbolStateStore.compute() pass. Arrays are indexed by symbol id."""
+
+    __slots__ = ('symbols', 'time', 'bid', 'ask', 'mid', 'spread', 'updated', 'changed', 'stale')
+
+    def __init__(self, symbols, time, bid, ask, mid, spread, updated, changed, stale):
+
+        self.symbols = symbols
+        self.time = time
+        self.bid = bid
+        self.ask = ask
+        self.mid = mid
+        self.spread = spread
+        self.updated = updated    # ticked since the last pass
+        self.changed = changed    # bid or ask differs from the last emitted price
+        self.stale = stale        # no tick within the symbol's staleness threshold
+
+    def changed_ids(self):
+        return np.flatnonzero(self.changed)
+
+
+class SymbolStateStore:
+
+    def __init__(self, capacity=64, default_threshold=2.0, thresholds=None):
+
+        self.default_threshold = default_threshold
+        self.thresholds = thresholds or {}  # format: 'EUR/USD': 1.5
+        self.ids = {}  # format: 'EUR/USD': 0
+        self.symbols = []
+        self.size = 0
+        self.pending = False
+        self.bid = self.ask = self.prev_bid = self.prev_ask = None
+        self.last_update = self.threshold = self.updated = None
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        def grow(old, fill, dtype):
+            new = np.full(capacity, fill, dtype=dtype)
+            if old is not None:
+                new[:len(old)] = old
+            return new
+
+        self.bid = grow(self.bid, np.nan, np.float64)
+        self.ask = grow(self.ask, np.nan, np.float64)
+        # NaN never compares equal, so a symbol's first tick always counts as a change
+        self.prev_bid = grow(self.prev_bid, np.nan, np.float64)
+        self.prev_ask = grow(self.prev_ask, np.nan, np.float64)
+        self.last_update = grow(self.last_update, -np.inf, np.float64)
+        self.threshold = grow(self.threshold, self.default_threshold, np.float64)
+        self.updated = grow(self.updated, False, np.bool_)
+
+    def symbol_id(self, symbol):
+        symbol_id = self.ids.get(symbol)
+        if symbol_id is None:
+            if self.size == len(self.bid):
+                self._allocate(2 * len(self.bid))
+            symbol_id = self.ids[symbol] = self.size
+            self.symbols.append(symbol)
+            self.threshold[symbol_id] = self.thresholds.get(symbol, self.default_threshold)
+            self.size += 1
+        return symbol_id
+
+    def set(self, symbol, bid, ask, update_time):
+        symbol_id = self.symbol_id(symbol)
+        self.bid[symbol_id] = bid
+        self.ask[symbol_id] = ask
+        self.last_update[symbol_id] = update_time
+        self.updated[symbol_id] = True
+        self.pending = True
+
+    def invalidate(self, symbol):
+        """Force the symbol's next tick to count as a change"""
+        symbol_id = self.ids.get(symbol)
+        if symbol_id is not None:
+            self.prev_bid[symbol_id] = np.nan
+            self.prev_ask[symbol_id] = np.nan
+
+    def compute(self, now):
+        """One pass over every symbol; None when nothing ticked since the last pass"""
+        if not self.pending:
+            return None
+        n = self.size
+        bid = self.bid[:n].copy()
+        ask = self.ask[:n].copy()
+        updated = self.updated[:n].copy()
+        prev_bid = self.prev_bid[:n]
+        prev_ask = self.prev_ask[:n]
+
+        mid = (bid + ask) * 0.5
+        spread = ask - bid
+        changed = updated & ((bid != prev_bid) | (ask != prev_ask))
+        stale = (now - self.last_update[:n]) > self.threshold[:n]
+
+        np.copyto(prev_bid, bid, where=changed)
+        np.copyto(prev_ask, ask, where=changed)
+        self.updated[:n] = False
+        self.pending = False
+        return StateBatch(self.symbols, now, bid, ask, mid, spread, updated, changed, stale)
@@ -0,0 +1,111 @@
+def split_pair(symbol):
+    base, quote = symbol.split('/')
+    return base.strip(), quote.strip()
+
+
+def resolve_legs(synthetic, pairs):
+    """
+    Find two quoted pairs that share a currency C with the synthetic's base
+    and quote currencies: ((pair for BASE/C, inverted), (pair for QUOTE/C, inverted)).
+    USD is tried first as the common currency. None when there is no route.
+    """
+    base, quote = split_pair(synthetic)
+    routes = {}  # format: ('EUR', 'USD'): ('EUR/USD', False)
+    for pair in pairs:
+        if pair == synthetic:
+            continue
+        pair_base, pair_quote = split_pair(pair)
+        routes.setdefault((pair_base, pair_quote), (pair, False))
+        routes.setdefault((pair_quote, pair_base), (pair, True))
+    currencies = sorted({currency for _, currency in routes}, key=lambda c: (c != 'USD', c))
+    for currency in currencies:
+        if (base, currency) in routes and (quote, currency) in routes:
+            return routes[(base, currency)], routes[(quote, currency)]
+    return None
+
+
+class SyntheticEngine:
+    """
+    Cross rates derived from two quoted legs, e.g. EUR/GBP from EUR/USD and
+    GBP/USD. A dependency graph maps every leg to the synthetics built on it
+    (transitively, so a synthetic can itself be a leg), and update() only
+    recomputes those. For legs BASE/C and QUOTE/C:
+
+        bid = bid(BASE/C) / ask(QUOTE/C)    ask = ask(BASE/C) / bid(QUOTE/C)
+
+    where a leg quoted the other way round (C/BASE) is inverted first.
+    """
+
+    def __init__(self):
+
+        self.synthetics = {}  # format: 'EUR/GBP': (('EUR/USD', False), ('GBP/USD', False))
+        self.dependents = {}  # format: 'EUR/USD': ['EUR/GBP']
+        self.quotes = {}      # format: 'EUR/USD': (bid, ask), legs and synthetics
+        self.direct = {}      # format: 'EUR/GBP': (bid, ask), direct quotes of synthetic symbols
+        self._affected = {}   # format: 'EUR/USD': synthetics to recompute, in dependency order
+
+    def add(self, synthetic, legs):
+        """Define a synthetic from ((leg, inverted), (leg, inverted)) as returned by resolve_legs"""
+        self.synthetics[synthetic] = legs
+        for leg, _ in legs:
+            self.dependents.setdefault(leg, []).append(synthetic)
+        self._build_graph()
+
+    def _build_graph(self):
+        order = {synthetic: i for i, synthetic in enumerate(self.synthetics)}
+        self._affected = {}
+        for source in self.dependents:
+            affected = set()
+            pending = list(self.dependents[source])
+            while pending:
+                synthetic = pending.pop()
+                if synthetic not in affected:
+                    affected.add(synthetic)
+                    pending.extend(self.dependents.get(synthetic, ()))
+            self._affected[source] = sorted(affected, key=order.get)
+
+    @staticmethod
+    def _leg_quote(quote, inverted):
+        bid, ask = quote
+        return (1.0 / ask, 1.0 / bid) if inverted else (bid, ask)
+
+    def compute(self, synthetic):
+        (base_leg, base_inverted), (quote_leg, quote_inverted) = self.synthetics[synthetic]
+        base_quote = self.quotes.get(base_leg)
+        quote_quote = self.quotes.get(quote_leg)
+        if not base_quote or not quote_quote or not all(base_quote) or not all(quote_quote):
+            return None
+        base_bid, base_ask = self._leg_quote(base_quote, base_inverted)
+        quote_bid, quote_ask = self._leg_quote(quote_quote, quote_inverted)
+        return base_bid / quote_ask, base_ask / quote_bid
+
+    def update(self, symbol, bid, ask):
+        """
+        Record a leg tick and return [(synthetic, bid, ask)] for the synthetics
+        whose price changed. Direct quotes of a synthetic symbol are kept for compare().
+        """
+        if symbol in self.synthetics:
+            self.direct[symbol] = (bid, ask)
+            return []
+        affected = self._affected.get(symbol)
+        if affected is None:
+            return []
+        self.quotes[symbol] = (bid, ask)
+        updated = []
+        for synthetic in affected:
+            price = self.compute(synthetic)
+            if price is None or price == self.quotes.get(synthetic):
+                continue
+            self.quotes[synthetic] = price
+            updated.append((synthetic, price[0], price[1]))
+        return updated
+
+    def compare(self, synthetic):
+        """Synthetic against direct mid: {'direct_mid', 'diff', 'diff_bp'}, or None without a direct quote"""
+        direct = self.direct.get(synthetic)
+        price = self.quotes.get(synthetic)
+        if direct is None or price is None:
+            return None
+        direct_mid = (direct[0] + direct[1]) / 2
+        diff = (price[0] + price[1]) / 2 - direct_mid
+        return {'direct_mid': direct_mid, 'diff': diff, 'diff_bp': diff / direct_mid * 1e4}
@@ -0,0 +1,163 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class TickBuffer:
+    """
+    Bounded columnar ring buffer of ticks.
+
+    Every column is an `array` of twice the allocated size and each value is
+    written at `i` and `i + size`. The most recent n ticks are therefore
+    always one contiguous slice, so views never copy, even across the wrap
+    point. The arrays start small and double as ticks arrive until they hold
+    `capacity` ticks, so a quiet symbol does not cost the full capacity. Old
+    ticks are evicted by count (capacity) and optionally by age (max_age
+    seconds, measured on the `time` column).
+    """
+
+    # column name -> array typecode
+    COLUMNS = {
+        'time': 'd',           # local receive time, epoch seconds
+        'exchange_time': 'd',  # SendingTime/MDEntryTime, epoch seconds (nan if unknown)
+        'bid': 'd',
+        'ask': 'd',
+        'bid_size': 'd',
+        'ask_size': 'd',
+        'depth': 'h',
+    }
+    INITIAL_SIZE = 1024  # ticks allocated up front, doubled as needed up to the capacity
+
+    def __init__(self, capacity=100_000, max_age=None):
+
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.max_age = max_age
+        self._alloc = min(capacity, self.INITIAL_SIZE)  # ticks the arrays hold, <= capacity
+        self._allocate({})
+        self._pos = 0      # next write index in [0, _alloc)
+        self._size = 0     # number of live ticks
+        self.total = 0     # ticks ever appended (including evicted ones)
+
+    def _allocate(self, live):
+        """New arrays of 2 * _alloc, holding the `live` values of each column at the start of both halves"""
+        alloc = self._alloc
+        columns = {}
+        for name, code in self.COLUMNS.items():
+            column = array(code, [0]) * (2 * alloc)
+            values = live.get(name)
+            if values:
+                n = len(values)
+                column[0:n] = column[alloc:alloc + n] = array(code, values)
+            columns[name] = column
+        # views handed out earlier keep the old arrays alive, so those are never resized in place
+        self._columns = columns
+        self._time = columns['time']
+        self._exchange_time = columns['exchange_time']
+        self._bid = columns['bid']
+        self._ask = columns['ask']
+        self._bid_size = columns['bid_size']
+        self._ask_size = columns['ask_size']
+        self._depth = columns['depth']
+
+    def _grow(self):
+        live = {name: view.tolist() for name, view in self.views().items()}
+        self._alloc = min(2 * self._alloc, self.capacity)
+        self._allocate(live)
+        self._pos = self._size
+
+    def __len__(self):
+        return self._size
+
+    def append(self, time, bid, ask, bid_size, ask_size, exchange_time=None, depth=0):
+        cap = self._alloc
+        if self._size == cap and cap < self.capacity:
+            self._grow()
+            cap = self._alloc
+        i = self._pos
+        j = i + cap
+        if exchange_time is None:
+            exchange_time = float('nan')
+        bid_size = bid_size or 0.0
+        ask_size = ask_size or 0.0
+        # unrolled on purpose: this runs once per tick
+        self._time[i] = self._time[j] = time
+        self._exchange_time[i] = self._exchange_time[j] = exchange_time
+        self._bid[i] = self._bid[j] = bid
+        self._ask[i] = self._ask[j] = ask
+        self._bid_size[i] = self._bid_size[j] = bid_size
+        self._ask_size[i] = self._ask_size[j] = ask_size
+        self._depth[i] = self._depth[j] = depth
+
+        self._pos = i + 1 if i + 1 < cap else 0
+        if self._size < cap:
+            self._size += 1
+        self.total += 1
+
+        if self.max_age is not None:
+            self._evict_older_than(time - self.max_age)
+
+    def _evict_older_than(self, cutoff):
+        times = self._time
+        start = self._start()
+        while self._size > 1 and times[start] < cutoff:
+            self._size -= 1
+            start += 1
+
+    def _start(self):
+        """Index (in the doubled array) of the oldest live tick"""
+        return self._pos + self._alloc - self._size
+
+    def bounds(self, n=None):
+        """(start, stop) indices of the most recent n ticks in the raw column arrays"""
+        if n is None or n > self._size:
+            n = self._size
+        stop = self._pos + self._alloc
+        return stop - n, stop
+
+    def view(self, column, n=None):
+        """Zero-copy memoryview over the most recent n values of a column (oldest first)"""
+        start, stop = self.bounds(n)
+        return memoryview(self._columns[column])[start:stop]
+
+    def views(self, n=None):
+        """Zero-copy views of every column for the most recent n ticks"""
+        start, stop = self.bounds(n)
+        return {name: memoryview(column)[start:stop] for name, column in self._columns.items()}
+
+    def index_range(self, start=None, end=None):
+        """
+        (i, j) positions, within the live window, of ticks with start <= time < end.
+        Binary search on the time column, which is monotonic for a live feed.
+        """
+        times = self.view('time')
+        i = 0 if start is None else bisect_left(times, start)
+        j = len(times) if end is None else bisect_left(times, end)
+        return i, j
+
+    def slice(self, start=None, end=None):
+        """Zero-copy views of every column for ticks with start <= time < end"""
+        i, j = self.index_range(start, end)
+        first, _ = self.bounds()
+        return {name: memoryview(column)[first + i:first + j]
+                for name, column in self._columns.items()}
+
+    def asof(self, t):
+        """The last tick at or before t as a dict, or None"""
+        times = self.view('time')
+        i = bisect_right(times, t)
+        if i == 0:
+            return None
+        index = self.bounds()[0] + i - 1
+        return {name: column[index] for name, column in self._columns.items()}
+
+    def last(self):
+        """The most recent tick as a dict, or None when empty"""
+        if self._size == 0:
+            return None
+        i = self._pos + self._alloc - 1
+        return {name: column[i] for name, column in self._columns.items()}
+
+    def clear(self):
+        self._pos = 0
+        self._size = 0
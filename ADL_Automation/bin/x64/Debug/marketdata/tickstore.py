@@ -0,0 +1,208 @@
+import mmap
+import os
+import struct
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from time import time as now
+
+# time, exchange_time, bid, ask, bid_size, ask_size - little endian doubles
+RECORD = struct.Struct('<6d')
+FIELDS = ('time', 'exchange_time', 'bid', 'ask', 'bid_size', 'ask_size')
+FILE_SUFFIX = '.ticks'
+
+
+def tick_file_path(directory, symbol, day):
+    """history/EURUSD_20260119.ticks - one append-only file per symbol per UTC day"""
+    return os.path.join(directory, f"{symbol.replace('/', '')}_{day}{FILE_SUFFIX}")
+
+
+def day_of(epoch_seconds):
+    return datetime.fromtimestamp(epoch_seconds, timezone.utc).strftime('%Y%m%d')
+
+
+def recover_tail(path):
+    """
+    Truncate a torn record left by a crash mid-write so the file is a whole
+    number of records again. Returns the number of bytes dropped.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 0
+    extra = size % RECORD.size
+    if extra:
+        with open(path, 'r+b') as f:
+            f.truncate(size - extra)
+    return extra
+
+
+class TickStore:
+    """
+    Append-only binary tick store.
+
+    The feed thread only appends a tuple to a deque (no locks, no I/O). A
+    background writer drains it in batches, packs the records and writes each
+    file's batch with a single write(), then flushes - one commit per batch
+    instead of per tick. fsync is done at most every `fsync_interval` seconds.
+    """
+
+    def __init__(self, directory='history', batch_interval=0.05, fsync_interval=1.0):
+
+        self.directory = directory
+        self.batch_interval = batch_interval
+        self.fsync_interval = fsync_interval
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self._files = {}            # format: ('EUR/USD', '20260119'): open file
+        self._last_fsync = now()
+        self.records_written = 0
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="TickStoreWriter")
+        self._thread.start()
+
+    def append(self, symbol, receive_time, exchange_time, bid, ask, bid_size, ask_size):
+        # deque.append is atomic - safe to call from the feed thread without a lock
+        self._pending.append((symbol, receive_time,
+                              exchange_time if exchange_time is not None else float('nan'),
+                              bid, ask, bid_size or 0.0, ask_size or 0.0))
+
+    def _file_for(self, symbol, day):
+        key = (symbol, day)
+        f = self._files.get(key)
+        if f is None:
+            # close files from previous days for this symbol (daily rotation)
+            for old_key in [k for k in self._files if k[0] == symbol]:
+                self._files.pop(old_key).close()
+            path = tick_file_path(self.directory, symbol, day)
+            dropped = recover_tail(path)
+            if dropped:
+                print(f"[WARNING] Dropped {dropped} bytes of torn tail from {path}")
+            f = open(path, 'ab')
+            self._files[key] = f
+        return f
+
+    def _drain(self):
+        batches = {}
+        pending = self._pending
+        while pending:
+            symbol, receive_time, *values = pending.popleft()
+            key = (symbol, day_of(receive_time))
+            buf = batches.get(key)
+            if buf is None:
+                buf = batches[key] = bytearray()
+            buf += RECORD.pack(receive_time, *values)
+
+        for (symbol, day), buf in batches.items():
+            f = self._file_for(symbol, day)
+            f.write(buf)
+            f.flush()
+            self.records_written += len(buf) // RECORD.size
+
+        if batches and now() - self._last_fsync >= self.fsync_interval:
+            for f in self._files.values():
+                os.fsync(f.fileno())
+            self._last_fsync = now()
+
+    def _run(self):
+        while self.running:
+            self._wakeup.wait(self.batch_interval)
+            try:
+                self._drain()
+            except Exception as e:
+                print(f"[ERROR] Tick store write error: {e}")
+
+    def close(self):
+        """Stop the writer, write everything still queued and fsync"""
+        if not self.running:
+            return
+        self.running = False
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self._drain()
+        for f in self._files.values():
+            os.fsync(f.fileno())
+            f.close()
+        self._files.clear()
+
+
+class TickFile:
+    """
+    Memory-mapped reader for one tick file. Records are accessed in place;
+    columns are strided memoryviews over the mapping, so nothing is loaded
+    until it is touched.
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.path.getsize(path)
+        self.count = size // RECORD.size
+        self._mmap = None
+        self._buffer = memoryview(b'')
+        if self.count:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            # ignore a torn tail here, the writer repairs it on next open
+            self._buffer = memoryview(self._mmap)[:self.count * RECORD.size]
+        self._values = self._buffer.cast('d')
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return dict(zip(FIELDS, RECORD.unpack_from(self._mmap, index * RECORD.size)))
+
+    def column(self, name):
+        """Zero-copy strided view of one field for every record"""
+        return self._values[FIELDS.index(name)::len(FIELDS)]
+
+    def time_at(self, index):
+        return self._values[index * len(FIELDS)]
+
+    def bisect(self, t, right=False):
+        """Index of the first record with receive time >= t (> t when right=True)"""
+        lo, hi = 0, self.count
+        values, width = self._values, len(FIELDS)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = values[mid * width]
+            if value < t or (right and value == t):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def asof(self, t):
+        """Last record at or before t, or None"""
+        index = self.bisect(t, right=True)
+        return self[index - 1] if index > 0 else None
+
+    def between(self, start, end):
+        """Iterate records with start <= time < end"""
+        for index in range(self.bisect(start), self.bisect(end)):
+            yield self[index]
+
+    def close(self):
+        self._values.release()
+        self._buffer.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # a column view handed out earlier is still alive; the mapping
+                # is released when it is garbage collected
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
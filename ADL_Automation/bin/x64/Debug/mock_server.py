@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    mock_server.py
+    Local FIX 4.4 stand-in for the Neon quote server
+
+    Accepts the logon sent by SimpleFIXClient._send_logon, answers
+    MarketDataRequests (35=V) for any number of symbols and streams 35=W
+    snapshots or 35=X incremental refreshes at a configured rate, with
+    optional bursts and a disconnect schedule. Point [QUOTE SESSION]
+    SocketConnectHost/SocketConnectPort at it instead of stunnel.
+
+    Every message carries a unique bid per symbol, so a consumer of the
+    client's JSON output can match each line to the moment it was sent
+    (see loadtest.py).
+
+    Example:
+        python mock_server.py --port 14508 --rate 1000 --mode snapshot
+"""
+
+import argparse
+import socket
+import threading
+from datetime import datetime, timezone
+from time import monotonic, sleep, time
+
+import simplefix
+
+PRICE_STEPS = 50000  # distinct bids per symbol before prices repeat
+
+
+class MockSession:
+    """One connected client"""
+
+    def __init__(self, conn, address):
+
+        self.conn = conn
+        self.address = address
+        self.send_lock = threading.Lock()
+        self.active = True
+        self.logged_on = False
+        self.sender = "demo.fxgrid"        # our SenderCompID, the client's TargetCompID
+        self.target = ""
+        self.seq = 0
+        self.subscriptions = {}  # format: 'EUR/USD': MDReqID
+        self.symbols = []        # subscribed symbols, copied on change for the streamer
+        self.counters = {}       # format: 'EUR/USD': messages sent for the symbol
+        self.started = None
+
+    def header(self, msg_type, stamp):
+        self.seq += 1
+        msg = simplefix.FixMessage()
+        msg.append_pair(8, "FIX.4.4")
+        msg.append_pair(35, msg_type)
+        msg.append_pair(34, str(self.seq))
+        msg.append_pair(49, self.sender)
+        msg.append_pair(52, stamp)
+        msg.append_pair(56, self.target)
+        return msg
+
+    def frame(self, msg_type, stamp, body):
+        """Encode from a ready 'tag=value<SOH>' body; several times cheaper than FixMessage.encode()"""
+        self.seq += 1
+        payload = (f'35={msg_type}\x0134={self.seq}\x0149={self.sender}\x01'
+                   f'52={stamp}\x0156={self.target}\x01{body}').encode()
+        head = b'8=FIX.4.4\x019=%d\x01' % len(payload)
+        return b'%s%s10=%03d\x01' % (head, payload, (sum(head) + sum(payload)) % 256)
+
+    def send(self, data):
+        with self.send_lock:
+            self.conn.sendall(data)
+
+    def close(self):
+        self.active = False
+        try:
+            # shutdown first: close() alone sends no FIN while _serve is blocked in recv()
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+
+class MockNeonServer:
+    """
+    Streams `rate` messages per second round-robin over every subscribed
+    symbol. Every `burst_every` seconds `burst_size` extra messages go out
+    in a single write. With `disconnect_every` the connection is dropped
+    (no Logout) that many seconds after logon. `reject` lists symbols
+    answered with a MarketDataRequestReject (35=Y).
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, rate=1000.0, mode='snapshot', depth=1,
+                 burst_size=0, burst_every=0.0, disconnect_every=0.0, reject=(), verbose=False):
+
+        self.rate = float(rate)
+        self.mode = mode
+        self.depth = depth
+        self.burst_size = burst_size
+        self.burst_every = burst_every
+        self.disconnect_every = disconnect_every
+        self.reject = set(reject)
+        self.verbose = verbose
+        self.sessions = []
+        self.running = False
+        self.paused = False  # answer requests but stream nothing, e.g. while a harness subscribes
+        # Counters for the harness; reset() starts a new measurement window
+        self.sent = 0
+        self.logons = 0
+        self.disconnects = 0
+        self.track_send_times = False
+        self.send_times = {}  # format: ('EUR/USD', '1.00042'): wall time the message was written
+        self._count_lock = threading.Lock()  # a batch is stamped and counted as one step
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(5)
+        self.host, self.port = self.listener.getsockname()[:2]
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._accept, daemon=True, name="MockAccept").start()
+        return self
+
+    def stop(self):
+        self.running = False
+        try:
+            self.listener.close()
+        except OSError:
+            pass
+        for session in list(self.sessions):
+            session.close()
+
+    def pause(self):
+        """Stop streaming; once this returns every message in send_times is counted in sent"""
+        with self._count_lock:
+            self.paused = True
+
+    def reset(self, track_send_times=None):
+        """Zero the send counters; optionally switch send time tracking on or off"""
+        self.send_times = {}
+        self.sent = 0
+        if track_send_times is not None:
+            self.track_send_times = track_send_times
+
+    def subscribed(self):
+        return sum(len(session.subscriptions) for session in self.sessions if session.active)
+
+    def _log(self, text):
+        if self.verbose:
+            print(text)
+
+    ##########################################################################
+    # Session
+
+    def _accept(self):
+        while self.running:
+            try:
+                conn, address = self.listener.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = MockSession(conn, address)
+            self.sessions.append(session)
+            self._log(f"[INFO] Connection from {address[0]}:{address[1]}")
+            threading.Thread(target=self._serve, args=(session,), daemon=True, name="MockSession").start()
+
+    def _serve(self, session):
+        parser = simplefix.FixParser()
+        while session.active and self.running:
+            try:
+                data = session.conn.recv(4096)
+            except OSError:
+                break
+            if not data:
+                break
+            parser.append_buffer(data)
+            while True:
+                msg = parser.get_message()
+                if msg is None:
+                    break
+                try:
+                    self._handle(session, msg)
+                except OSError:
+                    session.active = False
+                    break
+        if session.active:
+            self.disconnects += 1
+        session.close()
+        self._log(f"[INFO] Connection from {session.address[0]}:{session.address[1]} closed")
+
+    def _handle(self, session, msg):
+        msg_type = msg.get(35)
+        msg_type = msg_type.decode() if msg_type else None
+        stamp = self._timestamp()
+        if msg_type == 'A':
+            session.target = (msg.get(49) or b'').decode()
+            session.sender = (msg.get(56) or b'demo.fxgrid').decode()
+            reply = session.header('A', stamp)
+            reply.append_pair(98, "0")
+            reply.append_pair(108, (msg.get(108) or b'20').decode())
+            reply.append_pair(141, "Y")
+            session.send(reply.encode())
+            session.logged_on = True
+            session.started = monotonic()
+            self.logons += 1
+            self._log(f"[INFO] Logon from {session.target} (user {(msg.get(553) or b'').decode()})")
+            threading.Thread(target=self._stream, args=(session,), daemon=True, name="MockStream").start()
+        elif msg_type == '1':
+            reply = session.header('0', stamp)
+            reply.append_pair(112, (msg.get(112) or b'').decode())
+            session.send(reply.encode())
+        elif msg_type == '5':
+            session.send(session.header('5', stamp).encode())
+            session.active = False
+        elif msg_type == 'V':
+            self._handle_market_data_request(session, msg, stamp)
+
+    def _handle_market_data_request(self, session, msg, stamp):
+        req_id = (msg.get(262) or b'').decode()
+        request_type = (msg.get(263) or b'1').decode()
+        symbol = (msg.get(55) or b'').decode()
+        if symbol in self.reject:
+            reply = session.header('Y', stamp)
+            reply.append_pair(262, req_id)
+            reply.append_pair(281, "0")  # MDReqRejReason = Unknown symbol
+            reply.append_pair(58, f"Unknown symbol {symbol}")
+            session.send(reply.encode())
+            return
+        if request_type == '2':
+            session.subscriptions.pop(symbol, None)
+        else:
+            session.send(self._snapshot(session, symbol, req_id, stamp)[0])
+            if request_type == '1':
+                session.subscriptions[symbol] = req_id
+        session.symbols = list(session.subscriptions)
+        self._log(f"[INFO] {len(session.subscriptions)} subscription(s) after request {req_id} for {symbol}")
+
+    ##########################################################################
+    # Streaming
+
+    @staticmethod
+    def _timestamp():
+        return datetime.now(timezone.utc).strftime("%Y%m%d-%H:%M:%S.%f")
+
+    def _prices(self, session, symbol):
+        count = session.counters.get(symbol, 0)
+        session.counters[symbol] = count + 1
+        bid = 1.0 + (count % PRICE_STEPS) * 0.00001
+        return f'{bid:.5f}', bid
+
+    def _snapshot(self, session, symbol, req_id, stamp):
+        bid_text, bid = self._prices(session, symbol)
+        currency = symbol[:3]
+        entries = []
+        for side, name, offset, sign in (('0', 'BID', 0.0, -1), ('1', 'OFFER', 0.00018, 1)):
+            for level in range(self.depth):
+                price = bid_text if side == '0' and level == 0 else f'{bid + offset + sign * level * 0.00003:.5f}'
+                entries.append(f'269={side}\x01270={price}\x0115={currency}\x01271={500000 * (level + 1)}\x01'
+                               f'276=A\x01282=YM13\x01299={session.seq + 1:x}_{name}{level or ""}\x01290={level}\x01')
+        body = f'55={symbol}\x01262={req_id}\x01460=4\x01268={2 * self.depth}\x01' + ''.join(entries)
+        return session.frame('W', stamp, body), bid_text
+
+    def _incremental(self, session, symbol, req_id, stamp):
+        bid_text, bid = self._prices(session, symbol)
+        entries = []
+        for side, offset, sign in (('0', 0.0, -1), ('1', 0.00018, 1)):
+            for level in range(self.depth):
+                price = bid_text if side == '0' and level == 0 else f'{bid + offset + sign * level * 0.00003:.5f}'
+                # MDUpdateAction = Change
+                entries.append(f'279=1\x01269={side}\x0155={symbol}\x01270={price}\x01'
+                               f'271={500000 * (level + 1)}\x01290={level}\x01')
+        body = f'262={req_id}\x01268={2 * self.depth}\x01' + ''.join(entries)
+        return session.frame('X', stamp, body), bid_text
+
+    def _stream(self, session):
+        build = self._incremental if self.mode == 'incremental' else self._snapshot
+        started = monotonic()
+        scheduled = 0
+        next_burst = started + self.burst_every if self.burst_every > 0 else None
+        index = 0
+        while session.active and self.running:
+            now = monotonic()
+            if self.disconnect_every > 0 and now - session.started >= self.disconnect_every:
+                self._log("[INFO] Scheduled disconnect")
+                self.disconnects += 1
+                session.close()
+                break
+            symbols = session.symbols
+            if not symbols or self.paused:
+                started, scheduled = now, 0
+                sleep(0.01)
+                continue
+            due = int((now - started) * self.rate) - scheduled
+            scheduled += due
+            if next_burst is not None and now >= next_burst:
+                due += self.burst_size
+                next_burst += self.burst_every
+            if due <= 0:
+                sleep(0.001)
+                continue
+            # one SendingTime and one write per batch of due messages
+            stamp = self._timestamp()
+            frames = []
+            keys = []
+            for _ in range(due):
+                index = (index + 1) % len(symbols)
+                symbol = symbols[index]
+                req_id = session.subscriptions.get(symbol)
+                if req_id is None:
+                    continue
+                frame, bid_text = build(session, symbol, req_id, stamp)
+                frames.append(frame)
+                keys.append((symbol, bid_text))
+            # stamped and counted before the write: a fast client can answer before it returns
+            with self._count_lock:
+                if self.paused:
+                    continue
+                if self.track_send_times:
+                    sent_at = time()
+                    send_times = self.send_times
+                    for key in keys:
+                        send_times[key] = sent_at
+                self.sent += len(frames)
+            try:
+                session.send(b''.join(frames))
+            except OSError:
+                with self._count_lock:
+                    self.sent -= len(frames)
+                session.close()
+                break
+
+
+##############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Mock Neon FIX 4.4 quote server')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=14508)
+    parser.add_argument('--rate', type=float, default=1000.0, help='Messages per second over all symbols')
+    parser.add_argument('--mode', choices=('snapshot', 'incremental'), default='snapshot',
+                        help='Stream 35=W snapshots or 35=X incremental refreshes')
+    parser.add_argument('--depth', type=int, default=1, help='Book levels per side')
+    parser.add_argument('--burst-size', type=int, default=0, help='Extra messages sent back to back in each burst')
+    parser.add_argument('--burst-every', type=float, default=0.0, help='Seconds between bursts (0=no bursts)')
+    parser.add_argument('--disconnect-every', type=float, default=0.0,
+                        help='Drop each connection this many seconds after logon (0=never)')
+    parser.add_argument('--reject', type=str, default='', help='Comma-separated symbols to reject')
+    args = parser.parse_args()
+
+    server = MockNeonServer(args.host, args.port, args.rate, args.mode, args.depth,
+                            args.burst_size, args.burst_every, args.disconnect_every,
+                            [s.strip() for s in args.reject.split(',') if s.strip()], verbose=True).start()
+    print(f"[INFO] Mock Neon server listening on {server.host}:{server.port}")
+    try:
+        while True:
+            sleep(5)
+            print(f"[INFO] {server.subscribed()} subscription(s), {server.sent} message(s) sent")
+    except KeyboardInterrupt:
+        server.stop()
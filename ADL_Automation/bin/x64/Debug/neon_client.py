@@ -8,7 +8,9 @@
     and tests different symbol formats to find what works with your Neon server
 """
 
-from time import sleep, time
+from time import sleep, time, monotonic, monotonic_ns
+from marketdata.startup import StartupTimer
+startup = StartupTimer()  # before the other imports, so they are timed too
 from datetime import datetime
 import os
 import sys
@@ -17,7 +19,15 @@ import signal
 import threading
 import json
 from marketdata.simplefix_client import SimpleFIXClient
+from marketdata.staleness import StalenessMonitor
+from marketdata.analytics import AnalyticsEngine
+from marketdata.schedule import ScheduleEngine, windows_from_config
+from marketdata.capture import CapturePolicy
+from marketdata.synthetic import SyntheticEngine, resolve_legs
+from marketdata.logqueue import make_async, dropped_records, queued_records
+from marketdata.profiler import Profiler
 import logging
+startup.mark('imports')
 
 
 class MultiCurrencyTickProcessor():
@@ -25,11 +35,12 @@ class MultiCurrencyTickProcessor():
     Multi-currency tick processor for full market data snapshots
     """
 
-    def __init__(self, currency_pairs=None):
+    def __init__(self, currency_pairs=None, config_file='config/neon.conf', startup=None):
+        self.config_file = config_file
+        # Milestones up to the first tick; None once reported (or when not timed)
+        self.startup = startup
         # Set up logger
-        start_time = datetime.now()
-        timestamp_str = start_time.strftime("%d-%m-%Y:%H-%M-%S")
-        log_file_name = f'logs/neon_{timestamp_str}.log'
+        log_file_name = self._log_file_name(datetime.now())
         os.makedirs('logs', exist_ok=True)
         self.logger = logging.getLogger('neon_logger')
         self.logger.setLevel(logging.INFO)
@@ -40,13 +51,24 @@ class MultiCurrencyTickProcessor():
         self.logger.info("[INFO] Starting Multi-Currency Neon market data client for FULL SNAPSHOTS")
         self.logger.info("[INFO] This client will request full market depth (not just top of book)")
         self.logger.info(f"[INFO] Log file: {log_file_name}")
+        if self.startup is not None:
+            self.startup.mark('logger')
 
-        self.client = SimpleFIXClient(self, 
-                                     config_file='config/neon.conf',
-                                     store_all_ticks=True,
-                                     save_history_to_files=True,
-                                     verbose=False,
-                                     message_log_file=log_file_name)
+        # Vectorized all-symbol state, computed once per receive batch. Set before
+        # connecting: on_batch already runs for the logon reply.
+        self.state_store = None
+        self.batch_consumers = []  # callables taking a StateBatch
+        self.profiler = None
+        self.tick_count = 0
+        self.client = self._create_client(log_file_name)
+        if self.startup is not None:
+            self.startup.mark('logon')
+        # Move file writes off the calling threads when [LOGGING] Async=Y
+        logging_config = self.client.config.get('LOGGING', {})
+        self.log_queue_size = 0
+        if logging_config.get('Async', 'N').upper() == 'Y':
+            self.log_queue_size = int(logging_config.get('QueueSize', 10000))
+            make_async(self.logger, self.log_queue_size)
         self.successful_symbols = []
         self.failed_symbols = []
         self.received_snapshots = []
@@ -58,32 +80,95 @@ class MultiCurrencyTickProcessor():
         # Staleness check attributes
         self.last_update_times = {}  # Track last update time for each symbol
         self.staleness_threshold = 2.0  # 2 seconds staleness threshold
-        self.staleness_checker_running = False
-        self.staleness_checker_thread = None
+        self.staleness_monitor = self._create_staleness_monitor()
+        # Per-tick stages run after a valid tick: objects with on_tick(symbol, history)
+        self.tick_stages = []
+        self.analytics = None
+        self.analytics_output = False
+        self._setup_analytics()
+        # Full resolution capture inside the windows, conflated outside
+        self.capture = self._create_capture_policy()
+        # Minute marker / TAS windows, precomputed as monotonic deadlines
+        self.schedule = ScheduleEngine(windows_from_config(self.client.config.get('MINUTE MARKERS', {})),
+                                       on_window_start=self.on_window_start,
+                                       on_window_end=self.on_window_end)
         if currency_pairs is None:
             self.currency_pairs = ['EUR/USD']
         else:
-            self.currency_pairs = currency_pairs
+            self.currency_pairs = list(currency_pairs)
+        # Cross rates derived from their legs instead of their own subscription
+        self.synthetics = None
+        self.synthetic_compare = False
+        self._setup_synthetics()
+        if self.client.app.metrics is not None:
+            self.client.app.metrics.gauge('neon_stale_symbols', 'Symbols currently stale',
+                                          lambda: len(self.staleness_monitor._stale_since))
+        if self.client.app.metrics_server is not None:
+            # the SIGQUIT dump, for Windows where Ctrl+Break stops the feed
+            self.client.app.metrics_server.actions['/dump'] = \
+                lambda: self.dump_metrics() or "metrics written to the log"
+        self._setup_state_store()
+        # Worker processes for the symbols when [SHARDING] Workers > 0
+        self._start_shards()
+        # Started and stopped with SIGUSR1 (sampling) and SIGUSR2 (cProfile), or
+        # POST /profile/sampling and /profile/cprofile where there are no such signals
+        profiler_config = self.client.config.get('PROFILER', {})
+        self.profiler = Profiler(directory=profiler_config.get('Directory', 'logs'),
+                                 interval=float(profiler_config.get('SampleInterval', 0.005)),
+                                 top=int(profiler_config.get('Top', 40)),
+                                 logger=self.logger)
+        if self.client.app.metrics_server is not None:
+            self.client.app.metrics_server.actions['/profile/sampling'] = lambda: self.toggle_profiler()
+            self.client.app.metrics_server.actions['/profile/cprofile'] = lambda: self.toggle_profiler(cprofile=True)
+        # tracemalloc snapshots by component, switched with POST /memory or [MEMORY] Enabled
+        self.memory = None
+        self._setup_memory_diagnostics()
+        # Hot path stage latency reports ([LATENCY] section)
+        latency_config = self.client.config.get('LATENCY', {})
+        self.output_receive_time = latency_config.get('ReceiveTimestamp', 'N').upper() == 'Y'
+        self.latency_report_interval = float(latency_config.get('ReportInterval', 60))
+        self.latency_report_stop = threading.Event()
         if self.client.isLoggedOn():
+            if self.startup is not None:
+                self.startup.mark('setup')
             self.logger.info("[INFO] Connected to Neon market data feed")
             self.send_multi_currency_full_snapshot_requests()
             # Start staleness checker
             self.start_staleness_checker()
+            self.start_schedule()
+            if self.client.app.tracer is not None and self.latency_report_interval > 0:
+                threading.Thread(target=self._report_stage_latency, daemon=True, name="LatencyReport").start()
         else:
             self.logger.error("[ERROR] Cannot connect to Neon market data feed")
             self.print_connection_help()
 
+    def _log_file_name(self, start_time):
+        return f'logs/neon_{start_time.strftime("%d-%m-%Y:%H-%M-%S")}.log'
+
+    def _create_client(self, log_file_name):
+        """Create and connect the FIX client (overridden by the replay tool)"""
+        return SimpleFIXClient(self, 
+                               config_file=self.config_file,
+                               store_all_ticks=True,
+                               save_history_to_files=True,
+                               verbose=False,
+                               message_log_file=log_file_name)
+
     def send_multi_currency_full_snapshot_requests(self):
         currency_pairs = self.currency_pairs
         self.logger.info(f"[INFO] Testing {len(currency_pairs)} currency pairs for FULL SNAPSHOTS...")
         self.logger.info("[INFO] Each request will ask for full market depth (not just top of book)")
         self.logger.info("=" * 70)
         self.total_tested = len(currency_pairs)
+        # pause between requests, [QUOTE SESSION] RequestInterval (0 for the mock server)
+        request_interval = float(self.client.config.get('QUOTE SESSION', {}).get('RequestInterval', 0.3))
         for i, symbol in enumerate(currency_pairs, 1):
             self.logger.info(f"[{i:2d}/{len(currency_pairs)}] Testing: {symbol}")
             try:
                 self.client.send_market_data_request(symbol, 'snapshot_plus_updates')
-                sleep(0.3)
+                if i == 1 and self.startup is not None:
+                    self.startup.mark('first_request')
+                sleep(request_interval)
             except Exception as e:
                 self.logger.error(f"[ERROR] Failed to request {symbol}: {e}")
                 self.failed_symbols.append(symbol)
@@ -128,41 +213,205 @@ class MultiCurrencyTickProcessor():
             self.logger.info("  4. Verify the server configuration")
             self.logger.info("  5. Check if the server uses different symbol formats")
             self.logger.info("  6. Some servers may only support specific currency pairs")
+        self.log_latency_summary()
 
-    def start_staleness_checker(self):
-        """Start the background staleness checker thread"""
-        if not self.staleness_checker_running:
-            self.staleness_checker_running = True
-            self.staleness_checker_thread = threading.Thread(
-                target=self.staleness_checker_loop,
-                daemon=True,
-                name="StalenessChecker"
-            )
-            self.staleness_checker_thread.start()
-            self.logger.info("[INFO] Staleness checker started - monitoring for stale data (2s threshold)")
-
-    def staleness_checker_loop(self):
-        """Background loop to check for stale data every second"""
-        while self.staleness_checker_running:
-            try:
-                self.check_staleness()
-                sleep(1)  # Check every second
-            except Exception as e:
-                self.logger.error(f"[ERROR] Staleness checker error: {e}")
-                sleep(1)  # Continue even on errors
+    def log_latency_summary(self):
+        """Log exchange-to-receive latency percentiles per symbol"""
+        for symbol, summary in self.client.app.get_latency_summary().items():
+            self.logger.info(f"[LATENCY] {symbol} exchange->receive (us): {json.dumps(summary)}")
 
-    def check_staleness(self):
-        """Check for stale data and send error messages if needed"""
-        current_time = time()
-        
+    def log_stage_latency(self, reset=False):
+        """Log hot path per-stage latency percentiles per symbol (when [LATENCY] Stages=Y)"""
+        tracer = self.client.app.tracer
+        if tracer is None:
+            return
+        for symbol, stages in tracer.summary(reset=reset).items():
+            for stage, summary in stages.items():
+                self.logger.info(f"[LATENCY] {symbol} {stage} (ns): {json.dumps(summary)}")
+
+    def dump_metrics(self):
+        """Log every metric, with counter rates since the previous dump ([METRICS] Enabled=Y)"""
+        metrics = self.client.app.metrics
+        if metrics is None:
+            self.logger.info("[METRICS] Metrics are disabled")
+            return
+        self.logger.info(f"[METRICS] {json.dumps(metrics.registry.snapshot())}")
+
+    def toggle_profiler(self, cprofile=False):
+        """Start or stop the sampling profiler or cProfile; returns a status text"""
+        path = self.profiler.toggle_cprofile() if cprofile else self.profiler.toggle_sampling()
+        if path:
+            self.logger.info(f"[INFO] Profiler stopped, writing {path}")
+            return f"profiler stopped, writing {path}"
+        return "profiler started"
+
+    def _report_stage_latency(self):
+        """Report and reset the stage histograms every ReportInterval seconds"""
+        while not self.latency_report_stop.wait(self.latency_report_interval):
+            self.log_stage_latency(reset=True)
+
+    def _create_staleness_monitor(self):
+        """Build the staleness monitor from the [STALENESS] config section"""
+        staleness_config = self.client.config.get('STALENESS', {})
+        self.staleness_threshold = float(staleness_config.get('Threshold', self.staleness_threshold))
+        # 'local' judges staleness on arrival time, 'exchange' on the age of the data
+        self.staleness_clock = staleness_config.get('Clock', 'local').lower()
+        thresholds = {}
+        for key, value in staleness_config.items():
+            # per-symbol override, e.g. Threshold.EUR/USD=1.5
+            if key.startswith('Threshold.'):
+                thresholds[key[len('Threshold.'):]] = float(value)
+        return StalenessMonitor(on_stale=self.send_staleness_error,
+                                on_recover=self.on_staleness_recovered,
+                                default_threshold=self.staleness_threshold,
+                                thresholds=thresholds,
+                                reminder_interval=float(staleness_config.get('ReminderInterval', 0)))
+
+    def _setup_analytics(self):
+        """Plug the streaming analytics stage in when [ANALYTICS] Enabled=Y"""
+        analytics_config = self.client.config.get('ANALYTICS', {})
+        if analytics_config.get('Enabled', 'N').upper() != 'Y':
+            return
+        spans = [int(span) for span in analytics_config.get('EMASpans', '10,50,200').split(',') if span.strip()]
+        self.analytics = AnalyticsEngine(ema_spans=spans, window=int(analytics_config.get('Window', 100)))
+        self.analytics_output = analytics_config.get('Output', 'N').upper() == 'Y'
+        self.tick_stages.append(self.analytics)
+
+    def _create_capture_policy(self):
+        """Window-aware capture when [CAPTURE] Enabled=Y"""
+        capture_config = self.client.config.get('CAPTURE', {})
+        if capture_config.get('Enabled', 'N').upper() != 'Y':
+            return None
+        always_journal = self.client.config.get('JOURNAL', {}).get('Enabled', 'N').upper() == 'Y'
+        return CapturePolicy(self.client,
+                             full_depth=capture_config.get('FullDepth', 'Y').upper() == 'Y',
+                             journal=capture_config.get('Journal', 'Y').upper() == 'Y' and not always_journal)
+
+    def _setup_synthetics(self):
+        """Build the synthetic cross engine when [SYNTHETIC] Enabled=Y, adding any missing legs to the subscriptions"""
+        synthetic_config = self.client.config.get('SYNTHETIC', {})
+        if synthetic_config.get('Enabled', 'N').upper() != 'Y':
+            return
+        self.synthetic_compare = synthetic_config.get('Compare', 'N').upper() == 'Y'
+        engine = SyntheticEngine()
+        for synthetic in [s.strip() for s in synthetic_config.get('Instruments', '').split(',') if s.strip()]:
+            # explicit legs, e.g. Legs.EUR/GBP=EUR/USD,GBP/USD, otherwise found among the instruments
+            explicit = synthetic_config.get(f'Legs.{synthetic}')
+            if explicit:
+                pairs = [s.strip() for s in explicit.split(',') if s.strip()]
+            else:
+                pairs = self.currency_pairs + list(engine.synthetics)
+            legs = resolve_legs(synthetic, pairs)
+            if legs is None:
+                self.logger.error(f"[SYNTHETIC] No legs for {synthetic} among {', '.join(pairs)}")
+                continue
+            engine.add(synthetic, legs)
+            for leg, _ in legs:
+                if leg not in self.currency_pairs and leg not in engine.synthetics:
+                    self.currency_pairs.append(leg)
+            self.logger.info(f"[SYNTHETIC] {synthetic} derived from {legs[0][0]} and {legs[1][0]}")
+        self.synthetics = engine
+
+    def _setup_state_store(self):
+        """Switch to per-batch vectorized change detection when [STATE] Vectorized=Y"""
+        state_config = self.client.config.get('STATE', {})
+        if state_config.get('Vectorized', 'N').upper() != 'Y':
+            return
+        from marketdata.state import SymbolStateStore
+        self.state_store = SymbolStateStore(capacity=int(state_config.get('Capacity', 64)),
+                                            default_threshold=self.staleness_threshold,
+                                            thresholds=self.staleness_monitor.thresholds)
         for symbol in self.currency_pairs:
-            # Check if we have ever received data for this symbol
-            if symbol in self.last_update_times:
-                time_since_update = current_time - self.last_update_times[symbol]
-                
-                # If data is stale (older than threshold), send error message
-                if time_since_update > self.staleness_threshold:
-                    self.send_staleness_error(symbol, time_since_update)
+            self.state_store.symbol_id(symbol)
+
+    def _start_shards(self):
+        """Spread the symbols over the shard workers, each synthetic with its legs, and start them"""
+        shards = getattr(self.client, 'shards', None)
+        if shards is None:
+            return
+        from marketdata.shards import assign_shards
+        synthetics = dict(self.synthetics.synthetics) if self.synthetics is not None else {}
+        assignment = assign_shards(self.currency_pairs,
+                                   [[synthetic] + [leg for leg, _ in legs] for synthetic, legs in synthetics.items()],
+                                   shards.workers)
+        export_directory = self.client.config.get('EXPORT', {}).get('Directory', 'export')
+        worker_args = []
+        for index in range(shards.workers):
+            symbols = [symbol for symbol in self.currency_pairs if assignment.get(symbol) == index]
+            overrides = {
+                # the main process owns the session, the endpoints and the directory-wide jobs
+                'METRICS': {'Enabled': 'N'},
+                'MEMORY': {'Enabled': 'N'},
+                'JOURNAL': {'Enabled': 'N'},
+                'CAPTURE': {'Enabled': 'N'},
+                'PIPELINE': {'Enabled': 'N'},
+                'SHARDING': {'Workers': '0'},
+                'HISTORY': {'Archive': 'N'},
+                'EXPORT': {'Directory': os.path.join(export_directory, f'shard{index}')},
+                'SYNTHETIC': {'Instruments': ','.join(synthetic for synthetic in synthetics
+                                                      if assignment.get(synthetic) == index)},
+            }
+            worker_args.append((symbols, self.config_file, overrides))
+            self.logger.info(f"[SHARDING] Worker {index}: {', '.join(symbols) or 'no symbols'}")
+        shards.start(ShardTickProcessor, worker_args)
+
+    def _setup_memory_diagnostics(self):
+        """Memory diagnostics from [MEMORY]; started now with Enabled=Y, otherwise by POST /memory"""
+        from marketdata.memory import MemoryDiagnostics
+        memory_config = self.client.config.get('MEMORY', {})
+        app = self.client.app
+        watches = {
+            'histories': lambda: len(app.history_dict),
+            'history_ticks': lambda: sum(len(h.TICKS) for h in list(app.history_dict.values())),
+            'received_snapshots': lambda: len(self.received_snapshots),
+            'id_to_symbol': lambda: len(app._id_to_symbol),
+            'previous_prices': lambda: len(self.previous_prices),
+            'log_queue': queued_records,
+        }
+        for name, depth in list(app.queue_depths.items()):
+            watches[f'{name}_queue'] = depth
+        self.memory = MemoryDiagnostics(lambda: self.tick_count, watches,
+                                        interval=float(memory_config.get('Interval', 30)),
+                                        frames=int(memory_config.get('Frames', 4)),
+                                        top=int(memory_config.get('Top', 10)),
+                                        duration=float(memory_config.get('Duration', 300)),
+                                        directory=memory_config.get('Directory', 'logs'),
+                                        logger=self.logger)
+        if app.metrics_server is not None:
+            app.metrics_server.actions['/memory'] = \
+                lambda: f"memory diagnostics {'on' if self.memory.toggle() else 'off'}"
+        if memory_config.get('Enabled', 'N').upper() == 'Y':
+            self.memory.toggle()
+
+    def emit_synthetics(self, symbol, bid, ask):
+        """Print the synthetics affected by a tick on `symbol`, flagged as synthetic"""
+        for synthetic, syn_bid, syn_ask in self.synthetics.update(symbol, bid, ask):
+            output = {
+                "ticker": synthetic,
+                "bid": syn_bid,
+                "ask": syn_ask,
+                "midprice": (syn_bid + syn_ask) / 2,
+                "spread": syn_ask - syn_bid,
+                "err": None,
+                "synthetic": True
+            }
+            if self.synthetic_compare:
+                output["direct"] = self.synthetics.compare(synthetic)
+            print(json.dumps(output))
+
+    def get_analytics(self, symbol):
+        """Current rolling statistics for a symbol, or None"""
+        return self.analytics.get(symbol) if self.analytics else None
+
+    def start_staleness_checker(self):
+        """Start the background staleness monitor thread"""
+        if not self.staleness_monitor.running:
+            self.staleness_monitor.start()
+            self.logger.info(f"[INFO] Staleness checker started - monitoring for stale data ({self.staleness_threshold}s threshold)")
+
+    def start_schedule(self):
+        """Start the minute marker window timer thread"""
+        self.schedule.start()
 
     def send_staleness_error(self, symbol, staleness_duration):
         """Send JSON error message for stale data"""
@@ -176,16 +425,21 @@ class MultiCurrencyTickProcessor():
             "err": error_msg
         }
         print(json.dumps(output))
-        # Log at debug level to avoid flooding the log
-        if staleness_duration % 5 < 1:  # Log every ~5 seconds to reduce noise
-            self.logger.warning(f"[STALENESS] {symbol}: {error_msg}")
+        if self.client.app.metrics is not None:
+            self.client.app.metrics.stale_events.inc(symbol)
+        self.logger.warning(f"[STALENESS] {symbol}: {error_msg}")
+
+    def on_staleness_recovered(self, symbol, stale_duration):
+        """Data is flowing again - force the next tick out even if unchanged"""
+        self.previous_prices.pop(symbol, None)
+        if self.state_store is not None:
+            self.state_store.invalidate(symbol)
+        self.logger.info(f"[STALENESS] {symbol}: recovered after {stale_duration:.1f} seconds")
 
     def stop_staleness_checker(self):
-        """Stop the staleness checker thread gracefully"""
-        if self.staleness_checker_running:
-            self.staleness_checker_running = False
-            if self.staleness_checker_thread and self.staleness_checker_thread.is_alive():
-                self.staleness_checker_thread.join(timeout=1)
+        """Stop the staleness monitor thread gracefully"""
+        if self.staleness_monitor.running:
+            self.staleness_monitor.stop()
             self.logger.info("[INFO] Staleness checker stopped")
 
     def on_market_data_success(self, symbol):
@@ -213,6 +467,12 @@ class MultiCurrencyTickProcessor():
         self.logger.info("[LOGOUT] Logout message received - sending empty JSON output")
 
     def on_tick(self, symbol, app):
+        tracer = app.tracer
+        if tracer is not None:
+            tracer.on_tick_ns = monotonic_ns()
+        self.tick_count += 1
+        if self.startup is not None:
+            self.report_startup()
         err = None
         if symbol not in app.history_dict:
             err = f"No history for symbol {symbol}"
@@ -222,6 +482,25 @@ class MultiCurrencyTickProcessor():
             if bid and ask:
                 # Record timestamp of this update for staleness checking
                 self.last_update_times[symbol] = time()
+                exchange_time = app.history_dict[symbol].EXCHANGE_TIME
+                if self.staleness_clock == 'exchange' and exchange_time is not None:
+                    # map exchange time onto the monitor's monotonic clock
+                    self.staleness_monitor.update(symbol, monotonic() - (time() - exchange_time))
+                else:
+                    self.staleness_monitor.update(symbol)
+                
+                for stage in self.tick_stages:
+                    stage.on_tick(symbol, app.history_dict[symbol])
+                
+                self.check_minute_marker_opportunities(symbol, (bid + ask) / 2)
+                
+                if self.state_store is not None:
+                    # change detection and output run once per receive batch, see on_batch
+                    self.state_store.set(symbol, bid, ask, monotonic())
+                    if tracer is not None:
+                        # completed by on_batch once the line is written
+                        tracer.hold(symbol)
+                    return
                 
                 # Check if bid or ask prices have changed
                 previous = self.previous_prices.get(symbol, {})
@@ -246,7 +525,15 @@ class MultiCurrencyTickProcessor():
                         "spread": float(spread),
                         "err": None
                     }
+                    if self.analytics_output:
+                        output["analytics"] = self.analytics.get(symbol)
+                    if self.output_receive_time:
+                        output["receive_time"] = app.history_dict[symbol].RECEIVE_TIME
                     print(json.dumps(output))
+                    if tracer is not None:
+                        tracer.output_ns = monotonic_ns()
+                    if self.synthetics is not None:
+                        self.emit_synthetics(symbol, bid, ask)
                 # If prices haven't changed, don't output anything
             else:
                 err = f"Incomplete data for {symbol}: bid={bid}, ask={ask}"
@@ -261,40 +548,110 @@ class MultiCurrencyTickProcessor():
             }
             print(json.dumps(output))
             self.logger.error(err)
+        if tracer is not None:
+            tracer.complete(symbol)
+
+    def report_startup(self):
+        """Log the time from process start to the first tick, by phase ([STARTUP] ReportFile also saves it)"""
+        startup, self.startup = self.startup, None
+        startup.mark('first_tick')
+        report = startup.report()
+        phases = ', '.join(f'{name} {ms:.1f}' for name, ms in report['phases_ms'].items())
+        self.logger.info(f"[STARTUP] First tick {report['total_ms']:.1f} ms after process start ({phases} ms)")
+        if report['heavy_modules']:
+            self.logger.warning(f"[STARTUP] Loaded before the first tick: {', '.join(report['heavy_modules'])}")
+        report_file = self.client.config.get('STARTUP', {}).get('ReportFile', '')
+        if report_file:
+            try:
+                startup.write(report_file)
+            except OSError as e:
+                self.logger.error(f"[ERROR] Failed to write startup report: {e}")
+
+    def on_batch(self, app):
+        """One vectorized pass over all symbols after each receive batch ([STATE] Vectorized=Y)"""
+        if self.profiler is not None:
+            self.profiler.checkpoint()
+        if self.state_store is None:
+            return
+        tracer = app.tracer
+        batch = self.state_store.compute(monotonic())
+        if batch is None:
+            if tracer is not None:
+                tracer.complete_all_held()
+            return
+        changed = batch.changed_ids()
+        if len(changed):
+            bids = batch.bid[changed].tolist()
+            asks = batch.ask[changed].tolist()
+            mids = batch.mid[changed].tolist()
+            spreads = batch.spread[changed].tolist()
+            for i, symbol_id in enumerate(changed.tolist()):
+                symbol = batch.symbols[symbol_id]
+                output = {
+                    "ticker": symbol,
+                    "bid": bids[i],
+                    "ask": asks[i],
+                    "midprice": mids[i],
+                    "spread": spreads[i],
+                    "err": None
+                }
+                if self.analytics_output:
+                    output["analytics"] = self.analytics.get(symbol)
+                if self.output_receive_time:
+                    output["receive_time"] = app.history_dict[symbol].RECEIVE_TIME
+                print(json.dumps(output))
+                if tracer is not None:
+                    tracer.complete_held(symbol, monotonic_ns())
+                if self.synthetics is not None:
+                    self.emit_synthetics(symbol, bids[i], asks[i])
+        if tracer is not None:
+            # symbols that ticked without changing the output
+            tracer.complete_all_held()
+        for consumer in self.batch_consumers:
+            consumer(batch)
 
     def check_minute_marker_opportunities(self, symbol, mid_price):
         """
         Check for minute marker opportunities across all currency pairs
         This is where you would implement your minute marker logic
         """
-        current_time = datetime.now()
-        hour = current_time.hour
-        minute = current_time.minute
-        second = current_time.second
-        
-        # Check for minute marker activation periods
-        activation_periods = [
-            (10, 29, 30),  # 10:30 markers
-            (12, 29, 30),  # 12:30 markers  
-            (14, 29, 30),  # 14:30 markers
-            (16, 29, 30),  # 16:30 markers
-            (19, 28, 30),  # 19:30 TAS
-        ]
+        state = self.schedule.current()
+        if state is None:
+            return
+        window, progress = state
+
+        # Track the pair across the window
+        positions = self.minute_marker_positions.setdefault(window, {})
+        position = positions.get(symbol)
+        if position is None:
+            position = positions[symbol] = {'open_mid': mid_price, 'ticks': 0}
+        position['mid_price'] = mid_price
+        position['progress'] = progress
+        position['ticks'] += 1
         
-        for target_hour, start_min, end_min in activation_periods:
-            if hour == target_hour and start_min <= minute <= end_min:
-                # Calculate activation progress
-                total_seconds = (end_min - start_min) * 60
-                elapsed_seconds = (minute - start_min) * 60 + second
-                progress = min(elapsed_seconds / total_seconds, 1.0)
-                
-                self.logger.info(f"[MINUTE MARKER] {target_hour}:{end_min:02d} activation: {progress:.2%} | {symbol} @ {mid_price:.5f}")
-                
-                # Here you would implement your minute marker logic
-                # - Calculate required position adjustments for each currency pair
-                # - Apply gradual hedging changes
-                # - Update delta ratios
-                # - Track minute marker positions across all pairs
+        # Here you would implement your minute marker logic
+        # - Calculate required position adjustments for each currency pair
+        # - Apply gradual hedging changes
+        # - Update delta ratios
+
+    def on_window_start(self, window):
+        """Minute marker window opened (called from the schedule timer thread)"""
+        self.logger.info(f"[MINUTE MARKER] {window} window started")
+        if self.capture is not None:
+            self.capture.on_window_start(window)
+            self.logger.info(f"[CAPTURE] {window}: full resolution capture on")
+
+    def on_window_end(self, window):
+        """Minute marker window closed - log where each pair moved during it"""
+        # the feed thread creates the entry with the window's first tick, which can come before this timer fires
+        for symbol, position in self.minute_marker_positions.pop(window, {}).items():
+            move = position['mid_price'] - position['open_mid']
+            self.logger.info(f"[MINUTE MARKER] {window} | {symbol} {position['open_mid']:.5f} -> "
+                             f"{position['mid_price']:.5f} ({move:+.5f}) over {position['ticks']} ticks")
+        self.logger.info(f"[MINUTE MARKER] {window} window ended")
+        if self.capture is not None:
+            self.capture.on_window_end(window)
+            self.logger.info(f"[CAPTURE] {window}: back to conflated capture")
 
     def get_currency_summary(self):
         """
@@ -309,11 +666,60 @@ class MultiCurrencyTickProcessor():
         return summary
 
 
+class ShardTickProcessor(MultiCurrencyTickProcessor):
+    """The tick processor of one shard worker process: its symbols only, no connection"""
+
+    def __init__(self, index, currency_pairs, config_file, overrides):
+        self.shard_index = index
+        self.shard_overrides = overrides
+        super().__init__(currency_pairs=currency_pairs, config_file=config_file)
+
+    def _log_file_name(self, start_time):
+        return f'logs/neon_{start_time.strftime("%d-%m-%Y:%H-%M-%S")}_shard{self.shard_index}.log'
+
+    def _create_client(self, log_file_name):
+        from marketdata.shards import ShardClient
+        return ShardClient(self, self.config_file, self.shard_overrides, log_file_name)
+
+    def send_multi_currency_full_snapshot_requests(self):
+        # the main process subscribes
+        self.total_tested = len(self.currency_pairs)
+
+    def shutdown(self):
+        """Stopped by the main process once the routed messages are processed"""
+        self.stop_staleness_checker()
+        self.schedule.stop()
+        self.latency_report_stop.set()
+        self.log_latency_summary()
+        self.log_stage_latency()
+        self.profiler.stop()
+        self.memory.stop()
+        self.client.stop()
+
+
 # Global variables for signal handling
 processor = None
 logger = None
 temp_logger = None
 
+def export_signal_handler(signum, frame):
+    """Export in-memory ticks and bars on demand without stopping the feed"""
+    if processor and processor.client and processor.client.app:
+        if processor.client.app.request_export():
+            processor.logger.info("[INFO] History export requested")
+        else:
+            processor.logger.info("[INFO] History export requested but [EXPORT] is disabled")
+
+def metrics_signal_handler(signum, frame):
+    """Dump the feed metrics to the log without stopping the feed"""
+    if processor and processor.client and processor.client.app:
+        processor.dump_metrics()
+
+def profile_signal_handler(signum, frame):
+    """Start or stop a profiler without stopping the feed: SIGUSR1 sampling, SIGUSR2 cProfile"""
+    if processor and processor.profiler:
+        processor.toggle_profiler(cprofile=signum == signal.SIGUSR2)
+
 def signal_handler(signum, frame):
     """Handle interrupt signals gracefully"""
     global processor, logger, temp_logger
@@ -335,6 +741,14 @@ def signal_handler(signum, frame):
         try:
             # Stop the staleness checker first
             processor.stop_staleness_checker()
+            processor.schedule.stop()
+            processor.latency_report_stop.set()
+            processor.log_latency_summary()
+            processor.log_stage_latency()
+            processor.profiler.stop()
+            processor.memory.stop()
+            if dropped_records():
+                processor.logger.warning(f"[WARNING] {dropped_records()} log records dropped (log queue full)")
             
             # Send explicit logout message
             processor.client.send_logout(f"Client shutdown due to {signal_name}")
@@ -364,6 +778,15 @@ if __name__ == "__main__":
     # Set up signal handlers for graceful shutdown
     signal.signal(signal.SIGINT, signal_handler)   # Ctrl+C
     signal.signal(signal.SIGTERM, signal_handler)  # Termination signal
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, export_signal_handler)  # On-demand history export
+    if hasattr(signal, 'SIGBREAK'):
+        signal.signal(signal.SIGBREAK, signal_handler)  # Ctrl+Break on Windows, also how a parent stops us
+    if hasattr(signal, 'SIGQUIT'):
+        signal.signal(signal.SIGQUIT, metrics_signal_handler)  # Metrics dump (Ctrl+\), POST /dump elsewhere
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, profile_signal_handler)  # Sampling profiler on/off
+        signal.signal(signal.SIGUSR2, profile_signal_handler)  # cProfile on/off
     
     # Remove all non-JSON stdout prints, log them instead
     start_banner = "=" * 70
@@ -394,14 +817,18 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Neon Market Data Client')
     parser.add_argument('--instruments', type=str, default='EUR/USD',
                         help='Comma-separated list of instruments/currency pairs to request (e.g. EUR/USD,GBP/USD,USD/CHF)')
+    parser.add_argument('--config', type=str, default='config/neon.conf', help='Config file to use')
     args = parser.parse_args()
     instruments = [s.strip() for s in args.instruments.split(',') if s.strip()]
 
     # Create the Multi-Currency tick processor
     try:
-        processor = MultiCurrencyTickProcessor(currency_pairs=instruments)
+        processor = MultiCurrencyTickProcessor(currency_pairs=instruments, config_file=args.config,
+                                               startup=startup)
         # Use processor.logger for all further logs
         logger = processor.logger
+        if processor.log_queue_size:
+            make_async(temp_logger, processor.log_queue_size)
         if processor.client.isLoggedOn():
             logger.info("[INFO] Multi-Currency client is running")
             logger.info("[INFO] Monitoring for full market data snapshots...")
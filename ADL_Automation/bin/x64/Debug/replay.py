@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    replay.py
+    Deterministic replay of captured Neon traffic for benchmarking
+
+    Feeds a message log written by SimpleFIXApplication (logs/neon_*.log), a
+    wire journal (logs/wire_*.journal) or a raw FIX capture through the real
+    framing, process_message and MultiCurrencyTickProcessor.on_tick path, with
+    a simulated clock. The clock also drives the staleness monitor and the
+    minute marker windows, so windows and their capture switches follow the
+    recorded times. Runs as fast as possible (--speed 0) or paced at a multiple
+    of the recorded rate, and reports throughput and per-stage latency.
+
+    Example:
+        python replay.py logs/neon_eurusd_messages.log --instruments EUR/USD
+"""
+
+import argparse
+import contextlib
+import json
+import os
+from datetime import datetime
+from time import monotonic_ns, perf_counter, perf_counter_ns, sleep
+
+import simplefix
+
+from marketdata.helpers import fix_timestamp_to_epoch, load_config
+from marketdata.journal import MAGIC as JOURNAL_MAGIC, INBOUND, read_journal
+from marketdata.latency import LatencyHistogram
+from marketdata.simplefix_application import SimpleFIXApplication
+from neon_client import MultiCurrencyTickProcessor
+
+SOH = b'\x01'
+
+
+class SimulatedClock:
+    """Clock driven by the recorded timestamps instead of the wall clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def advance(self, t):
+        if t is not None and t > self.now:
+            self.now = t
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+##############################################################################
+# Capture sources: each yields (recorded receive time or None, raw bytes)
+
+def read_message_log(path):
+    """Lines like '2025-07-21 21:31:13,423 INFO Message = 8=FIX.4.4|9=105|...|10=160'"""
+    with open(path, 'r') as f:
+        for line in f:
+            marker = line.find(' Message = ')
+            if marker < 0:
+                continue
+            try:
+                recorded = datetime.strptime(line[:23], '%Y-%m-%d %H:%M:%S,%f').timestamp()
+            except ValueError:
+                recorded = None
+            fix_text = line[marker + len(' Message = '):].rstrip('\r\n')
+            yield recorded, fix_text.replace('|', '\x01').encode('ascii') + SOH
+
+
+def read_raw_capture(path, chunk_size=65536):
+    """A raw byte stream of SOH delimited FIX messages (timestamps come from SendingTime)"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield None, chunk
+
+
+def read_wire_journal(path):
+    """Inbound frames of a wire journal, exactly as they came off the socket"""
+    for mono_ns, wall_ns, direction, data in read_journal(path, INBOUND):
+        yield wall_ns / 1e9, data
+
+
+def open_capture(path):
+    with open(path, 'rb') as f:
+        head = f.read(5)
+    if head.startswith(JOURNAL_MAGIC):
+        return read_wire_journal(path)
+    if head == b'8=FIX':
+        return read_raw_capture(path)
+    return read_message_log(path)
+
+
+##############################################################################
+
+class ReplayClient:
+    """Stands in for SimpleFIXClient: same application object, no socket"""
+
+    def __init__(self, tick_processor, config_file='config/neon.conf', message_log_file=''):
+        self.config = load_config(config_file)
+        self.app = SimpleFIXApplication(self.config, tick_processor,
+                                        verbose=False,
+                                        message_log_file=message_log_file)
+        self.connected = True
+        self.journal = None
+        self.subscriptions = {}
+        self.market_depth = 1
+
+    def isLoggedOn(self):
+        return True
+
+    def send_market_data_request(self, symbol, req_type='snapshot', market_depth=None):
+        pass
+
+    def resubscribe(self, symbol, market_depth=None):
+        pass
+
+    def send_logout(self, text=""):
+        pass
+
+    def stop(self):
+        self.app.stop()
+
+
+class ReplayTickProcessor(MultiCurrencyTickProcessor):
+    """The production tick processor, wired to a ReplayClient and a simulated clock"""
+
+    def __init__(self, currency_pairs, clock, config_file, log_messages):
+        self.clock = clock
+        self.log_messages = log_messages
+        self.on_tick_histogram = LatencyHistogram()
+        self.on_tick_ns = 0
+        self.ticks = 0
+        super().__init__(currency_pairs=currency_pairs, config_file=config_file)
+
+    def _create_client(self, log_file_name):
+        return ReplayClient(self, self.config_file, log_file_name if self.log_messages else '')
+
+    def send_multi_currency_full_snapshot_requests(self):
+        self.total_tested = len(self.currency_pairs)
+
+    def start_staleness_checker(self):
+        # no thread: the replay loop drives the monitor on the simulated clock
+        self.staleness_monitor.clock = self.clock.monotonic
+
+    def start_schedule(self):
+        # no thread either: windows open and close at the recorded times
+        self.schedule.set_clock(self.clock.monotonic, self.clock.time)
+
+    def on_tick(self, symbol, app):
+        started = perf_counter_ns()
+        super().on_tick(symbol, app)
+        elapsed = perf_counter_ns() - started
+        self.on_tick_ns += elapsed
+        self.on_tick_histogram.record(elapsed / 1000)
+        self.ticks += 1
+
+
+def replay(path, instruments, speed=0.0, config_file='config/neon.conf',
+           output=os.devnull, log_messages=False):
+    clock = SimulatedClock()
+    stages = {'frame': LatencyHistogram(), 'process': LatencyHistogram()}
+
+    with open(output, 'w') as out, contextlib.redirect_stdout(out):
+        processor = ReplayTickProcessor(instruments, clock, config_file, log_messages)
+        app = processor.client.app
+        parser = simplefix.FixParser()
+        monitor = processor.staleness_monitor
+        schedule = processor.schedule
+
+        messages = 0
+        first_recorded = None
+        started = perf_counter()
+
+        tracer = app.tracer
+        for recorded, data in open_capture(path):
+            t0 = perf_counter_ns()
+            if tracer is not None:
+                tracer.recv_ns = monotonic_ns()
+            parser.append_buffer(data)
+            frames = []
+            while True:
+                msg = parser.get_message()
+                if msg is None:
+                    break
+                frames.append(msg)
+            if not frames:
+                continue
+            frame_us = (perf_counter_ns() - t0) / 1000 / len(frames)
+
+            for msg in frames:
+                stages['frame'].record(frame_us)
+                recorded_time = recorded if recorded is not None else fix_timestamp_to_epoch(msg.get(52))
+                clock.advance(recorded_time)
+
+                if speed > 0 and recorded_time is not None:
+                    if first_recorded is None:
+                        first_recorded = recorded_time
+                    lag = (recorded_time - first_recorded) / speed - (perf_counter() - started)
+                    if lag > 0:
+                        sleep(lag)
+
+                app.receive_time = clock.time()
+                if tracer is not None:
+                    tracer.frame_ns = monotonic_ns()
+                on_tick_before = processor.on_tick_ns
+                t1 = perf_counter_ns()
+                app.process_message(msg)
+                elapsed = perf_counter_ns() - t1 - (processor.on_tick_ns - on_tick_before)
+                stages['process'].record(elapsed / 1000)
+                monitor.run_due(clock.monotonic())
+                schedule.run_due(clock.monotonic())
+                messages += 1
+            app.end_of_batch()
+
+        elapsed_s = perf_counter() - started
+        processor.client.stop()
+
+    stages['on_tick'] = processor.on_tick_histogram
+    return {
+        'capture': path,
+        'messages': messages,
+        'ticks': processor.ticks,
+        'elapsed_s': elapsed_s,
+        'messages_per_s': messages / elapsed_s if elapsed_s > 0 else None,
+        'speed': speed,
+        'stages_us': {name: hist.summary() for name, hist in stages.items()},
+        'exchange_to_receive_us': app.get_latency_summary(),
+        'hot_path_ns': tracer.summary() if tracer is not None else None,
+    }
+
+
+##############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay a captured Neon message log through the tick processor')
+    parser.add_argument('capture', help='message log (logs/neon_*.log), wire journal or raw FIX capture')
+    parser.add_argument('--instruments', type=str, default='EUR/USD',
+                        help='Comma-separated list of instruments the processor should expect')
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='Replay speed multiplier (0 = as fast as possible, 1 = recorded rate)')
+    parser.add_argument('--config', type=str, default='config/neon.conf', help='Config file to use')
+    parser.add_argument('--output', type=str, default=os.devnull,
+                        help='Where the JSON price stream goes (default: discarded)')
+    parser.add_argument('--log-messages', action='store_true',
+                        help='Keep per-message logging on, as in production')
+    args = parser.parse_args()
+
+    instruments = [s.strip() for s in args.instruments.split(',') if s.strip()]
+    report = replay(args.capture, instruments, speed=args.speed, config_file=args.config,
+                    output=args.output, log_messages=args.log_messages)
+    print(json.dumps(report, indent=2))
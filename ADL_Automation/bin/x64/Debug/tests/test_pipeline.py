@@ -0,0 +1,196 @@
+import threading
+
+import pytest
+
+from marketdata.pipeline import FixFramer, SPSCQueue, market_data_key
+
+
+def fix(*fields):
+    """A complete FIX 4.4 message with BodyLength and CheckSum filled in"""
+    body = b''.join(b'%s=%s\x01' % (tag.encode(), value.encode()) for tag, value in fields)
+    head = b'8=FIX.4.4\x019=%d\x01' % len(body)
+    return head + body + b'10=%03d\x01' % (sum(head + body) % 256)
+
+
+def snapshot(symbol, bid='1.1'):
+    return fix(('35', 'W'), ('34', '2'), ('55', symbol), ('268', '1'), ('269', '0'), ('270', bid))
+
+
+def incremental(*symbols):
+    fields = [('35', 'X'), ('34', '3'), ('268', str(len(symbols)))]
+    for symbol in symbols:
+        fields += [('279', '1'), ('55', symbol), ('269', '0'), ('270', '1.2')]
+    return fix(*fields)
+
+
+HEARTBEAT = fix(('35', '0'), ('34', '1'))
+
+
+# FixFramer
+
+def test_framer_splits_messages_in_one_read():
+    framer = FixFramer()
+    framer.append(HEARTBEAT + snapshot('EUR/USD') + HEARTBEAT)
+    assert framer.messages() == [HEARTBEAT, snapshot('EUR/USD'), HEARTBEAT]
+    assert framer.messages() == []
+
+
+def test_framer_keeps_partial_message_until_complete():
+    message = snapshot('EUR/USD')
+    framer = FixFramer()
+    # every split point: inside BeginString, BodyLength, the body and the CheckSum trailer
+    for cut in range(1, len(message)):
+        framer.append(message[:cut])
+        assert framer.messages() == []
+        framer.append(message[cut:])
+        assert framer.messages() == [message]
+
+
+def test_framer_byte_at_a_time():
+    stream = HEARTBEAT + snapshot('GBP/USD') + incremental('EUR/USD')
+    framer = FixFramer()
+    messages = []
+    for i in range(len(stream)):
+        framer.append(stream[i:i + 1])
+        messages += framer.messages()
+    assert messages == [HEARTBEAT, snapshot('GBP/USD'), incremental('EUR/USD')]
+
+
+def test_framer_skips_leading_garbage():
+    framer = FixFramer()
+    framer.append(b'\x00\xffnoise\x01' + HEARTBEAT)
+    assert framer.messages() == [HEARTBEAT]
+
+
+def test_framer_resynchronises_after_bad_body_length():
+    framer = FixFramer()
+    framer.append(b'8=FIX.4.4\x019=xx\x0135=0\x01' + HEARTBEAT)
+    assert framer.messages() == [HEARTBEAT]
+
+
+def test_framer_falls_back_to_trailer_when_body_length_is_wrong():
+    wrong = HEARTBEAT.replace(b'\x019=10\x01', b'\x019=3\x01')
+    assert wrong != HEARTBEAT
+    framer = FixFramer()
+    framer.append(wrong + snapshot('EUR/USD'))
+    assert framer.messages() == [wrong, snapshot('EUR/USD')]
+
+
+# market_data_key
+
+def test_key_of_market_data_and_session_messages():
+    assert market_data_key(snapshot('EUR/USD')) == (b'W', (b'EUR/USD',))
+    assert market_data_key(incremental('EUR/USD', 'GBP/USD', 'EUR/USD')) == (b'X', (b'EUR/USD', b'GBP/USD'))
+    assert market_data_key(fix(('35', 'i'), ('296', '1'), ('295', '1'), ('55', 'USD/JPY'))) == \
+        (b'i', (b'USD/JPY',))
+    assert market_data_key(HEARTBEAT) is None
+    assert market_data_key(fix(('35', 'Y'), ('262', '1'), ('55', 'EUR/USD'))) is None
+
+
+# SPSCQueue overflow policies
+
+def put(queue, raw):
+    return queue.put(raw, market_data_key(raw))
+
+
+def drain(queue):
+    items = []
+    while len(queue):
+        items.append(queue.get(timeout=0))
+    return items
+
+
+def test_unknown_policy_rejected():
+    with pytest.raises(ValueError):
+        SPSCQueue(overflow='newest')
+
+
+def test_block_waits_for_space_and_loses_nothing():
+    queue = SPSCQueue(capacity=2, overflow='block')
+    put(queue, snapshot('EUR/USD', '1.1'))
+    put(queue, snapshot('EUR/USD', '1.2'))
+    producer = threading.Thread(target=put, args=(queue, snapshot('EUR/USD', '1.3')))
+    producer.start()
+    producer.join(0.1)
+    assert producer.is_alive()
+    assert queue.get() == snapshot('EUR/USD', '1.1')
+    producer.join(5)
+    assert not producer.is_alive()
+    assert drain(queue) == [snapshot('EUR/USD', '1.2'), snapshot('EUR/USD', '1.3')]
+    assert queue.stats()['dropped'] == 0 and queue.blocked_s > 0
+
+
+def test_drop_oldest_drops_any_market_data_but_keeps_session_messages():
+    queue = SPSCQueue(capacity=3, overflow='drop_oldest')
+    put(queue, HEARTBEAT)
+    put(queue, incremental('EUR/USD'))
+    put(queue, fix(('35', 'i'), ('296', '1'), ('295', '1'), ('55', 'USD/JPY')))
+    put(queue, snapshot('GBP/USD'))
+    put(queue, snapshot('AUD/USD'))
+    assert drain(queue) == [HEARTBEAT, snapshot('GBP/USD'), snapshot('AUD/USD')]
+    assert queue.stats()['dropped'] == 2
+
+
+def test_drop_oldest_blocks_when_only_session_messages_wait():
+    queue = SPSCQueue(capacity=1, overflow='drop_oldest')
+    put(queue, HEARTBEAT)
+    producer = threading.Thread(target=put, args=(queue, snapshot('EUR/USD')))
+    producer.start()
+    producer.join(0.1)
+    assert producer.is_alive()
+    queue.close()
+    producer.join(5)
+    assert drain(queue) == [HEARTBEAT]
+
+
+def test_conflate_replaces_waiting_snapshot_in_place():
+    queue = SPSCQueue(capacity=8, overflow='conflate')
+    put(queue, snapshot('EUR/USD', '1.1'))
+    put(queue, snapshot('GBP/USD', '1.3'))
+    put(queue, snapshot('EUR/USD', '1.2'))
+    assert drain(queue) == [snapshot('EUR/USD', '1.2'), snapshot('GBP/USD', '1.3')]
+    assert queue.stats()['conflated'] == 1
+
+
+def test_conflate_never_moves_a_snapshot_ahead_of_an_incremental():
+    queue = SPSCQueue(capacity=8, overflow='conflate')
+    put(queue, snapshot('EUR/USD', '1.1'))
+    put(queue, incremental('GBP/USD', 'EUR/USD'))
+    put(queue, snapshot('EUR/USD', '1.2'))
+    put(queue, snapshot('EUR/USD', '1.3'))
+    assert drain(queue) == [snapshot('EUR/USD', '1.1'), incremental('GBP/USD', 'EUR/USD'),
+                            snapshot('EUR/USD', '1.3')]
+    assert queue.stats()['conflated'] == 1
+
+
+def test_conflate_after_the_waiting_snapshot_was_taken():
+    queue = SPSCQueue(capacity=8, overflow='conflate')
+    put(queue, snapshot('EUR/USD', '1.1'))
+    assert queue.get() == snapshot('EUR/USD', '1.1')
+    put(queue, snapshot('EUR/USD', '1.2'))
+    put(queue, snapshot('EUR/USD', '1.3'))
+    assert drain(queue) == [snapshot('EUR/USD', '1.3')]
+
+
+def test_conflate_keeps_session_messages_and_blocks_when_full():
+    queue = SPSCQueue(capacity=2, overflow='conflate')
+    put(queue, HEARTBEAT)
+    put(queue, snapshot('EUR/USD', '1.1'))
+    # same symbol: replaced even though the queue is full
+    assert put(queue, snapshot('EUR/USD', '1.2'))
+    producer = threading.Thread(target=put, args=(queue, snapshot('GBP/USD')))
+    producer.start()
+    producer.join(0.1)
+    assert producer.is_alive()
+    assert queue.get() == HEARTBEAT
+    producer.join(5)
+    assert drain(queue) == [snapshot('EUR/USD', '1.2'), snapshot('GBP/USD')]
+
+
+def test_closed_queue_refuses_puts_and_drains():
+    queue = SPSCQueue(capacity=4)
+    put(queue, HEARTBEAT)
+    queue.close()
+    assert not put(queue, HEARTBEAT)
+    assert queue.get() == HEARTBEAT
+    assert queue.get() is None
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    benchmark.py
+    Microbenchmarks for the parse, dispatch and output paths
+
+    Generates realistic 35=W (snapshot), 35=X (incremental) and 35=i (mass
+    quote) frames at several depths and symbol counts, and measures
+    _extract_market_data_entries, process_message, history._update_asset,
+    MultiCurrencyTickProcessor.on_tick and the JSON output separately.
+    Results are saved as a JSON baseline; compare flags regressions.
+
+    startup spawns neon_client.py (or a bundle.py zipapp) against the mock
+    server and fails when the median time from process start to first tick
+    exceeds the budget, or when an optional heavy module was imported.
+
+    Example:
+        python benchmark.py run --output benchmarks/baseline.json
+        python benchmark.py run --output benchmarks/current.json
+        python benchmark.py compare benchmarks/baseline.json benchmarks/current.json
+        python benchmark.py startup --budget 500 --target neon_client.pyz
+"""
+
+import argparse
+import contextlib
+import gc
+import itertools
+import json
+import os
+import platform
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+from time import perf_counter_ns
+
+import simplefix
+
+from marketdata.helpers import load_config
+from marketdata.history import history
+from marketdata.simplefix_application import SimpleFIXApplication
+
+CURRENCIES = ['EUR', 'GBP', 'USD', 'JPY', 'CHF', 'AUD', 'CAD', 'NZD', 'SEK', 'NOK',
+              'DKK', 'SGD', 'HKD', 'MXN', 'ZAR', 'TRY', 'PLN', 'CZK', 'HUF', 'CNH']
+
+
+def make_symbols(count):
+    """Distinct pairs; past the 380 permutations of CURRENCIES they repeat as 'EUR/GBP.2', 'EUR/GBP.3', ..."""
+    pairs = [f'{base}/{quote}' for base, quote in itertools.permutations(CURRENCIES, 2)]
+    return [pairs[i % len(pairs)] + (f'.{i // len(pairs) + 1}' if i >= len(pairs) else '') for i in range(count)]
+
+
+##############################################################################
+# Synthetic frames, shaped like the ones Neon sends (see logs/neon_eurusd_messages.log)
+
+def _header(msg_type, seq):
+    msg = simplefix.FixMessage()
+    msg.append_pair(8, "FIX.4.4")
+    msg.append_pair(35, msg_type)
+    msg.append_pair(34, str(seq))
+    msg.append_pair(49, "demo.fxgrid")
+    msg.append_pair(52, "20250721-21:31:17.060")
+    msg.append_pair(56, "quote.YM13CUST14.01")
+    msg.append_pair(57, "YM13CUST14")
+    return msg
+
+
+def _price(level, side, seq):
+    tick = (seq % 7) * 0.00001
+    return round(1.16920 - level * 0.00003 + tick if side == '0' else 1.16938 + level * 0.00003 + tick, 5)
+
+
+def make_snapshot(symbol, depth, seq=1):
+    msg = _header('W', seq)
+    msg.append_pair(55, symbol)
+    msg.append_pair(262, "1")
+    msg.append_pair(460, "4")
+    msg.append_pair(268, str(2 * depth))
+    for side, name in (('0', 'BID'), ('1', 'OFFER')):
+        for level in range(depth):
+            msg.append_pair(269, side)
+            msg.append_pair(270, f'{_price(level, side, seq):.5f}')
+            msg.append_pair(15, symbol[:3])
+            msg.append_pair(271, str(500000 * (level + 1)))
+            msg.append_pair(276, "A")
+            msg.append_pair(282, "YM13")
+            msg.append_pair(299, f'{seq:x}_{name}{level or ""}')
+            msg.append_pair(290, str(level))
+    return msg
+
+
+def make_incremental(symbol, depth, seq=1):
+    msg = _header('X', seq)
+    msg.append_pair(262, "1")
+    msg.append_pair(268, str(2 * depth))
+    for side in ('0', '1'):
+        for level in range(depth):
+            msg.append_pair(279, "1")  # MDUpdateAction = Change
+            msg.append_pair(269, side)
+            msg.append_pair(55, symbol)
+            msg.append_pair(270, f'{_price(level, side, seq):.5f}')
+            msg.append_pair(271, str(500000 * (level + 1)))
+            msg.append_pair(290, str(level))
+    return msg
+
+
+def make_mass_quote(symbols, seq=1):
+    msg = _header('i', seq)
+    msg.append_pair(117, str(seq))
+    msg.append_pair(296, "1")
+    msg.append_pair(302, "1")
+    msg.append_pair(295, str(len(symbols)))
+    for i, symbol in enumerate(symbols):
+        msg.append_pair(299, str(i))
+        msg.append_pair(55, symbol)
+        msg.append_pair(132, f'{_price(0, "0", seq):.5f}')
+        msg.append_pair(133, f'{_price(0, "1", seq):.5f}')
+        msg.append_pair(134, "1000000")
+        msg.append_pair(135, "1000000")
+    return msg
+
+
+def parsed(messages):
+    """Encode and re-parse, so the benchmark sees messages exactly as the receive path does"""
+    parser = simplefix.FixParser()
+    result = []
+    for msg in messages:
+        parser.append_buffer(msg.encode())
+        result.append(parser.get_message())
+    return result
+
+
+##############################################################################
+# Measurement
+
+def measure(operation, inputs, iterations, repeat):
+    """
+    Best of `repeat` timed runs of `iterations` calls, cycling through
+    `inputs`. CPython has no allocation counter, so allocations are reported
+    as traced peak bytes per call (transient) and net retained blocks per call.
+    """
+    count = len(inputs)
+    for i in range(min(count, iterations)):
+        operation(inputs[i])
+
+    best_ns = None
+    for _ in range(repeat):
+        gc.collect()
+        started = perf_counter_ns()
+        for i in range(iterations):
+            operation(inputs[i % count])
+        elapsed = perf_counter_ns() - started
+        best_ns = elapsed if best_ns is None else min(best_ns, elapsed)
+
+    samples = min(iterations, 200)
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    peak_total = 0
+    for i in range(samples):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        operation(inputs[i % count])
+        peak_total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    gc.collect()
+    blocks_after = sys.getallocatedblocks()
+
+    return {
+        'iterations': iterations,
+        'ns_per_msg': best_ns / iterations,
+        'msgs_per_s': iterations / (best_ns / 1e9),
+        'peak_bytes_per_msg': peak_total / samples,
+        'retained_blocks_per_msg': (blocks_after - blocks_before) / samples,
+    }
+
+
+def run(config_file, depths, symbol_counts, iterations, repeat, capacity=4096):
+    config = load_config(config_file)
+    # the default ring of 100k ticks per symbol would dominate memory with hundreds of symbols
+    config.setdefault('HISTORY', {})['Capacity'] = str(capacity)
+    app = SimpleFIXApplication(config, None, verbose=False, message_log_file='')
+    results = {}
+
+    def record(name, operation, inputs):
+        results[name] = measure(operation, inputs, iterations, repeat)
+        print(f"{name:55} {results[name]['msgs_per_s']:>12,.0f} msg/s "
+              f"{results[name]['peak_bytes_per_msg']:>9,.0f} B/msg", file=sys.stderr)
+
+    for symbols in symbol_counts:
+        names = make_symbols(symbols)
+        for depth in depths:
+            snapshots = parsed(make_snapshot(names[i % symbols], depth, i) for i in range(max(symbols, 64)))
+            incrementals = parsed(make_incremental(names[i % symbols], depth, i) for i in range(max(symbols, 64)))
+            record(f'extract/W/depth={depth}/symbols={symbols}', app._extract_market_data_entries, snapshots)
+            record(f'extract/X/depth={depth}/symbols={symbols}', app._extract_market_data_entries, incrementals)
+            record(f'process_message/W/depth={depth}/symbols={symbols}', app.process_message, snapshots)
+            record(f'process_message/X/depth={depth}/symbols={symbols}', app.process_message, incrementals)
+        quotes = parsed(make_mass_quote(names, i) for i in range(16))
+        record(f'process_message/i/symbols={symbols}', app.process_message, quotes)
+
+    for depth in depths:
+        _history = history('EUR/USD', save_history_to_files=False, capacity=capacity)
+        updates = [(1753133477.0 + i * 0.001, 'EUR/USD', i % depth,
+                    _price(i % depth, '0', i), _price(i % depth, '1', i), 1e6, 1e6) for i in range(1024)]
+        record(f'update_asset/depth={depth}', lambda args: _history._update_asset(*args), updates)
+
+    # the production tick processor without a socket, as in replay.py
+    from neon_client import MultiCurrencyTickProcessor
+    from replay import ReplayTickProcessor, SimulatedClock
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for symbols in symbol_counts:
+            names = make_symbols(symbols)
+            processor = ReplayTickProcessor(names, SimulatedClock(), config_file, False)
+            processor_app = processor.client.app
+            processor_app.config.setdefault('HISTORY', {})['Capacity'] = str(capacity)
+            for i, symbol in enumerate(names):
+                processor_app.history_dict[symbol] = processor_app._create_history(symbol)
+
+            def on_tick(i, processor=processor, app=processor_app, names=names):
+                symbol = names[i % len(names)]
+                _history = app.history_dict[symbol]
+                _history.BID_TOB = _price(0, '0', i)
+                _history.ASK_TOB = _price(0, '1', i)
+                # the base class method: ReplayTickProcessor.on_tick adds its own timing
+                MultiCurrencyTickProcessor.on_tick(processor, symbol, app)
+
+            record(f'on_tick/symbols={symbols}', on_tick, list(range(4096)))
+            processor.client.stop()
+
+        output = {"ticker": "EUR/USD", "bid": 1.1692, "ask": 1.16938, "midprice": 1.16929,
+                  "spread": 0.00018, "err": None}
+        record('json_output', lambda output: print(json.dumps(output)), [output])
+
+    return {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=20.0):
+    """Rows of (name, baseline msg/s, current msg/s, change %, regression flag)"""
+    rows = []
+    for name, base in sorted(baseline['results'].items()):
+        result = current['results'].get(name)
+        if result is None:
+            continue
+        change = (result['msgs_per_s'] - base['msgs_per_s']) / base['msgs_per_s'] * 100
+        more_memory = result['peak_bytes_per_msg'] > base['peak_bytes_per_msg'] * (1 + threshold / 100) + 64
+        rows.append((name, base['msgs_per_s'], result['msgs_per_s'], change,
+                     change < -threshold or more_memory))
+    return rows
+
+
+def startup(config_file, runs=5, target='neon_client.py', python=sys.executable):
+    """Reports of `runs` cold starts, each from process creation to the first tick"""
+    from loadtest import write_config
+    from mock_server import MockNeonServer
+    root = os.path.dirname(os.path.abspath(__file__))
+    reports = []
+    for _ in range(runs):
+        server = MockNeonServer(rate=100).start()
+        scratch = tempfile.mkdtemp(prefix='neon_startup_')
+        report_file = os.path.join(scratch, 'startup.json')
+        run_config = os.path.join(scratch, 'neon.conf')
+        write_config(config_file, run_config, {
+            'QUOTE SESSION': {'SocketConnectHost': server.host, 'SocketConnectPort': server.port,
+                              'RequestInterval': 0},
+            'STARTUP': {'ReportFile': report_file},
+        })
+        # own process group on Windows, so CTRL_BREAK_EVENT below stops only the client
+        process = subprocess.Popen([python, '-u', target, '--instruments', 'EUR/USD', '--config', run_config],
+                                   stdout=subprocess.PIPE, text=True, cwd=root,
+                                   creationflags=getattr(subprocess, 'CREATE_NEW_PROCESS_GROUP', 0))
+        try:
+            # the report is written before the first price is printed
+            for line in process.stdout:
+                if line.startswith('{') and '"ticker"' in line:
+                    break
+            with open(report_file) as f:
+                reports.append(json.load(f))
+        finally:
+            process.send_signal(signal.SIGINT if os.name != 'nt' else signal.CTRL_BREAK_EVENT)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            server.stop()
+            shutil.rmtree(scratch, ignore_errors=True)
+    return reports
+
+
+##############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Microbenchmarks for the Neon feed hot paths')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the benchmarks and save the results')
+    run_parser.add_argument('--output', type=str, default='benchmarks/baseline.json')
+    run_parser.add_argument('--config', type=str, default='config/neon.conf', help='Config file to use')
+    run_parser.add_argument('--depths', type=str, default='1,5,10', help='Book depths to generate')
+    run_parser.add_argument('--symbols', type=str, default='1,50,300', help='Symbol counts to generate')
+    run_parser.add_argument('--iterations', type=int, default=20000)
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--capacity', type=int, default=4096, help='Tick history capacity per symbol')
+
+    compare_parser = commands.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=20.0,
+                                help='Slowdown (or memory growth) in percent that counts as a regression')
+
+    startup_parser = commands.add_parser('startup', help='Time cold starts against the mock server')
+    startup_parser.add_argument('--config', type=str, default='config/neon.conf', help='Base config file')
+    startup_parser.add_argument('--target', type=str, default='neon_client.py',
+                                help='Script or zipapp to start (see bundle.py)')
+    startup_parser.add_argument('--runs', type=int, default=5)
+    startup_parser.add_argument('--budget', type=float, default=500.0,
+                                help='Median milliseconds from process start to first tick')
+    args = parser.parse_args()
+
+    if args.command == 'startup':
+        reports = startup(args.config, args.runs, args.target)
+        for name in reports[0]['phases_ms']:
+            print(f"{name:15} {statistics.median(r['phases_ms'][name] for r in reports):8.1f} ms")
+        total = statistics.median(r['total_ms'] for r in reports)
+        heavy = sorted({name for r in reports for name in r['heavy_modules']})
+        print(f"{'first tick':15} {total:8.1f} ms (median of {len(reports)}, budget {args.budget:g} ms)")
+        if heavy:
+            print(f"Loaded before the first tick: {', '.join(heavy)}")
+        sys.exit(1 if total > args.budget or heavy else 0)
+    elif args.command == 'run':
+        report = run(args.config,
+                     [int(d) for d in args.depths.split(',') if d.strip()],
+                     [int(s) for s in args.symbols.split(',') if s.strip()],
+                     args.iterations, args.repeat, args.capacity)
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {len(report['results'])} results to {args.output}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = 0
+        for name, base, now, change, regression in compare(baseline, current, args.threshold):
+            regressions += regression
+            print(f"{'REGRESSION' if regression else 'ok':10} {name:55} {base:>12,.0f} -> {now:>12,.0f} msg/s ({change:+.1f}%)")
+        print(f"{regressions} regression(s)")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    bundle.py
+    Build neon_client.pyz, a zipapp of precompiled bytecode
+
+    neon_client.py and the marketdata package are compiled to .pyc files and
+    stored without their sources, so zipimport loads the bytecode directly.
+    (zipimport cannot write a bytecode cache, so a zipapp of plain .py files
+    would recompile every module on every start.) The bytecode only runs on
+    the Python version that built it. Run it from the directory holding
+    config/ and logs/, like neon_client.py.
+
+    Example:
+        python bundle.py --output neon_client.pyz
+        python -u neon_client.pyz --instruments EUR/USD,GBP/USD
+"""
+
+import argparse
+import importlib.util
+import os
+import py_compile
+import sys
+import tempfile
+import zipfile
+
+MAIN = """import runpy
+runpy.run_module('neon_client', run_name='__main__', alter_sys=True)
+"""
+
+
+def _sources(modules, package_dirs):
+    """(path on disk, module path inside the archive without extension)"""
+    yield from modules
+    for package_dir in package_dirs:
+        base = os.path.dirname(package_dir)
+        for directory, subdirs, files in os.walk(package_dir):
+            subdirs[:] = [d for d in subdirs if d != '__pycache__']
+            for file_name in sorted(files):
+                if file_name.endswith('.py'):
+                    path = os.path.join(directory, file_name)
+                    yield path, os.path.relpath(path, base)[:-3].replace(os.sep, '/')
+
+
+def build(output, include=(), optimize=0):
+    root = os.path.dirname(os.path.abspath(__file__))
+    package_dirs = [os.path.join(root, 'marketdata')]
+    modules = [(os.path.join(root, 'neon_client.py'), 'neon_client')]
+    for name in include:
+        spec = importlib.util.find_spec(name)
+        if spec is None or spec.origin is None:
+            raise SystemExit(f"[ERROR] Cannot find module {name} to include")
+        if spec.submodule_search_locations:
+            package_dirs.append(os.path.dirname(spec.origin))
+        else:
+            modules.append((spec.origin, name))
+
+    count = 0
+    with tempfile.TemporaryDirectory() as scratch, open(output, 'wb') as f:
+        f.write(f'#!/usr/bin/env python{sys.version_info.major}.{sys.version_info.minor}\n'.encode())
+        # stored, not deflated: nothing to decompress on import
+        with zipfile.ZipFile(f, 'w', compression=zipfile.ZIP_STORED) as archive:
+            archive.writestr('__main__.py', MAIN)
+            for path, module in _sources(modules, package_dirs):
+                compiled = py_compile.compile(path, cfile=os.path.join(scratch, 'module.pyc'),
+                                              dfile=module + '.py', doraise=True, optimize=optimize)
+                archive.write(compiled, module + '.pyc')
+                count += 1
+    os.chmod(output, 0o755)
+    return count
+
+
+##############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build a precompiled zipapp of neon_client.py')
+    parser.add_argument('--output', type=str, default='neon_client.pyz')
+    parser.add_argument('--include', type=str, default='',
+                        help='Comma-separated installed pure-Python packages to bundle too (e.g. simplefix)')
+    parser.add_argument('--optimize', type=int, default=0, choices=(0, 1, 2),
+                        help='Bytecode optimization level, as python -O / -OO')
+    args = parser.parse_args()
+    count = build(args.output, [name.strip() for name in args.include.split(',') if name.strip()], args.optimize)
+    print(f"Bundled {count} modules into {args.output} for Python {sys.version_info.major}.{sys.version_info.minor}")
@@ -0,0 +1,103 @@
+from collections import deque
+
+# timeframe suffix -> seconds ('1s', '1m'/'1min'/'1T', '5m', '1h', '1d')
+_UNITS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 't': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_timeframe(time_frame):
+    """Convert '1s', '1m', '5min', '1h' (pandas style aliases too) to seconds"""
+    if isinstance(time_frame, (int, float)):
+        return float(time_frame)
+    text = time_frame.strip().lower()
+    digits = len(text) - len(text.lstrip('0123456789.'))
+    number, unit = text[:digits] or '1', text[digits:]
+    if unit not in _UNITS:
+        raise ValueError(f"Unknown timeframe: {time_frame}")
+    return float(number) * _UNITS[unit]
+
+
+class Bar:
+    __slots__ = ('time', 'open', 'high', 'low', 'close', 'ticks')
+
+    def __init__(self, time, price):
+        self.time = time  # bar open time, epoch seconds
+        self.open = self.high = self.low = self.close = price
+        self.ticks = 1
+
+    def as_dict(self):
+        return {'time': self.time, 'open': self.open, 'high': self.high,
+                'low': self.low, 'close': self.close, 'ticks': self.ticks}
+
+    def __repr__(self):
+        return f"Bar({self.time}, O={self.open}, H={self.high}, L={self.low}, C={self.close}, n={self.ticks})"
+
+
+class BarSeries:
+    """OHLC bars of one price (bid, ask or mid) at one timeframe, built online"""
+
+    def __init__(self, time_frame, keep=500):
+
+        self.seconds = parse_timeframe(time_frame)
+        self.current = None
+        self.closed = deque(maxlen=keep)  # oldest first
+
+    def update(self, time, price):
+        start = time - time % self.seconds
+        bar = self.current
+        if bar is None or start != bar.time:
+            if bar is not None:
+                self.closed.append(bar)
+            self.current = Bar(start, price)
+            return
+        if price > bar.high:
+            bar.high = price
+        elif price < bar.low:
+            bar.low = price
+        bar.close = price
+        bar.ticks += 1
+
+    def last(self, n=1):
+        """The last n closed bars, oldest first"""
+        closed = self.closed
+        if n >= len(closed):
+            return list(closed)
+        # deque indexing near either end is O(1)
+        return [closed[-i] for i in range(n, 0, -1)]
+
+
+class BarBuilder:
+    """
+    Streaming multi-timeframe bar builder. Every tick costs one O(1) update
+    per (timeframe, side); the current bar and the last `keep` closed bars are
+    always available without touching the tick history.
+    """
+
+    SIDES = ('bid', 'ask', 'mid')
+
+    def __init__(self, time_frames=('1s', '1m', '5m'), sides=SIDES, keep=500):
+
+        self.sides = tuple(sides)
+        self.series = {}  # format: ('1m', 'mid'): BarSeries
+        for time_frame in time_frames:
+            for side in self.sides:
+                self.series[(time_frame, side)] = BarSeries(time_frame, keep)
+        self._by_side = [(side, [s for (tf, sd), s in self.series.items() if sd == side])
+                         for side in self.sides]
+
+    def update(self, time, bid, ask):
+        prices = {'bid': bid, 'ask': ask, 'mid': (bid + ask) / 2}
+        for side, series_list in self._by_side:
+            price = prices[side]
+            for series in series_list:
+                series.update(time, price)
+
+    def get(self, time_frame, side='mid'):
+        return self.series.get((time_frame, side))
+
+    def current(self, time_frame, side='mid'):
+        series = self.get(time_frame, side)
+        return series.current if series else None
+
+    def last(self, time_frame, side='mid', n=1):
+        series = self.get(time_frame, side)
+        return series.last(n) if series else []
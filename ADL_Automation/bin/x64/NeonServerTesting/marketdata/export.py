@@ -0,0 +1,205 @@
+"""
+# Arrow / Parquet export of tick and bar history.
+#
+# Data is written in chunks of `chunk_rows` rows so memory stays bounded no
+# matter how much history there is. pyarrow is only imported when an export
+# actually runs; the feed itself never needs it.
+"""
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+from .tickstore import TickFile, FIELDS
+
+CHUNK_ROWS = 65536
+
+
+def _writer(path, schema, file_format):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if file_format == 'parquet':
+        return pq.ParquetWriter(path, schema, compression='zstd')
+    return pa.ipc.new_file(path, schema)
+
+
+def _tick_schema():
+    import pyarrow as pa
+    return pa.schema([('symbol', pa.string())] + [(name, pa.float64()) for name in FIELDS]
+                     + [('depth', pa.int16())])
+
+
+def _tick_batch(symbol, columns, schema, depth=None):
+    """`depth`: the depth column, None for top of book rows"""
+    import pyarrow as pa
+
+    rows = len(columns['time'])
+    arrays = [pa.array([symbol] * rows, pa.string())]
+    arrays += [pa.array(columns[name], pa.float64()) for name in FIELDS]
+    arrays.append(pa.array(depth if depth is not None else [0] * rows, pa.int16()))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_ticks(histories, path, file_format='parquet', chunk_rows=CHUNK_ROWS):
+    """
+    Export the in-memory ticks of one or more histories to a single file:
+    the top of book (depth 0), then any levels below it captured in DEPTH.
+    Each chunk is copied out of the ring buffer and checked against the
+    buffer's write counter, so rows overwritten mid-export are dropped
+    rather than exported torn.
+    """
+    schema = _tick_schema()
+    rows_written = 0
+    with _writer(path, schema, file_format) as writer:
+        for _history in histories:
+            rows_written += _export_buffer(writer, schema, _history.symbol, _history.TICKS, chunk_rows)
+            if _history.DEPTH is not None:
+                rows_written += _export_buffer(writer, schema, _history.symbol, _history.DEPTH, chunk_rows,
+                                               with_depth=True)
+    return rows_written
+
+
+def _export_buffer(writer, schema, symbol, ticks, chunk_rows, with_depth=False):
+    import numpy as np
+
+    rows_written = 0
+    total_at_start = ticks.total
+    live = len(ticks)
+    first_total = total_at_start - live  # write counter of the oldest live tick
+    names = FIELDS + ('depth',) if with_depth else FIELDS
+    for offset in range(0, live, chunk_rows):
+        chunk_start = first_total + offset
+        n = min(chunk_rows, live - offset)
+        # views over the most recent ticks, starting at chunk_start unless it was evicted
+        views = ticks.views(ticks.total - chunk_start)
+        evicted = ticks.total - chunk_start - len(views['time'])
+        n -= evicted
+        if n <= 0:
+            continue
+        columns = {name: np.array(views[name][:n], dtype=np.float64) for name in names}
+        # rows the feed overwrote while they were being copied
+        overwritten = ticks.total - ticks.capacity - (chunk_start + evicted)
+        if overwritten > 0:
+            columns = {name: column[overwritten:] for name, column in columns.items()}
+        if len(columns['time']):
+            depth = columns['depth'].astype(np.int16) if with_depth else None
+            writer.write_batch(_tick_batch(symbol, columns, schema, depth))
+            rows_written += len(columns['time'])
+    return rows_written
+
+
+def export_tick_file(tick_path, path, symbol='', file_format='parquet', chunk_rows=CHUNK_ROWS):
+    """Stream a .ticks day file (memory mapped) to Parquet/Arrow"""
+    import numpy as np
+
+    schema = _tick_schema()
+    with TickFile(tick_path) as tick_file, _writer(path, schema, file_format) as writer:
+        columns = {name: np.asarray(tick_file.column(name)) for name in FIELDS}
+        chunk = None
+        for start in range(0, len(tick_file), chunk_rows):
+            chunk = {name: column[start:start + chunk_rows] for name, column in columns.items()}
+            writer.write_batch(_tick_batch(symbol, chunk, schema))
+        rows = len(tick_file)
+        del columns, chunk
+    return rows
+
+
+def export_bars(histories, path, file_format='parquet'):
+    """Export the closed and current bars of every configured timeframe/side"""
+    import pyarrow as pa
+
+    schema = pa.schema([('symbol', pa.string()), ('timeframe', pa.string()), ('side', pa.string()),
+                        ('time', pa.float64()), ('open', pa.float64()), ('high', pa.float64()),
+                        ('low', pa.float64()), ('close', pa.float64()), ('ticks', pa.int64())])
+    rows_written = 0
+    with _writer(path, schema, file_format) as writer:
+        for _history in histories:
+            if _history.BARS is None:
+                continue
+            for (time_frame, side), series in _history.BARS.series.items():
+                bars = list(series.closed) + ([series.current] if series.current else [])
+                if not bars:
+                    continue
+                batch = pa.RecordBatch.from_pydict({
+                    'symbol': [_history.symbol] * len(bars),
+                    'timeframe': [time_frame] * len(bars),
+                    'side': [side] * len(bars),
+                    'time': [bar.time for bar in bars],
+                    'open': [bar.open for bar in bars],
+                    'high': [bar.high for bar in bars],
+                    'low': [bar.low for bar in bars],
+                    'close': [bar.close for bar in bars],
+                    'ticks': [bar.ticks for bar in bars],
+                }, schema=schema)
+                writer.write_batch(batch)
+                rows_written += len(bars)
+    return rows_written
+
+
+class ExportWorker:
+    """
+    Background exporter. `request()` queues an export on demand; with an
+    `interval` (seconds) exports are also queued on a schedule. The export
+    runs on this worker's thread, never on the feed thread.
+    """
+
+    def __init__(self, history_dict, directory='export', file_format='parquet', interval=0):
+
+        self.history_dict = history_dict
+        self.directory = directory
+        self.file_format = file_format
+        self.interval = interval
+        self.extension = 'parquet' if file_format == 'parquet' else 'arrow'
+        self._jobs = queue.Queue()
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="ExportWorker")
+        self._thread.start()
+
+    def request(self):
+        """Queue an export of everything currently held in memory"""
+        self._jobs.put('export')
+
+    def _run(self):
+        while self.running:
+            try:
+                job = self._jobs.get(timeout=self.interval if self.interval > 0 else None)
+            except queue.Empty:
+                job = 'export'  # scheduled
+            if job is None:
+                break
+            try:
+                self.export()
+            except Exception as e:
+                print(f"[ERROR] Export failed: {e}")
+
+    def export(self):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+        histories = list(self.history_dict.values())
+        ticks_path = os.path.join(self.directory, f'ticks_{stamp}.{self.extension}')
+        bars_path = os.path.join(self.directory, f'bars_{stamp}.{self.extension}')
+        ticks = export_ticks(histories, ticks_path, self.file_format)
+        bars = export_bars(histories, bars_path, self.file_format)
+        return ticks_path, ticks, bars_path, bars
+
+    def stop(self):
+        self.running = False
+        self._jobs.put(None)
+        self._thread.join(timeout=5)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export .ticks day files to Parquet or Arrow')
+    parser.add_argument('files', nargs='+', help='.ticks files written by the tick store')
+    parser.add_argument('--format', choices=('parquet', 'arrow'), default='parquet')
+    args = parser.parse_args()
+
+    for tick_path in args.files:
+        base = os.path.basename(tick_path).rsplit('.', 1)[0]
+        out_path = os.path.join(os.path.dirname(tick_path),
+                                f"{base}.{'parquet' if args.format == 'parquet' else 'arrow'}")
+        rows = export_tick_file(tick_path, out_path, symbol=base.rsplit('_', 1)[0], file_format=args.format)
+        print(f"Exported {rows} ticks to {out_path}")
@@ -1,5 +1,12 @@
 import logging
-from datetime import datetime
+from calendar import timegm
+from datetime import datetime, timedelta
+
+from .logqueue import AsyncHandler
+
+# date prefix caches: '20200720' -> midnight of that day
+_epoch_date_cache = {}
+_datetime_date_cache = {}
 
 """
 # Convert string to datetime
@@ -7,9 +14,79 @@ from datetime import datetime
 def str_to_datetime(date_time_str):
     try:
         # 20200720-07:32:15.114
-        return datetime.strptime(date_time_str, '%Y%m%d-%H:%M:%S.%f')
+        date_str = date_time_str[:8]
+        midnight = _datetime_date_cache.get(date_str)
+        if midnight is None:
+            midnight = datetime.strptime(date_str, '%Y%m%d')
+            _datetime_date_cache[date_str] = midnight
+        return midnight + timedelta(seconds=_time_of_day_seconds(date_time_str, 9))
     except:
+        try:
+            return datetime.strptime(date_time_str, '%Y%m%d-%H:%M:%S.%f')
+        except:
+            return None
+
+
+"""
+# Seconds since midnight for the HH:MM:SS[.fff] part starting at offset
+"""
+def _time_of_day_seconds(value, offset=0):
+    if value[offset + 2] != ':' or value[offset + 5] != ':':
+        raise ValueError(f'Invalid FIX time: {value}')
+    seconds = (int(value[offset:offset + 2]) * 3600
+               + int(value[offset + 3:offset + 5]) * 60
+               + int(value[offset + 6:offset + 8]))
+    fraction = value[offset + 9:]
+    if fraction:
+        seconds += int(fraction) / (10 ** len(fraction))
+    return seconds
+
+
+"""
+# Convert a FIX UTCTimestamp (tag 52/60) to epoch seconds.
+# The date prefix is converted once and cached, so the hot path is just
+# integer slicing of the time of day.
+"""
+def fix_timestamp_to_epoch(value):
+    if isinstance(value, bytes):
+        value = value.decode('ascii')
+    try:
+        # 20200720-07:32:15.114
+        date_str = value[:8]
+        midnight = _epoch_date_cache.get(date_str)
+        if midnight is None:
+            midnight = timegm((int(date_str[:4]), int(date_str[4:6]), int(date_str[6:8]), 0, 0, 0))
+            _epoch_date_cache[date_str] = midnight
+        return midnight + _time_of_day_seconds(value, 9)
+    except (ValueError, IndexError, TypeError):
+        return None
+
+
+"""
+# Combine MDEntryDate (272, YYYYMMDD) and MDEntryTime (273, HH:MM:SS.fff) to epoch seconds.
+# When the date is missing the date of the reference timestamp (usually SendingTime) is used.
+"""
+def fix_entry_time_to_epoch(entry_date, entry_time, reference=None):
+    if isinstance(entry_time, bytes):
+        entry_time = entry_time.decode('ascii')
+    if isinstance(entry_date, bytes):
+        entry_date = entry_date.decode('ascii')
+    if not entry_time:
         return None
+    if '-' in entry_time:
+        # some venues send a full UTCTimestamp in MDEntryTime
+        return fix_timestamp_to_epoch(entry_time)
+    try:
+        time_of_day = _time_of_day_seconds(entry_time)
+    except (ValueError, IndexError):
+        return None
+    if entry_date:
+        midnight = fix_timestamp_to_epoch(f'{entry_date}-00:00:00')
+    elif reference is not None:
+        midnight = reference - reference % 86400
+    else:
+        return None
+    return midnight + time_of_day if midnight is not None else None
 
 
 def datetime_to_str(date_time):
@@ -69,15 +146,39 @@ def extract_header_field_value(_FIX_API_Object, message):
 
 ##########################################################################
 
+"""
+# Load an INI style config file (e.g. config/neon.conf) into {section: {key: value}}
+"""
+def load_config(config_file):
+    config = {}
+    with open(config_file, 'r') as f:
+        current_section = None
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                current_section = line[1:-1]
+                config[current_section] = {}
+            elif '=' in line and current_section:
+                key, value = line.split('=', 1)
+                config[current_section][key] = value
+    return config
+
+##########################################################################
+
 """
 # setup a logger
 """
-def setup_logger(name, log_file, format_str, level=logging.INFO):
+def setup_logger(name, log_file, format_str, level=logging.INFO, async_queue=0):
 
     formatter = logging.Formatter(format_str)
 
     handler = logging.FileHandler(log_file)
     handler.setFormatter(formatter)
+    if async_queue > 0:
+        # file writes on a writer thread, records dropped (and counted) when the queue is full
+        handler = AsyncHandler(handler, queue_size=async_queue)
 
     logger = logging.getLogger(name)
     logger.setLevel(level)
@@ -89,12 +190,13 @@ def setup_logger(name, log_file, format_str, level=logging.INFO):
 """
 # log message
 """
-def log(logger, message, _print=False):
+def log(logger, message, *args, _print=False):
 
+    # with args, message % args is only formatted if (and where) the record is written
     if logger is not None:
-        logger.info(message)
+        logger.info(message, *args)
 
     if _print:
-        print(message)
+        print(message % args if args else message)
 
 ##########################################################################
@@ -0,0 +1,102 @@
+import mmap
+import os
+import struct
+import threading
+from collections import deque
+from time import monotonic_ns, time_ns
+
+MAGIC = b'NWJ1'
+# monotonic ns, wall clock ns, direction, payload length
+RECORD_HEADER = struct.Struct('<qqBI')
+INBOUND = 0
+OUTBOUND = 1
+
+
+class WireJournal:
+    """
+    Binary journal of raw inbound/outbound FIX bytes.
+
+    record() is called on the socket threads: it stamps the frame and appends
+    it to a deque (atomic in CPython, no lock taken) and returns. A writer
+    thread drains the deque and writes in batches. Set `enabled` to False to
+    pause journaling without closing the file.
+    """
+
+    def __init__(self, path, batch_interval=0.05, enabled=True):
+
+        self.path = path
+        self.batch_interval = batch_interval
+        self.enabled = enabled
+        self.records = 0
+        self.bytes = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="WireJournal")
+        self._thread.start()
+
+    def record(self, direction, data, mono_ns=None, wall_ns=None):
+        if not self.enabled:
+            return
+        self._pending.append((mono_ns or monotonic_ns(), wall_ns or time_ns(), direction, data))
+
+    def _drain(self):
+        pending = self._pending
+        if not pending:
+            return
+        buf = bytearray()
+        pack = RECORD_HEADER.pack
+        while pending:
+            mono_ns, wall_ns, direction, data = pending.popleft()
+            buf += pack(mono_ns, wall_ns, direction, len(data))
+            buf += data
+            self.records += 1
+        self._file.write(buf)
+        self._file.flush()
+        self.bytes += len(buf)
+
+    def _run(self):
+        while self.running:
+            self._wakeup.wait(self.batch_interval)
+            try:
+                self._drain()
+            except Exception as e:
+                print(f"[ERROR] Wire journal write error: {e}")
+
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self._drain()
+        self._file.close()
+
+
+def read_journal(path, direction=None):
+    """
+    Yield (monotonic_ns, wall_ns, direction, data) from a journal, memory
+    mapped. A record torn by a crash at the end of the file is ignored.
+    """
+    with open(path, 'rb') as f:
+        if os.path.getsize(path) <= len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a wire journal")
+            offset = len(MAGIC)
+            end = len(data)
+            unpack_from = RECORD_HEADER.unpack_from
+            header_size = RECORD_HEADER.size
+            while offset + header_size <= end:
+                mono_ns, wall_ns, record_direction, length = unpack_from(data, offset)
+                offset += header_size
+                if offset + length > end:
+                    break
+                if direction is None or direction == record_direction:
+                    yield mono_ns, wall_ns, record_direction, data[offset:offset + length]
+                offset += length
@@ -0,0 +1,98 @@
+"""
+# Non-blocking logging.
+#
+# AsyncHandler puts the unformatted LogRecord on a bounded queue and returns;
+# a writer thread formats it and hands it to the real (file) handler. When
+# the queue is full the record is dropped and counted, so a slow disk never
+# stalls the thread that logs. MessageSampler decides per MsgType which
+# inbound messages are logged at all.
+"""
+import logging
+import queue
+import threading
+import weakref
+
+_handlers = weakref.WeakSet()
+
+
+class AsyncHandler(logging.Handler):
+
+    def __init__(self, target, queue_size=10000):
+
+        super().__init__(target.level)
+        self.target = target
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        _handlers.add(self)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="AsyncLogWriter")
+        self._thread.start()
+
+    def emit(self, record):
+        # no formatting here: msg % args happens on the writer thread
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            try:
+                self.target.handle(record)
+            except Exception:
+                self.target.handleError(record)
+
+    def close(self):
+        if self._thread.is_alive():
+            # the sentinel must get in even when the queue is full
+            self.queue.put(None)
+            self._thread.join(timeout=5)
+        self.target.close()
+        super().close()
+
+
+def dropped_records():
+    """Records dropped by every AsyncHandler because its queue was full"""
+    return sum(handler.dropped for handler in list(_handlers))
+
+
+def queued_records():
+    """Records waiting in every AsyncHandler's queue"""
+    return sum(handler.queue.qsize() for handler in list(_handlers))
+
+
+def make_async(logger, queue_size=10000):
+    """Move every handler of `logger` behind its own AsyncHandler; returns the async handlers"""
+    handlers = []
+    for handler in list(logger.handlers):
+        if isinstance(handler, AsyncHandler):
+            handlers.append(handler)
+            continue
+        async_handler = AsyncHandler(handler, queue_size)
+        logger.removeHandler(handler)
+        logger.addHandler(async_handler)
+        handlers.append(async_handler)
+    return handlers
+
+
+class MessageSampler:
+    """
+    Log 1 in N messages of each MsgType, e.g. rates {'0': 1, 'W': 100}:
+    every heartbeat, one snapshot in a hundred. 0 means never.
+    """
+
+    def __init__(self, rates=None, default=1):
+
+        self.rates = dict(rates or {})
+        self.default = default
+        self._counts = {}
+
+    def sample(self, msg_type):
+        every = self.rates.get(msg_type, self.default)
+        if every <= 1:
+            return every == 1
+        count = self._counts.get(msg_type, 0)
+        self._counts[msg_type] = count + 1
+        return count % every == 0
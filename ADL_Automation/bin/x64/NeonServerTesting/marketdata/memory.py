@@ -0,0 +1,214 @@
+"""
+# Memory diagnostics: periodic tracemalloc snapshots, grouped by component.
+#
+# Every allocation is charged to the innermost frame in our own code (a
+# marketdata module or neon_client), so a log record built by the logging
+# module on behalf of simplefix_application counts against the latter; it
+# is also grouped by the library that made it. Each report gives the traced
+# total, growth per second, bytes per tick since the previous report and
+# the sizes of watched containers. Only allocations made while it is on are
+# traced, so the first report is a baseline. tracemalloc slows every allocation, so
+# this is meant to be switched on briefly and off again; it is only imported
+# when switched on.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from time import monotonic
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+_ROOT_DIR = os.path.dirname(_PACKAGE_DIR)
+
+
+def _own_component(filename):
+    """'marketdata.history' or 'neon_client' for our files, None otherwise"""
+    directory, name = os.path.split(filename)
+    if directory == _PACKAGE_DIR:
+        return 'marketdata.' + name[:-3]
+    if directory == _ROOT_DIR and name.endswith('.py'):
+        return name[:-3]
+    return None
+
+
+def _library(filename):
+    """Top-level package or module of a file outside our code, e.g. 'simplefix', 'logging', 'json'"""
+    parts = filename.replace('\\', '/').split('/')
+    for marker in ('site-packages', 'dist-packages'):
+        if marker in parts:
+            index = parts.index(marker)
+            if index + 1 < len(parts):
+                return parts[index + 1].split('.')[0]
+    for index in range(len(parts) - 1, 0, -1):
+        if parts[index - 1].startswith('python') or parts[index - 1] == 'Lib':
+            return parts[index].split('.')[0]
+    return os.path.basename(filename).split('.')[0] or filename
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+
+class MemoryDiagnostics:
+    """
+    Switched on and off at runtime with toggle(). While on, a snapshot is
+    taken every `interval` seconds, logged, and appended as one JSON line
+    to logs/memory_<timestamp>.jsonl. `ticks` returns the number of ticks
+    processed so far; `watches` maps names to callables returning a size.
+    With `duration` > 0 it switches itself off after that many seconds.
+    """
+
+    def __init__(self, ticks, watches=None, interval=30.0, frames=4, top=10,
+                 duration=0.0, directory='logs', logger=None):
+
+        self.ticks = ticks
+        self.watches = watches if watches is not None else {}  # format: 'received_snapshots': callable
+        self.interval = interval
+        self.frames = frames
+        self.top = top
+        self.duration = duration
+        self.directory = directory
+        self.logger = logger
+        self.path = None
+        self._stop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def _log(self, text, warning=False):
+        if self.logger is not None:
+            (self.logger.warning if warning else self.logger.info)(text)
+
+    def toggle(self):
+        """Start or stop; returns True when now running"""
+        with self._lock:
+            if self._thread is None:
+                self._start()
+                return True
+            self._join()
+            return False
+
+    def stop(self):
+        with self._lock:
+            if self._thread is not None:
+                self._join()
+
+    def _join(self):
+        # waited for, so a quick off/on cannot start while the old run still owns tracemalloc
+        thread, self._thread = self._thread, None
+        self._stop.set()
+        thread.join(timeout=30)
+
+    def _start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f'memory_{datetime.now().strftime("%d-%m-%Y_%H-%M-%S")}.jsonl')
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), daemon=True, name="MemoryDiagnostics")
+        self._thread.start()
+
+    def _run(self, stop):
+        import tracemalloc
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self.frames)
+        self._log(f"[MEMORY] Diagnostics on, snapshot every {self.interval:g}s, writing {self.path}")
+        started = monotonic()
+        try:
+            previous = self._measure(None, started)
+            while not stop.wait(self.interval):
+                previous = self._measure(previous, started)
+                if self.duration > 0 and monotonic() - started >= self.duration:
+                    break
+            if self.duration <= 0 or monotonic() - started < self.duration:
+                self._measure(previous, started)
+        except Exception as e:
+            self._log(f"[ERROR] Memory diagnostics failed: {e}", warning=True)
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            # switched off by its duration; not under _lock, which _join holds while waiting for us
+            if self._stop is stop:
+                self._thread = None
+            self._log("[MEMORY] Diagnostics off")
+
+    def _measure(self, previous, started):
+        import tracemalloc
+        now = monotonic()
+        ticks = self.ticks()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        components = {}
+        libraries = {}
+        total = 0
+        for stat in snapshot.statistics('traceback'):
+            total += stat.size
+            component = None
+            for frame in stat.traceback:  # innermost first
+                component = _own_component(frame.filename)
+                if component is not None:
+                    break
+            component = component or 'other'
+            components[component] = components.get(component, 0) + stat.size
+            library = _library(stat.traceback[0].filename)
+            libraries[library] = libraries.get(library, 0) + stat.size
+
+        report = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'elapsed_s': now - started,
+            'ticks': ticks,
+            'traced_bytes': total,
+            'traced_peak_bytes': tracemalloc.get_traced_memory()[1],
+            'rss_bytes': _rss_bytes(),
+            'components': components,
+            'libraries': libraries,
+            'watches': {},
+        }
+        for name, size in list(self.watches.items()):
+            try:
+                report['watches'][name] = size()
+            except Exception as e:
+                report['watches'][name] = f'error: {e}'
+
+        if previous is not None:
+            seconds = now - previous['_monotonic']
+            tick_delta = ticks - previous['ticks']
+            report['growth_bytes_per_s'] = (total - previous['traced_bytes']) / seconds if seconds > 0 else None
+            report['bytes_per_tick'] = (total - previous['traced_bytes']) / tick_delta if tick_delta else None
+            report['component_growth_bytes_per_s'] = {
+                name: (size - previous['components'].get(name, 0)) / seconds
+                for name, size in components.items()} if seconds > 0 else {}
+        self._write(report)
+
+        report['_monotonic'] = now
+        return report
+
+    def _write(self, report):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(report) + '\n')
+        largest = sorted(report['components'].items(), key=lambda item: -item[1])[:self.top]
+        summary = ', '.join(f'{name} {size / 1024:,.0f} KB' for name, size in largest)
+        text = f"[MEMORY] traced {report['traced_bytes'] / 2**20:,.1f} MB"
+        if report.get('growth_bytes_per_s') is not None:
+            text += f" ({report['growth_bytes_per_s'] / 1024:+,.1f} KB/s"
+            if report.get('bytes_per_tick') is not None:
+                text += f", {report['bytes_per_tick']:+,.0f} B/tick"
+            text += ")"
+        if report['rss_bytes'] is not None:
+            text += f", rss {report['rss_bytes'] / 2**20:,.1f} MB"
+        self._log(f"{text}; {summary}")
+        if report['watches']:
+            self._log("[MEMORY] " + ', '.join(f'{name}={value}' for name, value in report['watches'].items()))
@@ -0,0 +1,169 @@
+import threading
+from datetime import datetime, timedelta
+from time import monotonic, time
+
+# Default minute marker / TAS activation windows (local time, end exclusive)
+DEFAULT_WINDOWS = [
+    ('10:30', '10:29:00', '10:31:00'),
+    ('12:30', '12:29:00', '12:31:00'),
+    ('14:30', '14:29:00', '14:31:00'),
+    ('16:30', '16:29:00', '16:31:00'),
+    ('19:30 TAS', '19:28:00', '19:31:00'),
+]
+
+
+def _seconds_of_day(text):
+    parts = [int(part) for part in text.strip().split(':')]
+    while len(parts) < 3:
+        parts.append(0)
+    return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+
+def windows_from_config(section):
+    """
+    Parse a [MINUTE MARKERS] config section: 'name=HH:MM[:SS]-HH:MM[:SS]'.
+    Falls back to DEFAULT_WINDOWS when the section is empty.
+    """
+    windows = []
+    for name, value in section.items():
+        if '-' not in value:
+            continue
+        start, end = value.split('-', 1)
+        windows.append((name.strip(), start.strip(), end.strip()))
+    return windows or list(DEFAULT_WINDOWS)
+
+
+class ScheduleEngine:
+    """
+    Minute marker window schedule.
+
+    Each day's window boundaries are converted once to monotonic deadlines,
+    so the per-tick question "am I in a window and how far through" is a
+    pointer comparison, not a datetime.now() plus a scan. A timer thread
+    sleeps until the next boundary and fires on_window_start(name) /
+    on_window_end(name). With a simulated clock (set_clock) there is no
+    thread and run_due(now) fires them instead.
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS, on_window_start=None, on_window_end=None,
+                 clock=monotonic, wall_clock=time):
+
+        self.windows = sorted(((name, _seconds_of_day(start), _seconds_of_day(end))
+                               for name, start, end in windows), key=lambda w: w[1])
+        self.on_window_start = on_window_start
+        self.on_window_end = on_window_end
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self._day = None
+        self._schedule = []   # [(start_mono, end_mono, name)] for the current day
+        self._index = 0       # first window whose end is still ahead
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._active = None   # window the callbacks were last fired for
+        self._build(self._day_of(self.clock()))
+
+    def set_clock(self, clock, wall_clock):
+        """Follow another clock, e.g. the recorded times of a replay"""
+        with self._lock:
+            self.clock = clock
+            self.wall_clock = wall_clock
+            self._build(self._day_of(clock()))
+
+    def _day_of(self, now):
+        """Local date at `now` on the monotonic clock"""
+        return datetime.fromtimestamp(now - self.clock() + self.wall_clock()).date()
+
+    def _build(self, day):
+        """Precompute the monotonic boundaries of every window on `day`"""
+        offset = self.clock() - self.wall_clock()
+        midnight = datetime.combine(day, datetime.min.time())
+        schedule = []
+        for name, start, end in self.windows:
+            start_epoch = (midnight + timedelta(seconds=start)).timestamp()
+            end_epoch = (midnight + timedelta(seconds=end)).timestamp()
+            schedule.append((start_epoch + offset, end_epoch + offset, name))
+        self._day = day
+        self._schedule = schedule
+        self._index = 0
+
+    def _advance(self, now):
+        schedule = self._schedule
+        while self._index < len(schedule) and schedule[self._index][1] <= now:
+            self._index += 1
+        if self._index == len(schedule):
+            # all of today's windows are over: precompute tomorrow, or the day
+            # `now` is on when the clock jumped further (a replay starting)
+            self._build(max(self._day + timedelta(days=1), self._day_of(now)))
+            self._advance(now)
+
+    def current(self, now=None):
+        """(window name, progress 0..1) when inside a window, else None. O(1) amortised."""
+        if now is None:
+            now = self.clock()
+        if not self.windows:
+            return None
+        with self._lock:
+            if self._schedule[self._index][1] <= now:
+                self._advance(now)
+            start, end, name = self._schedule[self._index]
+        if start <= now < end:
+            return name, (now - start) / (end - start)
+        return None
+
+    def next_window(self):
+        """(name, seconds until start) of the next window that has not started"""
+        now = self.clock()
+        with self._lock:
+            self._advance(now)
+            for start, end, name in self._schedule[self._index:]:
+                if start > now:
+                    return name, start - now
+        return None
+
+    ##########################################################################
+    # Timer thread
+
+    def start(self):
+        if self._thread is None and self.windows:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="ScheduleEngine")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def run_due(self, now=None):
+        """
+        Fire on_window_start / on_window_end if the window changed since the
+        last call. Used instead of start() when the clock is simulated (replay).
+        """
+        if now is None:
+            now = self.clock()
+        state = self.current(now)
+        name = state[0] if state else None
+        if name != self._active:
+            if self._active is not None and self.on_window_end:
+                self._callback(self.on_window_end, self._active)
+            if name is not None and self.on_window_start:
+                self._callback(self.on_window_start, name)
+            self._active = name
+
+    def _run(self):
+        while not self._stop.is_set():
+            now = self.clock()
+            self.run_due(now)
+            with self._lock:
+                start, end, _ = self._schedule[self._index]
+            boundary = end if start <= now else start
+            # wake at least once a minute as a safety net
+            self._stop.wait(min(max(boundary - self.clock(), 0.001), 60.0))
+
+    @staticmethod
+    def _callback(callback, name):
+        try:
+            callback(name)
+        except Exception as e:
+            print(f"[ERROR] Schedule callback error: {e}")
@@ -0,0 +1,500 @@
+"""
+# Multi-process sharding: the symbols spread over worker processes.
+#
+# With [SHARDING] Workers=N the receive thread frames messages as with the
+# pipeline, numbers them and routes every snapshot to the worker process
+# owning its symbol, through a ring buffer in shared memory. Each worker
+# runs its own application and tick processor (history, bars, analytics,
+# staleness) for its symbols, so parsing and processing are spread over N
+# interpreters instead of sharing one GIL. The lines a worker prints come
+# back through a second ring, tagged with the number of the message that
+# produced them, and the merger - the main process's processing thread -
+# writes them to stdout in message order. Session messages (logon, logout,
+# rejects) are processed by the main process, in order with the rest.
+#
+# Rings are single-producer, single-consumer: each side only writes its
+# own position, and a consumer with nothing to do sleeps on a semaphore
+# that the producer only touches when the consumer said it is waiting.
+#
+# A worker that dies loses its symbols, not the others: a producer waiting
+# on a full ring gives up once the other side is gone, and from then on the
+# dead worker's messages are dropped and counted (dropped_N in the stats).
+"""
+import atexit
+import heapq
+import multiprocessing
+import signal
+import struct
+import sys
+import threading
+import zlib
+from collections import deque
+from multiprocessing import shared_memory
+from time import monotonic, monotonic_ns, sleep
+
+import simplefix
+
+from .helpers import load_config
+from .simplefix_application import SimpleFIXApplication
+
+# Ring header: consumer position and its waiting flag in one cache line, producer position in the next
+_HEAD = 0
+_WAITING = 8
+_TAIL = 64
+_CAPACITY = 72
+_HEADER_SIZE = 128
+_POSITION = struct.Struct('<Q')
+_LENGTH = struct.Struct('<I')
+
+# Records: a type byte, then for messages (main -> worker) the message number, receive
+# time, recv and frame stamps and the raw FIX message; for lines (worker -> main) the
+# message number and the line; 'D' marks every message up to a number as done
+_MESSAGE = struct.Struct('<qdqq')
+_SEQ = struct.Struct('<q')
+MESSAGE, STOP = b'M', b'S'
+LINE, DONE, EXIT = b'L', b'D', b'X'
+
+# Longest a consumer sleeps between checks, which bounds a missed wakeup
+WAIT_TIMEOUT = 0.01
+
+
+class ShmRing:
+    """
+    Length-prefixed records in a shared memory ring. Created with a size in
+    the main process; workers attach with attach_args().
+    """
+
+    def __init__(self, name=None, size=1 << 22, doorbell=None):
+
+        self.doorbell = doorbell  # multiprocessing semaphore the consumer sleeps on
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=_HEADER_SIZE + size)
+            self.owner = True
+            _POSITION.pack_into(self.shm.buf, _CAPACITY, size)
+        else:
+            # the resource tracker is shared with the creating process, which unlinks it
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.buffer = self.shm.buf
+        self.capacity = _POSITION.unpack_from(self.buffer, _CAPACITY)[0]
+        self._head = _POSITION.unpack_from(self.buffer, _HEAD)[0]
+        self._tail = _POSITION.unpack_from(self.buffer, _TAIL)[0]
+        self.blocked_s = 0.0
+
+    def attach_args(self):
+        return self.shm.name, None, self.doorbell
+
+    def __len__(self):
+        """Bytes waiting"""
+        return _POSITION.unpack_from(self.buffer, _TAIL)[0] - _POSITION.unpack_from(self.buffer, _HEAD)[0]
+
+    def _copy_in(self, position, data):
+        offset = position % self.capacity
+        first = min(len(data), self.capacity - offset)
+        self.buffer[_HEADER_SIZE + offset:_HEADER_SIZE + offset + first] = data[:first]
+        if first < len(data):
+            self.buffer[_HEADER_SIZE:_HEADER_SIZE + len(data) - first] = data[first:]
+
+    def _copy_out(self, position, size):
+        offset = position % self.capacity
+        first = min(size, self.capacity - offset)
+        data = bytes(self.buffer[_HEADER_SIZE + offset:_HEADER_SIZE + offset + first])
+        if first < size:
+            data += bytes(self.buffer[_HEADER_SIZE:_HEADER_SIZE + size - first])
+        return data
+
+    def put(self, record, alive=None):
+        """
+        Producer: append a record, waiting while the ring is full. False
+        (record not written) when alive() says the consumer is gone while waiting
+        """
+        needed = _LENGTH.size + len(record)
+        if needed > self.capacity:
+            raise ValueError(f"Record of {len(record)} bytes does not fit a ring of {self.capacity}")
+        tail = self._tail
+        if tail + needed - _POSITION.unpack_from(self.buffer, _HEAD)[0] > self.capacity:
+            started = monotonic()
+            try:
+                while tail + needed - _POSITION.unpack_from(self.buffer, _HEAD)[0] > self.capacity:
+                    if alive is not None and not alive():
+                        return False
+                    sleep(0.0005)
+            finally:
+                self.blocked_s += monotonic() - started
+        self._copy_in(tail, _LENGTH.pack(len(record)) + record)
+        self._tail = tail + needed
+        _POSITION.pack_into(self.buffer, _TAIL, self._tail)
+        if self.buffer[_WAITING]:
+            self.doorbell.release()
+        return True
+
+    def get_all(self, timeout=WAIT_TIMEOUT, wait=True, limit=None):
+        """Consumer: the records waiting (at most `limit`), sleeping up to `timeout` when there is none"""
+        head = self._head
+        tail = _POSITION.unpack_from(self.buffer, _TAIL)[0]
+        if tail == head and wait:
+            self.buffer[_WAITING] = 1
+            tail = _POSITION.unpack_from(self.buffer, _TAIL)[0]
+            if tail == head:
+                self.doorbell.acquire(timeout=timeout)
+                tail = _POSITION.unpack_from(self.buffer, _TAIL)[0]
+            self.buffer[_WAITING] = 0
+        records = []
+        while head < tail and (limit is None or len(records) < limit):
+            size = _LENGTH.unpack(self._copy_out(head, _LENGTH.size))[0]
+            records.append(self._copy_out(head + _LENGTH.size, size))
+            head += _LENGTH.size + size
+        if records:
+            self._head = head
+            _POSITION.pack_into(self.buffer, _HEAD, head)
+        return records
+
+    def set_waiting(self, waiting):
+        self.buffer[_WAITING] = 1 if waiting else 0
+
+    def close(self):
+        self.buffer = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def assign_shards(symbols, groups, workers):
+    """
+    {symbol: worker index}: each group of symbols that must stay together (a
+    synthetic and its legs) goes whole to the least loaded worker, largest first
+    """
+    group_of = {}
+    for group in groups:
+        merged = set(group)
+        for symbol in group:
+            if symbol in group_of:
+                merged |= group_of[symbol]
+        for symbol in merged:
+            group_of[symbol] = merged
+    units = {id(group): sorted(group) for group in group_of.values()}
+    for symbol in symbols:
+        if symbol not in group_of:
+            units[symbol] = [symbol]
+    load = [0] * workers
+    assignment = {}
+    for unit in sorted(units.values(), key=lambda unit: (-len(unit), unit)):
+        index = load.index(min(load))
+        load[index] += len(unit)
+        for symbol in unit:
+            assignment[symbol] = index
+    return assignment
+
+
+class ShardSet:
+    """
+    The main process side. put() is called by the receive thread for each
+    framed message: snapshots go to their symbol's worker, anything else is
+    kept for the main process. get() is called by the processing thread: it
+    writes the workers' output to stdout in message order and returns the
+    main process's own messages when their turn comes; None once closed and
+    every worker has exited. The same interface as SPSCQueue, so the client
+    runs either behind _receive_frames and _process_messages.
+    """
+
+    def __init__(self, workers, ring_size=1 << 22, max_batch=256, output=None):
+
+        self.context = multiprocessing.get_context('spawn')
+        self.workers = workers
+        self.max_batch = max_batch
+        self.output = output if output is not None else sys.stdout
+        # one doorbell per worker inbox, one shared by every outbox for the merger
+        self.doorbell = self.context.Semaphore(0)
+        self.inboxes = [ShmRing(size=ring_size, doorbell=self.context.Semaphore(0)) for _ in range(workers)]
+        self.outboxes = [ShmRing(size=ring_size, doorbell=self.doorbell) for _ in range(workers)]
+        self.assignment = {}  # format: b'EUR/USD': worker index
+        self.processes = []
+        self.closed = False
+        self.seq = 0                    # number of the last message routed
+        self.routed = [0] * workers     # last message number sent to each worker
+        self.processed = [0] * workers  # last message number each worker finished
+        self.finished = [False] * workers
+        self.messages = [0] * workers
+        self.dropped = [0] * workers    # messages for a worker that had died
+        self._local = deque()  # format: (message number, item) for the main process
+        self._lines = []       # heap of (message number, arrival, line) waiting for their turn
+        self._arrival = 0
+        self.max_backlog = 0
+        self.written = 0
+        # an exit before stop() (e.g. Ctrl+C while starting up) still stops the workers and frees the rings
+        atexit.register(self._exit)
+
+    def start(self, factory, worker_args):
+        """Start one process per worker, calling factory(index, *worker_args[index]) there"""
+        self.assignment = {symbol.encode(): index for index, args in enumerate(worker_args) for symbol in args[0]}
+        for index in range(self.workers):
+            process = self.context.Process(target=run_worker, name=f'NeonShard{index}', daemon=True,
+                                           args=(index, self.inboxes[index].attach_args(),
+                                                 self.outboxes[index].attach_args(),
+                                                 self.max_batch, factory, worker_args[index]))
+            process.start()
+            self.processes.append(process)
+
+    def __len__(self):
+        """Messages waiting for the main process"""
+        return len(self._local)
+
+    def put(self, item, key=None):
+        if self.closed:
+            return False
+        seq = self.seq + 1
+        if key is None or key[0] != b'W' or len(key[1]) != 1:
+            self._local.append((seq, item))
+            self.seq = seq
+            self.doorbell.release()
+            return True
+        symbol = key[1][0]
+        index = self.assignment.get(symbol)
+        if index is None:
+            # not subscribed by us: a stable hash, the same in every process
+            index = self.assignment[symbol] = zlib.crc32(symbol) % self.workers
+        raw, receive_time, recv_ns, frame_ns = item
+        alive = self.processes[index].is_alive if self.processes else None
+        if self.finished[index] or not self.inboxes[index].put(
+                MESSAGE + _MESSAGE.pack(seq, receive_time, recv_ns, frame_ns) + raw, alive):
+            # the worker is gone: waiting for it would stall every other symbol
+            self.dropped[index] += 1
+            return True
+        # routed before seq: the merger reads seq first
+        self.routed[index] = seq
+        self.messages[index] += 1
+        self.seq = seq
+        return True
+
+    def _drain(self):
+        for index, outbox in enumerate(self.outboxes):
+            if self.finished[index]:
+                continue
+            for record in outbox.get_all(wait=False):
+                kind = record[:1]
+                if kind == LINE:
+                    self._arrival += 1
+                    heapq.heappush(self._lines, (_SEQ.unpack_from(record, 1)[0], self._arrival, record[9:]))
+                elif kind == DONE:
+                    self.processed[index] = _SEQ.unpack_from(record, 1)[0]
+                elif kind == EXIT:
+                    self.finished[index] = True
+            if not self.finished[index] and self.processes and not self.processes[index].is_alive():
+                self.finished[index] = True
+                print(f"[ERROR] Shard worker {index} exited unexpectedly; its symbols' messages are dropped "
+                      f"from now on, the other workers' symbols carry on")
+        if len(self._lines) > self.max_backlog:
+            self.max_backlog = len(self._lines)
+
+    def _frontier(self, assigned):
+        """Highest message number whose output is complete"""
+        frontier = assigned
+        for index in range(self.workers):
+            if not self.finished[index] and self.processed[index] < self.routed[index]:
+                frontier = min(frontier, self.processed[index])
+        return frontier
+
+    def _write(self, limit):
+        lines = self._lines
+        text = []
+        while lines and lines[0][0] <= limit:
+            text.append(heapq.heappop(lines)[2].decode('utf-8'))
+        if text:
+            self.output.write('\n'.join(text) + '\n')
+            self.output.flush()
+            self.written += len(text)
+
+    def get(self, timeout=None):
+        while True:
+            assigned = self.seq
+            self._drain()
+            frontier = self._frontier(assigned)
+            if self._local:
+                seq, item = self._local[0]
+                self._write(min(frontier, seq - 1))
+                if frontier >= seq - 1:
+                    self._local.popleft()
+                    return item
+            else:
+                self._write(frontier)
+                if self.closed and all(self.finished):
+                    self._write(float('inf'))
+                    return None
+            # wait for worker output (or a message for the main process)
+            for outbox in self.outboxes:
+                outbox.set_waiting(True)
+            self.doorbell.acquire(timeout=WAIT_TIMEOUT)
+            for outbox in self.outboxes:
+                outbox.set_waiting(False)
+
+    def close(self):
+        """No more messages: the workers finish what they have and exit"""
+        if self.closed:
+            return
+        self.closed = True
+        for index, inbox in enumerate(self.inboxes):
+            if index < len(self.processes):
+                inbox.put(STOP, self.processes[index].is_alive)
+            else:
+                self.finished[index] = True
+        self.doorbell.release()
+
+    def join(self, timeout=15.0):
+        deadline = monotonic() + timeout
+        for process in self.processes:
+            process.join(max(0.0, deadline - monotonic()))
+            if process.is_alive():
+                print(f"[ERROR] Shard worker {process.name} did not stop, terminating it")
+                process.terminate()
+                process.join(1.0)
+
+    def release(self):
+        """Free the shared memory once the workers and the merger are done with it"""
+        atexit.unregister(self._exit)
+        for ring in self.inboxes + self.outboxes:
+            ring.close()
+        self.inboxes = self.outboxes = []
+
+    def _exit(self):
+        self.close()
+        self.join(timeout=2.0)
+        self.release()
+
+    def stats(self):
+        stats = {
+            'workers': self.workers,
+            'depth': len(self._local),
+            'merge_backlog': len(self._lines),
+            'max_merge_backlog': self.max_backlog,
+            'lines_written': self.written,
+            'blocked_seconds': round(sum(inbox.blocked_s for inbox in self.inboxes), 6),
+        }
+        for index in range(self.workers):
+            stats[f'messages_{index}'] = self.messages[index]
+            stats[f'dropped_{index}'] = self.dropped[index]
+            if self.inboxes:
+                stats[f'inbox_bytes_{index}'] = len(self.inboxes[index])
+        return stats
+
+
+class ShardOutput:
+    """
+    A worker's sys.stdout: every line goes to the merger, tagged with the
+    current message number. Lines are dropped once alive() says the main
+    process is gone, instead of waiting on a ring nobody drains
+    """
+
+    def __init__(self, ring, alive=None):
+
+        self.ring = ring
+        self.alive = alive
+        self.seq = 0
+        self._partial = ''
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            if '\n' not in text:
+                self._partial += text
+                return len(text)
+            lines = (self._partial + text).split('\n')
+            self._partial = lines.pop()
+            for line in lines:
+                self.ring.put(LINE + _SEQ.pack(self.seq) + line.encode('utf-8'), self.alive)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def done(self, seq):
+        with self._lock:
+            self.ring.put(DONE + _SEQ.pack(seq), self.alive)
+
+    def finish(self):
+        with self._lock:
+            if self._partial:
+                self.ring.put(LINE + _SEQ.pack(self.seq) + self._partial.encode('utf-8'), self.alive)
+                self._partial = ''
+            self.ring.put(EXIT, self.alive)
+
+
+class ShardClient:
+    """Stands in for SimpleFIXClient in a worker: the application without a socket"""
+
+    def __init__(self, tick_processor, config_file='config/neon.conf', overrides=None, message_log_file=''):
+
+        self.config = load_config(config_file)
+        for section, values in (overrides or {}).items():
+            self.config.setdefault(section, {}).update(values)
+        self.app = SimpleFIXApplication(self.config, tick_processor,
+                                        verbose=False,
+                                        message_log_file=message_log_file)
+        self.connected = True
+        self.journal = None
+        self.subscriptions = {}
+        self.market_depth = 1
+
+    def isLoggedOn(self):
+        return True
+
+    def send_market_data_request(self, symbol, req_type='snapshot', market_depth=None):
+        pass
+
+    def resubscribe(self, symbol, market_depth=None):
+        pass
+
+    def send_logout(self, text=""):
+        pass
+
+    def stop(self):
+        self.app.stop()
+
+
+def run_worker(index, inbox_args, outbox_args, max_batch, factory, args):
+    """Entry point of a worker process: process routed messages until told to stop"""
+    # Ctrl+C (and Ctrl+Break on Windows) reaches the whole process group; the main process stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, 'SIGBREAK'):
+        signal.signal(signal.SIGBREAK, signal.SIG_IGN)
+    inbox = ShmRing(*inbox_args)
+    outbox = ShmRing(*outbox_args)
+    parent = multiprocessing.parent_process()
+    output = sys.stdout = ShardOutput(outbox, parent.is_alive if parent is not None else None)
+    processor = factory(index, *args)
+    app = processor.client.app
+    parser = simplefix.FixParser()
+    seq = 0
+    try:
+        running = True
+        while running:
+            # bounded batches: the merger can only write a line once its batch is done
+            records = inbox.get_all(limit=max_batch)
+            if not records:
+                if parent is not None and not parent.is_alive():
+                    break
+                continue
+            for record in records:
+                if record[:1] == STOP:
+                    running = False
+                    break
+                seq, app.receive_time, recv_ns, frame_ns = _MESSAGE.unpack_from(record, 1)
+                output.seq = seq
+                tracer = app.tracer
+                if tracer is not None:
+                    tracer.recv_ns = recv_ns
+                    tracer.frame_ns = frame_ns
+                    tracer.dequeue_ns = monotonic_ns()
+                parser.append_buffer(record[1 + _MESSAGE.size:])
+                msg = parser.get_message()
+                if msg is not None:
+                    app.process_message(msg)
+            app.end_of_batch()
+            output.done(seq)
+    finally:
+        try:
+            processor.shutdown()
+        finally:
+            output.finish()
+            sys.stdout = sys.__stdout__
+            inbox.close()
+            outbox.close()
@@ -1,11 +1,14 @@
 import logging
 import json
-from datetime import datetime
 from threading import Lock
+from time import time, monotonic_ns
 import simplefix
 
-from .helpers import log, setup_logger
+from .helpers import log, setup_logger, fix_timestamp_to_epoch, fix_entry_time_to_epoch
 from .history import history
+from .bars import BarBuilder
+from .latency import LatencyHistogram, StageTracer
+from .logqueue import MessageSampler, dropped_records
 
 
 class SimpleFIXApplication:
@@ -22,6 +25,11 @@ class SimpleFIXApplication:
         self.config = config
         self.tick_processor = tick_processor
         self.store_all_ticks = store_all_ticks
+        # with store_all_ticks off (outside capture windows) ticks are conflated to one per interval
+        sample_interval = float(config.get('CAPTURE', {}).get('SampleInterval', 0))
+        self.sample_interval = sample_interval if sample_interval > 0 else None
+        # levels below the top of book are only kept inside capture windows (see CapturePolicy)
+        self.store_depth = False
         self.save_history_to_files = save_history_to_files
         self.verbose = verbose
         self.connected = False
@@ -31,18 +39,75 @@ class SimpleFIXApplication:
         self.next_seq_num = 1
         self.next_request_id = 1
         
-        # Setup logging
+        # Setup logging: optionally written off the receive thread ([LOGGING] Async=Y),
+        # inbound messages sampled per MsgType (Sample.<MsgType>=N logs 1 in N)
+        logging_config = self.config.get('LOGGING', {})
+        async_queue = 0
+        if logging_config.get('Async', 'N').upper() == 'Y':
+            async_queue = int(logging_config.get('QueueSize', 10000))
+        self.log_sampler = MessageSampler({key[len('Sample.'):]: int(value)
+                                           for key, value in logging_config.items() if key.startswith('Sample.')},
+                                          default=int(logging_config.get('Sample', 1)))
         self.logger = None
         if len(message_log_file) > 0:
             self.logger = setup_logger('message_logger', message_log_file,
                                        '%(asctime)s %(levelname)s %(message)s',
-                                       level=logging.INFO)
+                                       level=logging.INFO,
+                                       async_queue=async_queue)
         
         # Dictionary to hold Asset Histories
         self.history_dict = {}  # format: 'EURUSD': History
         
+        # Durable binary tick files, shared by all histories. Optional components
+        # are imported only when enabled, to keep them off the startup path.
+        self.tick_store = None
+        history_config = self.config.get('HISTORY', {})
+        if save_history_to_files and history_config.get('SaveToFiles', 'N').upper() == 'Y':
+            from .tickstore import TickStore
+            self.tick_store = TickStore(history_config.get('Directory', 'history'),
+                                        fsync_interval=float(history_config.get('FsyncInterval', 1.0)))
+        
+        # Compress finished days in a separate process
+        self.archive_scheduler = None
+        if self.tick_store is not None and history_config.get('Archive', 'N').upper() == 'Y':
+            from .archive import ArchiveScheduler
+            self.archive_scheduler = ArchiveScheduler(
+                self.tick_store.directory,
+                decimals=int(history_config.get('ArchiveDecimals', 6)),
+                delete_raw=history_config.get('ArchiveDeleteRaw', 'N').upper() == 'Y')
+        
+        # Parquet/Arrow export of ticks and bars, run on its own thread
+        self.export_worker = None
+        export_config = self.config.get('EXPORT', {})
+        if export_config.get('Enabled', 'N').upper() == 'Y':
+            from .export import ExportWorker
+            self.export_worker = ExportWorker(self.history_dict,
+                                              directory=export_config.get('Directory', 'export'),
+                                              file_format=export_config.get('Format', 'parquet'),
+                                              interval=float(export_config.get('Interval', 0)))
+        
         # Request ID mapping
         self._id_to_symbol = {}  # format: '0': 'EURUSD'
+        
+        # Exchange timestamps (epoch seconds). receive_time is stamped by the
+        # client when the bytes come off the socket, before parsing.
+        self.last_sending_time = None
+        self.receive_time = None
+        self.latency_histograms = {}  # format: 'EUR/USD': LatencyHistogram (exchange -> receive, us)
+        
+        # Per-stage hot path timing when [LATENCY] Stages=Y (None = off)
+        self.tracer = None
+        if self.config.get('LATENCY', {}).get('Stages', 'N').upper() == 'Y':
+            self.tracer = StageTracer()
+        
+        # Feed counters and gauges when [METRICS] Enabled=Y (None = off)
+        self.metrics = None
+        self.metrics_server = None
+        self.queue_depths = {}  # format: 'tick_store': callable returning the current depth
+        self._setup_metrics()
+        
+        # Called once per receive batch (all messages framed from one recv)
+        self._on_batch = getattr(tick_processor, 'on_batch', None)
     
     def get_next_seq_num(self):
         """Get next sequence number"""
@@ -58,6 +123,88 @@ class SimpleFIXApplication:
             self.next_request_id += 1
             return req_id
     
+    def _create_history(self, symbol):
+        """Create the tick history for a symbol using the [HISTORY] config section"""
+        history_config = self.config.get('HISTORY', {})
+        max_age = float(history_config.get('MaxAge', 0))
+        bars_config = self.config.get('BARS', {})
+        bar_builder = None
+        if bars_config.get('Timeframes'):
+            bar_builder = BarBuilder(
+                time_frames=[tf.strip() for tf in bars_config['Timeframes'].split(',') if tf.strip()],
+                sides=[side.strip() for side in bars_config.get('Sides', 'bid,ask,mid').split(',') if side.strip()],
+                keep=int(bars_config.get('Keep', 500)))
+        return history(symbol,
+                       store_all_ticks=self.store_all_ticks,
+                       store_depth=self.store_depth,
+                       save_history_to_files=self.save_history_to_files,
+                       capacity=int(history_config.get('Capacity', 100000)),
+                       max_age=max_age if max_age > 0 else None,
+                       tick_store=self.tick_store,
+                       bar_builder=bar_builder,
+                       sample_interval=self.sample_interval)
+    
+    def _setup_metrics(self):
+        """Create the feed metrics and serve them on [METRICS] Port (0 = no HTTP endpoint)"""
+        metrics_config = self.config.get('METRICS', {})
+        if metrics_config.get('Enabled', 'N').upper() != 'Y':
+            return
+        from .metrics import FeedMetrics, MetricsServer
+        self.metrics = FeedMetrics()
+        if self.tick_store is not None:
+            self.queue_depths['tick_store'] = lambda: len(self.tick_store._pending)
+        if self.export_worker is not None:
+            self.queue_depths['export'] = self.export_worker._jobs.qsize
+        self.metrics.gauge('neon_queue_depth', 'Items waiting in background queues',
+                           lambda: {name: depth() for name, depth in list(self.queue_depths.items())}, 'queue')
+        self.metrics.gauge('neon_log_dropped', 'Log records dropped because the log queue was full',
+                           dropped_records)
+        self.metrics.gauge('neon_exchange_latency_us', 'Exchange to receive latency percentiles',
+                           lambda: self._percentiles(self.latency_histograms), 'symbol,quantile')
+        self.metrics.gauge('neon_hot_path_latency_ns', 'Receive to output latency percentiles',
+                           lambda: self._percentiles({symbol: stages['total'] for symbol, stages
+                                                      in list(self.tracer.histograms.items())})
+                           if self.tracer is not None else None, 'symbol,quantile')
+        port = int(metrics_config.get('Port', 9108))
+        if port > 0:
+            try:
+                self.metrics_server = MetricsServer(self.metrics.registry, port,
+                                                    host=metrics_config.get('Host', '127.0.0.1'))
+            except OSError as e:
+                print(f"[ERROR] Failed to start metrics endpoint on port {port}: {e}")
+    
+    @staticmethod
+    def _percentiles(histograms, quantiles=(0.5, 0.9, 0.99)):
+        result = {}
+        for symbol, histogram in list(histograms.items()):
+            if histogram.count:
+                for q in quantiles:
+                    result[(symbol, f'{q:g}')] = histogram.percentile(q * 100)
+        return result
+    
+    def request_export(self):
+        """Queue an export of the in-memory ticks and bars (no-op when export is disabled)"""
+        if self.export_worker is not None:
+            self.export_worker.request()
+            return True
+        return False
+    
+    def end_of_batch(self):
+        """All messages from one read have been processed"""
+        if self._on_batch is not None:
+            self._on_batch(self)
+    
+    def stop(self):
+        """Flush and close anything the application writes in the background"""
+        if self.export_worker is not None:
+            self.export_worker.stop()
+        if self.archive_scheduler is not None:
+            self.archive_scheduler.stop()
+        if self.tick_store is not None:
+            self.tick_store.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+    
     def process_message(self, msg):
         """Process incoming FIX message"""
         try:
@@ -68,10 +215,16 @@ class SimpleFIXApplication:
             if isinstance(msg_type, bytes):
                 msg_type = msg_type.decode('ascii')
             
+            if self.metrics is not None:
+                self.metrics.messages.inc(msg_type)
+            
             if self.verbose:
                 print(f"[PROCESS] MsgType: {msg_type}")
             
-            log(self.logger, f'Message = {msg}')
+            if self.logger is not None and self.log_sampler.sample(msg_type):
+                log(self.logger, 'Message = %s', msg)
+            
+            self.last_sending_time = fix_timestamp_to_epoch(msg.get(52))  # SendingTime
             
             # Debug: print message content for connection issues
             if msg_type in ['3', '5', 'j']:  # Reject, Logout, BusinessMessageReject
@@ -100,11 +253,15 @@ class SimpleFIXApplication:
                     print(f"[WARN] Unhandled message type: {msg_type}")
                     
         except Exception as e:
+            if self.metrics is not None:
+                self.metrics.parse_errors.inc()
             print(f"[ERROR] Error processing message: {e}")
     
     def _handle_logon(self, msg):
         """Handle logon response"""
         self.connected = True
+        if self.metrics is not None:
+            self.metrics.logons.inc()
         # Remove print to stdout, only log
         log(self.logger, '[INFO] Logon successful')
     
@@ -123,6 +280,8 @@ class SimpleFIXApplication:
     def _handle_logout(self, msg):
         """Handle logout message"""
         self.connected = False
+        if self.metrics is not None:
+            self.metrics.disconnects.inc()
         print("[INFO] Logout received")
         log(self.logger, 'Logout received')
         
@@ -133,8 +292,10 @@ class SimpleFIXApplication:
     def _handle_reject(self, msg):
         """Handle reject message"""
         reject_reason = msg.get(58, 'Unknown')  # Text
+        if self.metrics is not None:
+            self.metrics.rejects.inc('3')
         print(f"[ERROR] Message rejected: {reject_reason}")
-        log(self.logger, f'Message rejected: {reject_reason}')
+        log(self.logger, 'Message rejected: %s', reject_reason)
     
     def _handle_market_data_snapshot(self, msg):
         """Handle Market Data Snapshot Full Refresh"""
@@ -149,13 +310,14 @@ class SimpleFIXApplication:
             
             # Initialize history if needed
             if symbol not in self.history_dict:
-                self.history_dict[symbol] = history(symbol)
+                self.history_dict[symbol] = self._create_history(symbol)
             
             # Process MD entries - parse repeating groups properly
             bid_price = None
             ask_price = None
             bid_size = None
             ask_size = None
+            entry_time = None
             
             # Number of MD entries
             num_entries = msg.get(268)  # NoMDEntries
@@ -173,26 +335,34 @@ class SimpleFIXApplication:
             # Parse repeating groups by accessing all field values
             # Extract all instances of MD entry fields
             md_entries = self._extract_market_data_entries(msg)
+            if self.tracer is not None:
+                self.tracer.parse_ns = monotonic_ns()
             
             if self.verbose:
                 print(f"[DEBUG] Extracted {len(md_entries)} MD entries: {md_entries}")
             
-            # Process each MD entry
+            # Process each MD entry. A full depth book lists the levels of each side best first.
+            bid_levels = []  # format: [(price, size)], top of book first
+            ask_levels = []
             for entry in md_entries:
                 entry_type = entry.get('type')
                 entry_px = entry.get('price')
                 entry_size = entry.get('size')
+                if entry.get('time') is not None:
+                    entry_time = max(entry_time or 0, entry['time'])
                 
                 if entry_type == '0':  # Bid
-                    bid_price = entry_px
-                    bid_size = entry_size
+                    bid_levels.append((entry_px, entry_size))
                     if self.verbose:
-                        print(f"[DEBUG] BID extracted: {bid_price} @ {bid_size}")
+                        print(f"[DEBUG] BID extracted: {entry_px} @ {entry_size}")
                 elif entry_type == '1':  # Offer/Ask
-                    ask_price = entry_px
-                    ask_size = entry_size
+                    ask_levels.append((entry_px, entry_size))
                     if self.verbose:
-                        print(f"[DEBUG] ASK extracted: {ask_price} @ {ask_size}")
+                        print(f"[DEBUG] ASK extracted: {entry_px} @ {entry_size}")
+            if bid_levels:
+                bid_price, bid_size = bid_levels[0]
+            if ask_levels:
+                ask_price, ask_size = ask_levels[0]
             
             # Log parsing results
             if self.verbose:
@@ -212,28 +382,37 @@ class SimpleFIXApplication:
             if bid_price is not None:
                 self.history_dict[symbol].BID_TOB = bid_price
                 if bid_size is not None:
-                    self.history_dict[symbol].BID_SIZE = bid_size
+                    self.history_dict[symbol].BID_SIZE_TOB = bid_size
                     
             if ask_price is not None:
                 self.history_dict[symbol].ASK_TOB = ask_price
                 if ask_size is not None:
-                    self.history_dict[symbol].ASK_SIZE = ask_size
+                    self.history_dict[symbol].ASK_SIZE_TOB = ask_size
+            
+            # Exchange time: MDEntryDate/Time when present, SendingTime otherwise
+            exchange_time = entry_time if entry_time is not None else self.last_sending_time
+            receive_time = self.receive_time if self.receive_time is not None else time()
+            self.history_dict[symbol].EXCHANGE_TIME = exchange_time
+            self.history_dict[symbol].RECEIVE_TIME = receive_time
+            if exchange_time is not None:
+                if symbol not in self.latency_histograms:
+                    self.latency_histograms[symbol] = LatencyHistogram()
+                self.latency_histograms[symbol].record((receive_time - exchange_time) * 1e6)
             
             # Only proceed with tick processing if we have both bid and ask
             if bid_price and ask_price:
-                # Store tick if enabled
-                if self.store_all_ticks:
-                    tick_data = {
-                        'TIME': datetime.now(),
-                        'symbol': symbol,
-                        'bid': bid_price,
-                        'ask': ask_price,
-                        'bid_size': bid_size,
-                        'ask_size': ask_size,
-                        'spread': ask_price - bid_price,
-                        'mid': (bid_price + ask_price) / 2
-                    }
-                    self.history_dict[symbol].HISTORY.append(tick_data)
+                if self.metrics is not None:
+                    self.metrics.ticks.inc(symbol)
+                # Store tick (the history conflates it when store_all_ticks is off)
+                self.history_dict[symbol].append_tick(receive_time, bid_price, ask_price,
+                                                      bid_size, ask_size, exchange_time)
+                # Deeper levels of a full depth snapshot, inside capture windows only
+                if not self.history_dict[symbol].store_depth:
+                    bid_levels = ask_levels = ()
+                for depth in range(1, min(len(bid_levels), len(ask_levels))):
+                    self.history_dict[symbol].append_tick(receive_time, bid_levels[depth][0], ask_levels[depth][0],
+                                                          bid_levels[depth][1], ask_levels[depth][1],
+                                                          exchange_time, depth)
                 
                 # Notify tick processor of successful market data
                 if self.tick_processor and hasattr(self.tick_processor, 'on_market_data_success'):
@@ -241,6 +420,8 @@ class SimpleFIXApplication:
                 
                 # Call tick processor
                 if self.tick_processor and hasattr(self.tick_processor, 'on_tick'):
+                    if self.tracer is not None:
+                        self.tracer.dispatch_ns = monotonic_ns()
                     self.tick_processor.on_tick(symbol, self)
             
             if self.verbose:
@@ -249,10 +430,16 @@ class SimpleFIXApplication:
                 print(f"[SNAPSHOT] {symbol:8} | BID: {bid_price:8.5f} | ASK: {ask_price:8.5f} | MID: {mid:8.5f} | SPREAD: {spread:6.5f}")
                 
         except Exception as e:
+            if self.metrics is not None:
+                self.metrics.parse_errors.inc()
             print(f"[ERROR] Error processing market data snapshot: {e}")
             import traceback
             traceback.print_exc()
     
+    def get_latency_summary(self):
+        """Exchange-to-receive latency percentiles (microseconds) per symbol"""
+        return {symbol: hist.summary() for symbol, hist in self.latency_histograms.items()}
+    
     def _handle_market_data_incremental(self, msg):
         """Handle Market Data Incremental Refresh"""
         if self.verbose:
@@ -271,6 +458,9 @@ class SimpleFIXApplication:
             if isinstance(reject_code, bytes):
                 reject_code = reject_code.decode('ascii')
             
+            if self.metrics is not None:
+                self.metrics.rejects.inc('Y')
+            
             symbol = "Unknown"
             if req_id in self._id_to_symbol:
                 symbol = self._id_to_symbol[req_id]
@@ -318,6 +508,8 @@ class SimpleFIXApplication:
             entry_types = []  # 269 values
             entry_prices = []  # 270 values  
             entry_sizes = []  # 271 values
+            entry_dates = []  # 272 values
+            entry_times = []  # 273 values
             
             for field in fields:
                 if '=' in field:
@@ -347,6 +539,10 @@ class SimpleFIXApplication:
                             except ValueError:
                                 print(f"[ERROR] Invalid size value: {value}")
                                 continue
+                        elif tag_int == 272:  # MDEntryDate
+                            entry_dates.append(value)
+                        elif tag_int == 273:  # MDEntryTime
+                            entry_times.append(value)
                     except (ValueError, IndexError):
                         continue
             
@@ -357,11 +553,18 @@ class SimpleFIXApplication:
             # They should appear in the same order: type, price, size for each entry
             min_len = min(len(entry_types), len(entry_prices), len(entry_sizes))
             
+            # MDEntryDate/Time are optional; only trust them when every entry has one
+            has_times = len(entry_times) >= min_len
+            has_dates = len(entry_dates) >= min_len
+            
             for i in range(min_len):
                 entries.append({
                     'type': entry_types[i],
                     'price': entry_prices[i],
-                    'size': entry_sizes[i]
+                    'size': entry_sizes[i],
+                    'time': fix_entry_time_to_epoch(entry_dates[i] if has_dates else None,
+                                                    entry_times[i],
+                                                    self.last_sending_time) if has_times else None
                 })
                 if self.verbose:
                     print(f"[DEBUG] Created entry {i}: type={entry_types[i]}, price={entry_prices[i]}, size={entry_sizes[i]}")
@@ -1,11 +1,14 @@
+import os
 import socket
 import threading
 import time
 import logging
 from datetime import datetime
-from pathlib import Path
 import simplefix
 
+from .helpers import load_config, log
+from .journal import WireJournal, INBOUND, OUTBOUND
+from .pipeline import FixFramer, SPSCQueue, market_data_key
 from .simplefix_application import SimpleFIXApplication
 
 
@@ -28,12 +31,27 @@ class SimpleFIXClient:
         self.socket = None
         self.app = None
         self.receiver_thread = None
+        self.processing_thread = None
         self.heartbeat_thread = None
+        # Queue between the receive and processing threads (None = both on the receive thread),
+        # or the worker processes when sharded ([SHARDING] Workers > 0)
+        self.pipeline = None
+        self.shards = None
+        self.max_batch = 256
         self.running = False
+        # Set by the receive thread when the logon reply arrives
+        self.logon_event = threading.Event()
+        
+        # Streaming subscriptions and the depth new ones are requested at (0=Full book, 1=Top of book)
+        self.subscriptions = {}  # format: 'EUR/USD': ('3', 'snapshot_plus_updates')
+        self.market_depth = 1
         
         # Load configuration
         self.config = self._load_config()
         
+        # Optional binary journal of the raw wire traffic
+        self.journal = self._create_journal()
+        
         # Create application instance
         self.app = SimpleFIXApplication(
             self.config, 
@@ -44,25 +62,18 @@ class SimpleFIXClient:
             message_log_file=message_log_file
         )
         
+        if self.app.metrics is not None and self.journal is not None:
+            self.app.queue_depths['journal'] = lambda: len(self.journal._pending)
+        
+        self.pipeline = self._create_pipeline()
+        
         # Start the connection
         self._start_connection()
     
     def _load_config(self):
         """Load configuration from file"""
-        config = {}
         try:
-            with open(self.config_file, 'r') as f:
-                current_section = None
-                for line in f:
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue
-                    if line.startswith('[') and line.endswith(']'):
-                        current_section = line[1:-1]
-                        config[current_section] = {}
-                    elif '=' in line and current_section:
-                        key, value = line.split('=', 1)
-                        config[current_section][key] = value
+            config = load_config(self.config_file)
             
             if self.verbose:
                 print("[INFO] Configuration loaded successfully")
@@ -73,6 +84,54 @@ class SimpleFIXClient:
         
         return config
     
+    def _create_journal(self):
+        """
+        Open the wire journal when [JOURNAL] Enabled=Y. With [CAPTURE] Journal=Y
+        it is opened paused and the capture policy turns it on in the windows.
+        """
+        journal_config = self.config.get('JOURNAL', {})
+        capture_config = self.config.get('CAPTURE', {})
+        enabled = journal_config.get('Enabled', 'N').upper() == 'Y'
+        if not enabled and not (capture_config.get('Enabled', 'N').upper() == 'Y'
+                                and capture_config.get('Journal', 'Y').upper() == 'Y'):
+            return None
+        timestamp_str = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
+        path = os.path.join(journal_config.get('Directory', 'logs'), f'wire_{timestamp_str}.journal')
+        if self.verbose:
+            print(f"[INFO] Journaling raw wire traffic to {path}")
+        return WireJournal(path, enabled=enabled)
+    
+    def _create_pipeline(self):
+        """
+        With [PIPELINE] Enabled=Y the receive thread only frames messages and a
+        processing thread parses and processes them, through a bounded queue.
+        With [SHARDING] Workers > 0 the snapshots go to worker processes instead
+        (started by the tick processor once it knows the symbols).
+        """
+        pipeline_config = self.config.get('PIPELINE', {})
+        sharding_config = self.config.get('SHARDING', {})
+        workers = int(sharding_config.get('Workers', 0))
+        self.max_batch = int(pipeline_config.get('MaxBatch', 256))
+        if workers > 0:
+            from .shards import ShardSet
+            pipeline = self.shards = ShardSet(workers, ring_size=int(sharding_config.get('RingSize', 4194304)),
+                                              max_batch=self.max_batch)
+        elif pipeline_config.get('Enabled', 'N').upper() == 'Y':
+            pipeline = SPSCQueue(capacity=int(pipeline_config.get('QueueSize', 8192)),
+                                 overflow=pipeline_config.get('Overflow', 'block').strip().lower())
+        else:
+            return None
+        if self.app.metrics is not None:
+            self.app.queue_depths['pipeline'] = pipeline.__len__
+            self.app.metrics.gauge('neon_pipeline', 'Receive to processing queue: depth, drops and time blocked',
+                                   pipeline.stats, 'stat')
+        if self.verbose:
+            if self.shards is not None:
+                print(f"[INFO] Sharding on: {workers} worker processes")
+            else:
+                print(f"[INFO] Pipeline on: queue of {pipeline.capacity}, overflow policy {pipeline.overflow}")
+        return pipeline
+    
     def _start_connection(self):
         """Start the socket connection"""
         try:
@@ -97,8 +156,13 @@ class SimpleFIXClient:
             if self.verbose:
                 print(f"[DEBUG] Socket connected to {host}:{port}")
             
-            # Start receiver thread
-            self.receiver_thread = threading.Thread(target=self._receive_messages)
+            # Start receiver thread, and the processing thread behind it when the pipeline is on
+            if self.pipeline is not None:
+                self.processing_thread = threading.Thread(target=self._process_messages, name="Processing")
+                self.processing_thread.daemon = True
+                self.processing_thread.start()
+            self.receiver_thread = threading.Thread(target=self._receive_messages if self.pipeline is None
+                                                    else self._receive_frames)
             self.receiver_thread.daemon = True
             self.receiver_thread.start()
             
@@ -107,9 +171,7 @@ class SimpleFIXClient:
             
             # Wait for logon confirmation
             timeout = 30  # Increased timeout
-            start_time = time.time()
-            while not self.connected and (time.time() - start_time) < timeout:
-                time.sleep(0.1)
+            self.logon_event.wait(timeout)
             
             if self.connected:
                 # Start heartbeat thread
@@ -170,6 +232,8 @@ class SimpleFIXClient:
                 if self.verbose:
                     print(f"[SEND] {encoded_msg.decode('ascii')}")
                 self.socket.send(encoded_msg)
+                if self.journal is not None:
+                    self.journal.record(OUTBOUND, encoded_msg)
                 
         except Exception as e:
             print(f"[ERROR] Failed to send message: {e}")
@@ -181,7 +245,15 @@ class SimpleFIXClient:
         while self.running:
             try:
                 data = self.socket.recv(4096)
+                self.app.receive_time = time.time()
+                tracer = self.app.tracer
+                if tracer is not None:
+                    tracer.recv_ns = time.monotonic_ns()
+                if self.journal is not None and data:
+                    self.journal.record(INBOUND, data)
                 if not data:
+                    if self.app.metrics is not None:
+                        self.app.metrics.disconnects.inc()
                     if self.verbose:
                         print("[DEBUG] No data received - server closed connection")
                     break
@@ -195,6 +267,8 @@ class SimpleFIXClient:
                     msg = parser.get_message()
                     if msg is None:
                         break
+                    if tracer is not None:
+                        tracer.frame_ns = time.monotonic_ns()
                     
                     if self.verbose:
                         print(f"[RECV] {msg}")
@@ -205,9 +279,53 @@ class SimpleFIXClient:
                     # Update connection state from app
                     if not self.connected and self.app.connected:
                         self.connected = True
+                        self.logon_event.set()
                     elif self.connected and not self.app.connected:
                         self.connected = False
                         break
+                
+                self.app.end_of_batch()
+                    
+            except socket.timeout:
+                continue
+            except Exception as e:
+                if self.running:
+                    print(f"[ERROR] Error receiving message: {e}")
+                break
+        
+        # Nothing more will arrive; let isLoggedOn() report the dropped session
+        # and stop a logon wait that is still pending
+        self.connected = False
+        self.logon_event.set()
+    
+    def _receive_frames(self):
+        """Receive thread when the pipeline is on: read and frame only"""
+        framer = FixFramer()
+        pipeline = self.pipeline
+        
+        while self.running and not pipeline.closed:
+            try:
+                # framing is cheap, so read as much as the kernel has
+                data = self.socket.recv(65536)
+                receive_time = time.time()
+                recv_ns = time.monotonic_ns() if self.app.tracer is not None else 0
+                if self.journal is not None and data:
+                    self.journal.record(INBOUND, data)
+                if not data:
+                    if self.app.metrics is not None:
+                        self.app.metrics.disconnects.inc()
+                    if self.verbose:
+                        print("[DEBUG] No data received - server closed connection")
+                    break
+                
+                if self.verbose:
+                    print(f"[DEBUG] Received {len(data)} bytes: {data}")
+                
+                framer.append(data)
+                for raw in framer.messages():
+                    frame_ns = time.monotonic_ns() if recv_ns else 0
+                    if not pipeline.put((raw, receive_time, recv_ns, frame_ns), market_data_key(raw)):
+                        break
                     
             except socket.timeout:
                 continue
@@ -215,6 +333,58 @@ class SimpleFIXClient:
                 if self.running:
                     print(f"[ERROR] Error receiving message: {e}")
                 break
+        
+        # the processing thread drains what is queued, then reports the session closed
+        pipeline.close()
+    
+    def _process_messages(self):
+        """Processing thread when the pipeline is on: parse and process the framed messages"""
+        parser = simplefix.FixParser()
+        pipeline = self.pipeline
+        batch = 0
+        
+        try:
+            while True:
+                # a batch ends when the queue runs dry, or after max_batch messages under load
+                if batch and (batch >= self.max_batch or not len(pipeline)):
+                    self.app.end_of_batch()
+                    batch = 0
+                item = pipeline.get()
+                if item is None:
+                    break
+                raw, self.app.receive_time, recv_ns, frame_ns = item
+                tracer = self.app.tracer
+                if tracer is not None:
+                    tracer.recv_ns = recv_ns
+                    tracer.frame_ns = frame_ns
+                    tracer.dequeue_ns = time.monotonic_ns()
+                
+                parser.append_buffer(raw)
+                msg = parser.get_message()
+                if msg is None:
+                    continue
+                
+                if self.verbose:
+                    print(f"[RECV] {msg}")
+                
+                self.app.process_message(msg)
+                batch += 1
+                
+                # Update connection state from app
+                if not self.connected and self.app.connected:
+                    self.connected = True
+                    self.logon_event.set()
+                elif self.connected and not self.app.connected:
+                    break
+            
+            if batch:
+                self.app.end_of_batch()
+        except Exception as e:
+            print(f"[ERROR] Error processing message: {e}")
+        
+        pipeline.close()
+        self.connected = False
+        self.logon_event.set()
     
     def _heartbeat_loop(self):
         """Send heartbeat messages"""
@@ -240,8 +410,10 @@ class SimpleFIXClient:
         """Check if the session is logged on"""
         return self.connected and self.app and self.app.connected
     
-    def send_market_data_request(self, symbol, req_type='snapshot'):
-        """Send market data request"""
+    def send_market_data_request(self, symbol, req_type='snapshot', market_depth=None):
+        """Send market data request ('unsubscribe' cancels the symbol's streaming subscription)"""
+        if market_depth is None:
+            market_depth = self.market_depth
         try:
             msg = simplefix.FixMessage()
             msg.append_pair(8, "FIX.4.4")  # BeginString
@@ -255,21 +427,30 @@ class SimpleFIXClient:
             if self.config['QUOTE SESSION'].get('DeliverToCompID'):
                 msg.append_pair(128, self.config['QUOTE SESSION'].get('DeliverToCompID'))
             
-            req_id = str(self.app.get_next_request_id())
+            if req_type == 'unsubscribe':
+                if symbol not in self.subscriptions:
+                    return
+                req_id = self.subscriptions.pop(symbol)[0]
+            else:
+                req_id = str(self.app.get_next_request_id())
+                if req_type != 'snapshot_only':
+                    self.subscriptions[symbol] = (req_id, req_type)
             
             # Map request ID to symbol for rejection handling
             self.app._id_to_symbol[req_id] = symbol
             
             msg.append_pair(262, req_id)   # MDReqID
             
-            # Request type: 0=Snapshot, 1=Snapshot+Updates
+            # Request type: 0=Snapshot, 1=Snapshot+Updates, 2=Unsubscribe
             if req_type == 'snapshot_only':
                 msg.append_pair(263, "0")  # SubscriptionRequestType = Snapshot Only
+            elif req_type == 'unsubscribe':
+                msg.append_pair(263, "2")  # SubscriptionRequestType = Disable previous Snapshot + Updates
             else:
                 msg.append_pair(263, "1")  # SubscriptionRequestType = Snapshot + Updates
             
             # Market depth: 0=Full book, 1=Top of book
-            msg.append_pair(264, "1")      # MarketDepth = Top of Book
+            msg.append_pair(264, str(market_depth))  # MarketDepth
             msg.append_pair(265, "0")      # MDUpdateType = Full Refresh
             
             # Symbol group
@@ -294,6 +475,14 @@ class SimpleFIXClient:
         except Exception as e:
             print(f"[ERROR] Failed to send market data request: {e}")
     
+    def resubscribe(self, symbol, market_depth=None):
+        """Cancel a streaming subscription and request it again, e.g. at a different market depth"""
+        subscription = self.subscriptions.get(symbol)
+        if subscription is None:
+            return
+        self.send_market_data_request(symbol, 'unsubscribe')
+        self.send_market_data_request(symbol, subscription[1], market_depth)
+    
     def send_logout(self, text="User requested logout"):
         """Send logout message"""
         try:
@@ -354,6 +543,26 @@ class SimpleFIXClient:
                 self.socket.close()
                 self.socket = None
             
+            # let the processing thread finish what was received before the application closes
+            if self.pipeline is not None:
+                self.pipeline.close()
+                if self.shards is not None:
+                    # the workers process their backlog, flush and exit
+                    self.shards.join()
+                if self.processing_thread is not None:
+                    self.processing_thread.join(timeout=5)
+                    self.processing_thread = None
+                    log(self.app.logger, '[PIPELINE] %s', self.pipeline.stats())
+                if self.shards is not None:
+                    self.shards.release()
+                    self.shards = None
+            
+            if self.app:
+                self.app.stop()
+            
+            if self.journal is not None:
+                self.journal.close()
+            
             if self.verbose:
                 print("[INFO] SimpleFIX connection stopped")
         except Exception as e:
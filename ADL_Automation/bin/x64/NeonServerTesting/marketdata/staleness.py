@@ -0,0 +1,144 @@
+import heapq
+import threading
+from time import monotonic
+
+
+class StalenessMonitor:
+    """
+    Deadline driven staleness monitor.
+
+    Every symbol owns a single deadline (last update + threshold) kept in a
+    min-heap. Updates only move the deadline forward in a dict; the heap entry
+    is re-armed lazily when it expires, so a healthy feed costs one heap
+    operation per symbol per threshold period and nothing is ever scanned.
+    One stale event is fired on the transition, one recovery event when data
+    comes back, and optional reminders every `reminder_interval` seconds.
+    """
+
+    def __init__(self, on_stale=None, on_recover=None,
+                 default_threshold=2.0, thresholds=None,
+                 reminder_interval=0.0, clock=monotonic):
+
+        self.on_stale = on_stale
+        self.on_recover = on_recover
+        self.default_threshold = default_threshold
+        self.thresholds = dict(thresholds or {})  # format: 'EUR/USD': 2.0
+        self.reminder_interval = reminder_interval
+        self.clock = clock
+
+        self._heap = []           # (deadline, symbol), at most one entry per symbol
+        self._armed = set()       # symbols that currently have a heap entry
+        self._deadlines = {}      # format: 'EUR/USD': deadline
+        self._last_update = {}    # format: 'EUR/USD': time of last update
+        self._stale_since = {}    # format: 'EUR/USD': time staleness was detected
+        self._cond = threading.Condition()
+        self._thread = None
+        self.running = False
+
+    def threshold_for(self, symbol):
+        return self.thresholds.get(symbol, self.default_threshold)
+
+    def update(self, symbol, update_time=None):
+        """
+        Record fresh data for a symbol. `update_time` is on the monitor clock
+        and defaults to now; pass an earlier value to judge staleness on the
+        age of the data rather than on its arrival.
+        """
+        if update_time is None:
+            update_time = self.clock()
+        deadline = update_time + self.threshold_for(symbol)
+
+        recovered_after = None
+        with self._cond:
+            self._last_update[symbol] = update_time
+            self._deadlines[symbol] = deadline
+            if symbol in self._stale_since:
+                recovered_after = update_time - self._stale_since.pop(symbol)
+            if symbol not in self._armed:
+                # first update, or the entry was consumed when the symbol went stale
+                self._armed.add(symbol)
+                heapq.heappush(self._heap, (deadline, symbol))
+                if self._heap[0][1] == symbol:
+                    self._cond.notify()
+
+        if recovered_after is not None and self.on_recover:
+            self.on_recover(symbol, recovered_after)
+
+    def is_stale(self, symbol):
+        return symbol in self._stale_since
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name="StalenessMonitor")
+            self._thread.start()
+
+    def stop(self):
+        if self.running:
+            with self._cond:
+                self.running = False
+                self._cond.notify()
+            if self._thread and self._thread.is_alive():
+                self._thread.join(timeout=1)
+
+    def _run(self):
+        while self.running:
+            with self._cond:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                deadline = self._heap[0][0]
+                now = self.clock()
+                if deadline > now:
+                    self._cond.wait(deadline - now)
+                    continue
+                fired = self._expire(now)
+            self._fire(fired)
+
+    def run_due(self, now=None):
+        """
+        Process every deadline that has passed at `now` on the calling thread.
+        Used instead of start() when the clock is simulated (e.g. replay).
+        """
+        if now is None:
+            now = self.clock()
+        with self._cond:
+            fired = self._expire(now)
+        self._fire(fired)
+
+    def _expire(self, now):
+        """Pop expired deadlines (lock held) and return the (symbol, age) events to fire"""
+        fired = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, symbol = heapq.heappop(self._heap)
+            self._armed.discard(symbol)
+
+            current = self._deadlines.get(symbol)
+            if current is not None and current > now:
+                # symbol was updated since this entry was armed
+                self._armed.add(symbol)
+                heapq.heappush(self._heap, (current, symbol))
+                continue
+
+            age = now - self._last_update[symbol]
+            if symbol not in self._stale_since:
+                self._stale_since[symbol] = now
+                fired.append((symbol, age))
+            elif self.reminder_interval > 0:
+                fired.append((symbol, age))
+
+            if self.reminder_interval > 0:
+                self._deadlines[symbol] = now + self.reminder_interval
+                self._armed.add(symbol)
+                heapq.heappush(self._heap, (now + self.reminder_interval, symbol))
+        return fired
+
+    def _fire(self, fired):
+        # callbacks run outside the lock so they may call update()
+        for symbol, age in fired:
+            if self.on_stale:
+                try:
+                    self.on_stale(symbol, age)
+                except Exception as e:
+                    print(f"[ERROR] Staleness callback error: {e}")
@@ -0,0 +1,65 @@
+"""
+# Startup timing, from process creation to the first tick.
+#
+# Interpreter startup and imports are paid before any of our code runs, so
+# the process creation time is taken from the OS (/proc on Linux, psutil
+# elsewhere when installed) and every milestone is reported relative to it.
+# Keep this module cheap to import: it is loaded before everything else.
+"""
+import json
+import os
+import sys
+from time import time
+
+# Only needed by optional features; finding one loaded at the first tick means
+# an import crept back onto the startup path
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow', 'http.server', 'cProfile', 'pstats',
+                 'multiprocessing', 'asyncio', 'ssl')
+
+
+def process_start_time():
+    """Wall clock time the current process was created, or None when the OS does not say"""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().create_time()
+    except Exception:
+        return None
+
+
+class StartupTimer:
+    """Named milestones, each reported as the time since the previous one"""
+
+    def __init__(self):
+
+        self.process_start = process_start_time()
+        # created first thing in neon_client: this phase is interpreter startup
+        self.marks = [('python', time())]
+
+    def mark(self, name):
+        self.marks.append((name, time()))
+
+    def report(self):
+        origin = self.process_start if self.process_start is not None else self.marks[0][1]
+        phases = {}
+        previous = origin
+        for name, mark_time in self.marks:
+            phases[name] = (mark_time - previous) * 1000
+            previous = mark_time
+        return {
+            'process_start': self.process_start,
+            'total_ms': (self.marks[-1][1] - origin) * 1000,
+            'phases_ms': phases,
+            'heavy_modules': [name for name in HEAVY_MODULES if name in sys.modules],
+        }
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
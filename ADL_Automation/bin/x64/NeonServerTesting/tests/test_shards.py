@@ -0,0 +1,168 @@
+import io
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from marketdata.pipeline import market_data_key
+from marketdata.shards import DONE, LINE, MESSAGE, STOP, ShardSet, ShmRing, _MESSAGE, _SEQ
+from test_pipeline import HEARTBEAT, snapshot
+
+
+@pytest.fixture
+def ring():
+    ring = ShmRing(size=64, doorbell=threading.Semaphore(0))
+    yield ring
+    ring.close()
+
+
+# ShmRing
+
+def test_ring_wraps_around(ring):
+    # 4 byte length prefix + 5..13 bytes: records start and end at every offset of the 64 byte ring
+    sent = []
+    for i in range(200):
+        record = bytes([i % 256]) * (5 + i % 9)
+        assert ring.put(record)
+        sent.append(record)
+        if i % 3 == 2:
+            assert ring.get_all(wait=False) == sent
+            sent = []
+    assert ring.get_all(wait=False) == sent
+    assert len(ring) == 0
+
+
+def test_ring_attached_side_sees_the_records(ring):
+    attached = ShmRing(*ring.attach_args())
+    try:
+        ring.put(b'first')
+        ring.put(b'second')
+        assert attached.get_all(wait=False, limit=1) == [b'first']
+        assert attached.get_all(wait=False) == [b'second']
+        # the producer sees the space freed by the other side
+        assert len(ring) == 0
+    finally:
+        attached.close()
+
+
+def test_full_ring_waits_for_the_consumer(ring):
+    for _ in range(4):
+        ring.put(b'x' * 12)
+    assert len(ring) == 64
+    producer = threading.Thread(target=ring.put, args=(b'y' * 12,))
+    producer.start()
+    producer.join(0.1)
+    assert producer.is_alive()
+    assert ring.get_all(wait=False, limit=1) == [b'x' * 12]
+    producer.join(5)
+    assert not producer.is_alive()
+    assert ring.get_all(wait=False) == [b'x' * 12] * 3 + [b'y' * 12]
+    assert ring.blocked_s > 0
+
+
+def test_full_ring_gives_up_when_the_consumer_is_gone(ring):
+    for _ in range(4):
+        ring.put(b'x' * 12)
+    assert not ring.put(b'y' * 12, alive=lambda: False)
+    assert ring.get_all(wait=False) == [b'x' * 12] * 4
+
+
+def test_record_larger_than_the_ring(ring):
+    with pytest.raises(ValueError):
+        ring.put(b'x' * 61)
+
+
+def test_get_all_sleeps_on_the_doorbell(ring):
+    consumer = threading.Thread(target=lambda: records.extend(ring.get_all(timeout=5)))
+    records = []
+    consumer.start()
+    consumer.join(0.1)
+    assert consumer.is_alive()
+    ring.put(b'wake')
+    consumer.join(5)
+    assert records == [b'wake']
+
+
+# ShardSet merge order
+
+def worker_output(shards, index, *lines, done):
+    """What worker `index` would write back: (message number, line) pairs, then done up to `done`"""
+    for seq, line in lines:
+        shards.outboxes[index].put(LINE + _SEQ.pack(seq) + line.encode('utf-8'))
+    shards.outboxes[index].put(DONE + _SEQ.pack(done))
+
+
+def routed(shards, index):
+    """Message numbers waiting in worker `index`'s inbox"""
+    return [_MESSAGE.unpack_from(record, 1)[0] for record in shards.inboxes[index].get_all(wait=False)
+            if record[:1] == MESSAGE]
+
+
+def put(shards, raw):
+    return shards.put((raw, 0.0, 0, 0), market_data_key(raw))
+
+
+@pytest.fixture
+def shards():
+    # no processes: the tests play the workers through the rings
+    shards = ShardSet(2, ring_size=4096, output=io.StringIO())
+    shards.assignment = {b'EUR/USD': 0, b'GBP/USD': 1}
+    yield shards
+    shards.release()
+
+
+def test_merge_interleaves_session_and_shard_messages_in_order(shards):
+    put(shards, HEARTBEAT)               # 1: main process
+    put(shards, snapshot('EUR/USD'))     # 2: worker 0
+    put(shards, HEARTBEAT)               # 3: main process
+    put(shards, snapshot('GBP/USD'))     # 4: worker 1
+    put(shards, snapshot('EUR/USD'))     # 5: worker 0
+    assert routed(shards, 0) == [2, 5]
+    assert routed(shards, 1) == [4]
+
+    # worker 1 answers first: its line waits for message 3
+    worker_output(shards, 1, (4, 'gbp 4'), done=4)
+    assert shards.get() == (HEARTBEAT, 0.0, 0, 0)
+    assert shards.output.getvalue() == ''
+
+    worker_output(shards, 0, (2, 'eur 2'), (2, 'eur 2 again'), (5, 'eur 5'), done=5)
+    assert shards.get() == (HEARTBEAT, 0.0, 0, 0)
+    assert shards.output.getvalue() == 'eur 2\neur 2 again\n'
+
+    shards.close()
+    assert shards.get() is None
+    assert shards.output.getvalue() == 'eur 2\neur 2 again\ngbp 4\neur 5\n'
+    assert shards.stats()['lines_written'] == 4
+
+
+def test_unassigned_symbol_hashes_to_a_worker(shards):
+    put(shards, snapshot('USD/JPY'))
+    index = shards.assignment[b'USD/JPY']
+    assert routed(shards, index) == [1]
+    assert shards.messages[index] == 1
+
+
+def test_dead_worker_drops_its_messages_and_the_rest_carry_on(shards, capsys):
+    shards.processes = [SimpleNamespace(is_alive=lambda: False, name='NeonShard0'),
+                        SimpleNamespace(is_alive=lambda: True, name='NeonShard1')]
+    # fill worker 0's inbox: the next put must not wait for it
+    sent = 0
+    while len(shards.inboxes[0]) + 200 < shards.inboxes[0].capacity:
+        put(shards, snapshot('EUR/USD'))
+        sent += 1
+    for _ in range(20):
+        assert put(shards, snapshot('EUR/USD'))
+    put(shards, snapshot('GBP/USD'))
+    put(shards, HEARTBEAT)
+    assert shards.dropped[0] > 0
+    assert shards.messages[0] + shards.dropped[0] == sent + 20
+    assert shards.stats()['dropped_0'] == shards.dropped[0]
+
+    seq = shards.seq - 1
+    worker_output(shards, 1, (seq, 'gbp'), done=seq)
+    assert shards.get() == (HEARTBEAT, 0.0, 0, 0)
+    assert shards.output.getvalue() == 'gbp\n'
+    assert 'Shard worker 0 exited unexpectedly' in capsys.readouterr().out
+    # the full inbox of the dead worker does not hold up the STOP of the live one
+    shards.close()
+    assert STOP in shards.inboxes[1].get_all(wait=False)